@@ -2,7 +2,37 @@
 import sys
 import json
 import math
+import os
 import random
+import time
+
+# Start of this module's own import work (local modules, caches), reported as the "import" stage.
+_IMPORT_STARTED = time.perf_counter()
+
+from markets import derive_markets
+from score_cache import ScoreCache
+from stage_profiler import StageProfiler
+
+# Goal PMFs are extended until less than this much probability mass is left in the tail.
+TAIL_EPSILON = 1e-10
+
+# Memoizes outcome probabilities on quantized xG; persisted between runs in --serve mode
+# when ANALYSIS_CACHE_FILE is set.
+SCORE_CACHE = ScoreCache(
+    maxsize=int(os.environ.get("ANALYSIS_CACHE_SIZE", 4096)),
+    precision=int(os.environ.get("ANALYSIS_CACHE_PRECISION", 3)),
+    path=os.environ.get("ANALYSIS_CACHE_FILE"),
+)
+# Derived markets for requests that ask for them ("markets": true); memory only.
+MARKET_CACHE = ScoreCache(maxsize=SCORE_CACHE.maxsize, precision=SCORE_CACHE.precision)
+# Per-stage timings (ANALYSIS_PROFILE=1 or --profile): results carry a "timings" object and
+# the aggregated p50/p95/p99 go to stderr, or to the "profile_stats" command in --serve mode.
+PROFILER = StageProfiler(enabled=os.environ.get("ANALYSIS_PROFILE", "") not in ("", "0"))
+
+# Hybrid model defaults (see backtest.py for tuning them on historical results).
+HYBRID_WEIGHTS = {'poisson': 0.5, 'odds': 0.3, 'form': 0.2}
+INJURY_FACTOR = 0.04
+HOME_FORM_ADV = 0.55 # Small home advantage factor in form calculation
 
 def poisson_probability(actual, mean):
     """Calculates the poisson probability of a number of events occurring."""
@@ -18,18 +48,33 @@ def get_team_strength(team_name):
     r = random.Random(seed)
     return r.uniform(0.8, 2.2)
 
-def fallback_analysis(ev_sahibi, deplasman):
+def fallback_analysis(ev_sahibi, deplasman, return_dict=False, markets=False):
     """Fallback analysis if detailed stats are not provided."""
     home_strength = get_team_strength(ev_sahibi)
     away_strength = get_team_strength(deplasman)
     ev_beklenen_gol = 1.4 * home_strength / away_strength + 0.15
     dep_beklenen_gol = 1.2 * away_strength / home_strength
-    return analyze_match(ev_beklenen_gol, dep_beklenen_gol, "Poisson (Fallback)", {})
+    return analyze_match(ev_beklenen_gol, dep_beklenen_gol, "Poisson (Fallback)", {}, return_dict=return_dict, markets=markets)
 
-def detailed_analysis(stats):
+def form_probabilities(home_form_score, away_form_score, home_form_adv=None):
+    """Win/draw/loss probabilities from recent form points (3/1/0 per W/D/L)."""
+    if home_form_adv is None:
+        home_form_adv = HOME_FORM_ADV
+    form_probs = {'home_win': 0.33, 'draw': 0.33, 'away_win': 0.33}
+    total_points_for_dist = home_form_score + away_form_score
+    if total_points_for_dist > 0:
+        form_probs['home_win'] = (home_form_score / total_points_for_dist) * (1 - home_form_adv) + home_form_adv * 0.5
+        form_probs['away_win'] = (away_form_score / total_points_for_dist) * (1- home_form_adv)
+        form_probs['draw'] = 1 - form_probs['home_win'] - form_probs['away_win']
+    return form_probs
+
+def detailed_analysis(stats, return_dict=False):
     """
     Analysis based on a hybrid model combining Poisson, Odds, Form, and Injuries.
+    With stats['markets'] set, the result also carries the markets priced from
+    the Poisson score matrix.
     """
+    timer = PROFILER.timer()
     home_stats = stats['home']
     away_stats = stats['away']
     
@@ -41,17 +86,23 @@ def detailed_analysis(stats):
 
     home_xg_poisson = home_attack_strength * away_defense_strength * stats['league_avg_home_goals']
     away_xg_poisson = away_attack_strength * home_defense_strength * stats['league_avg_away_goals']
+    timer.lap("poisson")
     
     # --- 2. Injury Model ---
-    injury_factor = 0.04 
+    injury_factor = INJURY_FACTOR
     injuries = stats.get('injuries', {'home': 0, 'away': 0})
     home_injuries = injuries.get('home', 0)
     away_injuries = injuries.get('away', 0)
     
     home_xg_poisson *= (1 - (home_injuries * injury_factor))
     away_xg_poisson *= (1 - (away_injuries * injury_factor))
+    timer.lap("injury")
 
-    poisson_probs = calculate_outcome_probabilities(home_xg_poisson, away_xg_poisson)
+    poisson_home_win, poisson_draw, poisson_away_win, most_likely_score, max_prob = cached_outcome_probabilities(
+        home_xg_poisson, away_xg_poisson
+    )
+    poisson_probs = {'home_win': poisson_home_win, 'draw': poisson_draw, 'away_win': poisson_away_win}
+    timer.lap("outcome")
 
     # --- 3. Odds Model ---
     odds = stats.get('odds', {})
@@ -62,6 +113,7 @@ def detailed_analysis(stats):
             odds_probs['home_win'] = (1/odds['home']) / total_implied
             odds_probs['draw'] = (1/odds['draw']) / total_implied
             odds_probs['away_win'] = (1/odds['away']) / total_implied
+    timer.lap("odds")
 
     # --- 4. Form Model ---
     home_form_raw = stats.get('home_form_raw', [])
@@ -73,23 +125,15 @@ def detailed_analysis(stats):
     home_form_score = sum(form_points.get(r, 0) for r in home_form)
     away_form_score = sum(form_points.get(r, 0) for r in away_form)
     
-    form_probs = {'home_win': 0.33, 'draw': 0.33, 'away_win': 0.33}
-    total_form_score = home_form_score + away_form_score
-    if total_form_score > 0:
-        home_form_adv = 0.55 # Small home advantage factor in form calculation
-        total_points_for_dist = home_form_score + away_form_score
-        if total_points_for_dist > 0:
-            form_probs['home_win'] = (home_form_score / total_points_for_dist) * (1 - home_form_adv) + home_form_adv * 0.5
-            form_probs['away_win'] = (away_form_score / total_points_for_dist) * (1- home_form_adv)
-            form_probs['draw'] = 1 - form_probs['home_win'] - form_probs['away_win']
-
+    form_probs = form_probabilities(home_form_score, away_form_score)
+    timer.lap("form")
 
     # --- 5. Hybrid Model (Weighted Average) ---
-    weights = {'poisson': 0.5, 'odds': 0.3, 'form': 0.2}
-    # If odds are not available, re-distribute its weight to poisson and form
+    weights = dict(HYBRID_WEIGHTS)
+    # If odds are not available, re-distribute its weight to poisson and form (2:1)
     if not odds_probs['home_win']:
-        weights['poisson'] += 0.2
-        weights['form'] += 0.1
+        weights['poisson'] += weights['odds'] * 2 / 3
+        weights['form'] += weights['odds'] / 3
         weights['odds'] = 0
 
     final_home_win = (poisson_probs['home_win'] * weights['poisson']) + (odds_probs['home_win'] * weights['odds']) + (form_probs['home_win'] * weights['form'])
@@ -102,7 +146,6 @@ def detailed_analysis(stats):
         final_draw /= total_final_prob
         final_away_win /= total_final_prob
 
-    _, _, _, most_likely_score, max_prob = calculate_outcome_probabilities(home_xg_poisson, away_xg_poisson, return_details=True)
     confidence = (max(final_home_win, final_draw, final_away_win) - (1/3)) * 150 
     confidence = min(99.0, max(10.0, confidence))
 
@@ -128,49 +171,104 @@ def detailed_analysis(stats):
         "confidence": round(confidence, 1),
         "stats": detailed_stats
     }
+    timer.lap("blend")
+    if stats.get('markets'):
+        sonuc["markets"] = cached_markets(home_xg_poisson, away_xg_poisson)
+        timer.lap("markets")
+    if timer.timings is not None:
+        sonuc["timings"] = timer.result()
+    if return_dict:
+        return sonuc
     return json.dumps(sonuc)
 
 
-def calculate_outcome_probabilities(home_xg, away_xg, return_details=False):
-    """Calculates win/draw/loss probabilities from xG."""
-    home_goal_probs = [poisson_probability(i, home_xg) for i in range(7)]
-    away_goal_probs = [poisson_probability(i, away_xg) for i in range(7)]
-
-    sum_home = sum(home_goal_probs)
-    sum_away = sum(away_goal_probs)
-    if sum_home > 0: home_goal_probs = [p / sum_home for p in home_goal_probs]
-    if sum_away > 0: away_goal_probs = [p / sum_away for p in away_goal_probs]
-
-    home_win_prob, draw_prob, away_win_prob = 0, 0, 0
-    most_likely_score, max_prob = [0, 0], 0
-
-    for h in range(7):
-        for a in range(7):
-            prob = home_goal_probs[h] * away_goal_probs[a]
-            if prob > max_prob:
-                max_prob = prob
-                most_likely_score = [h, a]
-            if h > a: home_win_prob += prob
-            elif h == a: draw_prob += prob
-            else: away_win_prob += prob
-            
+def goal_pmf(mean, epsilon=TAIL_EPSILON):
+    """
+    Poisson goal PMF built with the recurrence p(k) = p(k-1) * mean / k, grown
+    until the remaining tail mass drops below epsilon. Negative means are
+    treated as zero expected goals.
+    """
+    mean = max(float(mean), 0.0)
+    p = math.exp(-mean)
+    if p == 0.0:
+        raise ValueError(f"Expected goals too large for the goal kernel: {mean}")
+    pmf = [p]
+    total = p
+    k = 0
+    # Always walk past the mode so the tail test is not met on the rising side.
+    while k < mean or (1.0 - total > epsilon and p > 0.0):
+        k += 1
+        p *= mean / k
+        pmf.append(p)
+        total += p
+    return pmf
+
+
+def skellam_outcome_probabilities(home_pmf, away_pmf):
+    """
+    Home/draw/away probabilities from the goal-difference (Skellam) distribution
+    of two independent goal PMFs, using running CDFs instead of a full score grid.
+    """
+    draw_prob = sum(h * a for h, a in zip(home_pmf, away_pmf))
+
+    home_win_prob, away_below = 0.0, 0.0
+    for k, h in enumerate(home_pmf):
+        home_win_prob += h * away_below
+        if k < len(away_pmf):
+            away_below += away_pmf[k]
+
+    away_win_prob, home_below = 0.0, 0.0
+    for k, a in enumerate(away_pmf):
+        away_win_prob += a * home_below
+        if k < len(home_pmf):
+            home_below += home_pmf[k]
+
+    # Condition on the captured mass (at most ~2 * epsilon short of 1).
     total_prob = home_win_prob + draw_prob + away_win_prob
-    if total_prob > 0:
-        home_win_prob /= total_prob
-        draw_prob /= total_prob
-        away_win_prob /= total_prob
-    
+    return home_win_prob / total_prob, draw_prob / total_prob, away_win_prob / total_prob
+
+
+def calculate_outcome_probabilities(home_xg, away_xg, return_details=False, epsilon=TAIL_EPSILON):
+    """Calculates win/draw/loss probabilities from xG."""
+    home_goal_probs = goal_pmf(home_xg, epsilon)
+    away_goal_probs = goal_pmf(away_xg, epsilon)
+    home_win_prob, draw_prob, away_win_prob = skellam_outcome_probabilities(home_goal_probs, away_goal_probs)
+
     if return_details:
-        return home_win_prob, draw_prob, away_win_prob, most_likely_score, max_prob
+        # Independent goals: the modal score is the pair of marginal modes.
+        home_mode = max(range(len(home_goal_probs)), key=home_goal_probs.__getitem__)
+        away_mode = max(range(len(away_goal_probs)), key=away_goal_probs.__getitem__)
+        max_prob = home_goal_probs[home_mode] * away_goal_probs[away_mode]
+        return home_win_prob, draw_prob, away_win_prob, [home_mode, away_mode], max_prob
     
     return {"home_win": home_win_prob, "draw": draw_prob, "away_win": away_win_prob}
 
 
-def analyze_match(ev_beklenen_gol, dep_beklenen_gol, model_name, strength_stats):
+def _outcome_details(home_xg, away_xg):
+    return calculate_outcome_probabilities(home_xg, away_xg, return_details=True)
+
+
+def cached_outcome_probabilities(home_xg, away_xg):
+    """calculate_outcome_probabilities(..., return_details=True), memoized on quantized xG."""
+    return SCORE_CACHE.get_or_compute(home_xg, away_xg, _outcome_details)
+
+
+def _derive_markets(home_xg, away_xg):
+    return derive_markets(goal_pmf(home_xg), goal_pmf(away_xg))
+
+
+def cached_markets(home_xg, away_xg):
+    """markets.derive_markets for the Poisson score matrix, memoized on quantized xG."""
+    return MARKET_CACHE.get_or_compute(home_xg, away_xg, _derive_markets)
+
+
+def analyze_match(ev_beklenen_gol, dep_beklenen_gol, model_name, strength_stats, return_dict=False, markets=False):
     """Legacy match analysis logic using only Poisson distribution."""
-    home_win_prob, draw_prob, away_win_prob, most_likely_score, max_prob = calculate_outcome_probabilities(
-        ev_beklenen_gol, dep_beklenen_gol, return_details=True
+    timer = PROFILER.timer()
+    home_win_prob, draw_prob, away_win_prob, most_likely_score, max_prob = cached_outcome_probabilities(
+        ev_beklenen_gol, dep_beklenen_gol
     )
+    timer.lap("outcome")
 
     confidence = (max_prob + abs(home_win_prob - away_win_prob)) * 50
     confidence = min(99.0, max(10.0, confidence))
@@ -188,22 +286,232 @@ def analyze_match(ev_beklenen_gol, dep_beklenen_gol, model_name, strength_stats)
             **strength_stats
         }
     }
+    timer.lap("blend")
+    if markets:
+        sonuc["markets"] = cached_markets(ev_beklenen_gol, dep_beklenen_gol)
+        timer.lap("markets")
+    if timer.timings is not None:
+        sonuc["timings"] = timer.result()
+    if return_dict:
+        return sonuc
+    return json.dumps(sonuc)
+
+
+def get_ratings_model():
+    """Fitted Dixon-Coles ratings from bahis.db (see dixon_coles.py), or None if not fitted."""
+    import dixon_coles
+    return dixon_coles.get_model(os.environ.get("ANALYSIS_DB_PATH", dixon_coles.DEFAULT_DB_PATH))
+
+
+def resolve_team_id(team_name):
+    """bahis.db team id for a free-text team name (see team_resolver.py), or None if not confidently resolved."""
+    import team_resolver
+    resolver = team_resolver.get_resolver(os.environ.get("ANALYSIS_DB_PATH", team_resolver.DEFAULT_DB_PATH))
+    if resolver is None or not team_name:
+        return None
+    return resolver.resolve(team_name).team_id
+
+
+def get_form_index():
+    """Rolling form / head-to-head index from bahis.db (see form_index.py), or None if not built."""
+    import form_index
+    return form_index.get_index(os.environ.get("ANALYSIS_DB_PATH", form_index.DEFAULT_DB_PATH))
+
+
+def with_indexed_form(stats):
+    """
+    Fills missing or empty home_form_raw/away_form_raw from the form index when
+    the request carries bahis.db team ids, so callers need not fetch recent form.
+    """
+    home_id, away_id = stats.get("home_id"), stats.get("away_id")
+    if home_id is None or away_id is None or (stats.get("home_form_raw") and stats.get("away_form_raw")):
+        return stats
+    index = get_form_index()
+    if index is None:
+        return stats
+    stats = dict(stats)
+    if not stats.get("home_form_raw"):
+        stats["home_form_raw"] = index.form_raw(home_id)
+    if not stats.get("away_form_raw"):
+        stats["away_form_raw"] = index.form_raw(away_id)
+    return stats
+
+
+def ratings_analysis(home_id, away_id, model, return_dict=False, markets=False):
+    """Analysis from fitted Dixon-Coles ratings: O(1) xG lookup by team id."""
+    timer = PROFILER.timer()
+    home_xg, away_xg, home_win_prob, draw_prob, away_win_prob, most_likely_score, max_prob = model.outcome_probabilities(
+        home_id, away_id
+    )
+    timer.lap("outcome")
+    h, a = model.index[home_id], model.index[away_id]
+
+    confidence = (max_prob + abs(home_win_prob - away_win_prob)) * 50
+    confidence = min(99.0, max(10.0, confidence))
+
+    sonuc = {
+        "math_model": "Dixon-Coles (Ratings)",
+        "home_win": round(home_win_prob * 100, 1),
+        "draw": round(draw_prob * 100, 1),
+        "away_win": round(away_win_prob * 100, 1),
+        "score_prediction": f"{most_likely_score[0]} - {most_likely_score[1]}",
+        "confidence": round(confidence, 1),
+        "stats": {
+            "home_xg": round(home_xg, 2),
+            "away_xg": round(away_xg, 2),
+            "home_attack": round(float(model.attack[h]), 2),
+            "away_attack": round(float(model.attack[a]), 2),
+            "home_defense": round(float(model.defense[h]), 2),
+            "away_defense": round(float(model.defense[a]), 2),
+        }
+    }
+    timer.lap("blend")
+    if markets:
+        sonuc["markets"] = model.markets(home_id, away_id)
+        timer.lap("markets")
+    if timer.timings is not None:
+        sonuc["timings"] = timer.result()
+    if return_dict:
+        return sonuc
     return json.dumps(sonuc)
 
 
+def run_analysis(stats, return_dict=False):
+    """Dispatches a single request to the detailed, ratings or fallback model."""
+    if stats.get("is_simulation", True):
+        markets = bool(stats.get("markets"))
+        home_id, away_id = stats.get("home_id"), stats.get("away_id")
+        home_name, away_name = stats.get("home_name"), stats.get("away_name")
+        if (home_id is not None or home_name) and (away_id is not None or away_name):
+            model = get_ratings_model()
+            if model is not None:
+                # Names without ids are resolved to teams, so they get ratings instead of the fallback.
+                if home_id is None:
+                    home_id = resolve_team_id(home_name)
+                if away_id is None:
+                    away_id = resolve_team_id(away_name)
+                if home_id in model and away_id in model:
+                    return ratings_analysis(home_id, away_id, model, return_dict=return_dict, markets=markets)
+        return fallback_analysis(
+            stats.get("home_name", "Team A"), stats.get("away_name", "Team B"), return_dict=return_dict, markets=markets
+        )
+    return detailed_analysis(with_indexed_form(stats), return_dict=return_dict)
+
+
+def enable_profiling():
+    """Turns on PROFILER here and, through the environment, in worker processes."""
+    os.environ["ANALYSIS_PROFILE"] = "1"
+    PROFILER.enabled = True
+
+
+def profiled_analysis(stats, started, parsed=None):
+    """
+    run_analysis as serialized JSON, with parse/serialization/total stages added
+    to its "timings" and aggregated into PROFILER. `started` is when the request
+    arrived and `parsed` when its JSON was decoded (perf_counter seconds).
+    """
+    result = run_analysis(stats, return_dict=True)
+    timings = result.pop("timings", None) or {}
+    if parsed is not None:
+        timings["parse"] = round((parsed - started) * 1000, 4)
+    serialize_started = time.perf_counter()
+    body = json.dumps(result)
+    finished = time.perf_counter()
+    timings["serialization"] = round((finished - serialize_started) * 1000, 4)
+    timings["total"] = round((finished - started) * 1000, 4)
+    PROFILER.add(timings)
+    # The result is a non-empty object, so the timings can be spliced in before its closing brace.
+    return '%s, "timings": %s}' % (body[:-1], json.dumps(timings))
+
+
+def report_profile(label="analysis"):
+    """Writes the aggregated stage timings to stderr as one JSON line."""
+    if PROFILER.enabled and PROFILER.counts:
+        print(f"[PROFILE] {label} " + json.dumps(PROFILER.summary()), file=sys.stderr)
+
+
+def serve(stdin=sys.stdin, stdout=sys.stdout):
+    """
+    Long-lived worker mode: reads one JSON request per line from stdin and writes
+    one JSON result per line to stdout. Requests look like {"id": ..., "stats": {...}}
+    and results echo the id back, so callers can keep several requests in flight.
+    A bad request produces an error line instead of stopping the worker.
+    {"id": ..., "command": "cache_stats"} reports the score cache counters and
+    {"id": ..., "command": "profile_stats"} the aggregated stage timings and
+    {"id": ..., "command": "form", "home_id": ..., "away_id": ...} both teams'
+    indexed form and head-to-head.
+    """
+    SCORE_CACHE.load()
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        request_id = None
+        started = time.perf_counter()
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            request_id = request.get("id")
+            if request.get("command") == "cache_stats":
+                stdout.write(json.dumps({"id": request_id, "result": SCORE_CACHE.stats()}) + "\n")
+                stdout.flush()
+                continue
+            if request.get("command") == "profile_stats":
+                stdout.write(json.dumps({"id": request_id, "result": PROFILER.summary()}) + "\n")
+                stdout.flush()
+                continue
+            if request.get("command") == "form":
+                index = get_form_index()
+                if index is None:
+                    raise ValueError("Form index not built (python form_index.py)")
+                team_ids = (request.get("home_id"), request.get("away_id"))
+                if not all(isinstance(team_id, int) and not isinstance(team_id, bool) for team_id in team_ids):
+                    raise ValueError("'form' needs integer 'home_id' and 'away_id'")
+                result = index.match_form(*team_ids)
+                stdout.write(json.dumps({"id": request_id, "result": result}) + "\n")
+                stdout.flush()
+                continue
+            stats = request.get("stats")
+            if not isinstance(stats, dict):
+                raise ValueError("Request is missing a 'stats' object")
+            if PROFILER.enabled:
+                result = profiled_analysis(stats, started, parsed=time.perf_counter())
+            else:
+                result = run_analysis(stats)
+            # The models already return serialized JSON, so splice it in as-is.
+            stdout.write('{"id": %s, "result": %s}\n' % (json.dumps(request_id), result))
+        except Exception as e:
+            stdout.write(json.dumps({"id": request_id, "error": str(e)}) + "\n")
+        stdout.flush()
+    SCORE_CACHE.save()
+    report_profile("serve")
+
+
 if __name__ == "__main__":
+    if "--profile" in sys.argv:
+        sys.argv.remove("--profile")
+        enable_profiling()
+    if len(sys.argv) == 2 and sys.argv[1] == '--serve':
+        serve()
+        sys.exit(0)
+    if len(sys.argv) >= 2 and sys.argv[1] == 'batch':
+        import batch_runner
+        sys.exit(batch_runner.main(sys.argv[2:]))
+
     try:
         if len(sys.argv) == 2 and sys.argv[1].startswith('{'):
+            started = time.perf_counter()
             stats = json.loads(sys.argv[1])
-            if stats.get("is_simulation", True):
-                print(fallback_analysis(stats.get("home_name", "Team A"), stats.get("away_name", "Team B")))
+            if PROFILER.enabled:
+                PROFILER.add({"import": round((started - _IMPORT_STARTED) * 1000, 4)})
+                print(profiled_analysis(stats, started, parsed=time.perf_counter()))
+                report_profile("cli")
             else:
-                print(detailed_analysis(stats))
+                print(run_analysis(stats))
         else:
             print(fallback_analysis("Team A", "Team B"))
             
     except Exception as e:
         import traceback
-        print(json.dumps({"error": str(e), "trace": traceback.format_exc()}))
-
-    
\ No newline at end of file
+        print(json.dumps({"error": str(e), "trace": traceback.format_exc()}))
\ No newline at end of file
@@ -0,0 +1,351 @@
+"""
+Backtesting and calibration for the hybrid model in analysis.detailed_analysis.
+
+Finished matches in bahis.db are replayed in kickoff order. For every match
+the Poisson, odds and form components are built only from results known
+before kickoff and cached as arrays. Blend weights and home_form_adv can
+then be searched over thousands of configurations at once: every
+configuration is scored from the cached components, vectorized across
+configurations, with log-loss, Brier score and calibration curves.
+
+bahis.db keeps no injury history, so replayed matches have no injuries and
+injury_factor cannot be tuned here; it stays at analysis.INJURY_FACTOR.
+
+Usage: python backtest.py [--db bahis.db] [--search grid|random] [--samples 5000] [--output report.json]
+"""
+import argparse
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+
+from analysis import HOME_FORM_ADV, HYBRID_WEIGHTS, INJURY_FACTOR
+from batch_scoring import batch_outcome_probabilities
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bahis.db')
+FORM_LENGTH = 5
+MIN_PLAYED = 3
+FORM_POINTS = {'W': 3, 'D': 1, 'L': 0}
+# Keeps the (configs x matches) working arrays of one evaluation chunk around 32 MB each.
+CELLS_PER_CHUNK = 4_000_000
+PROB_FLOOR = 1e-15
+
+OUTCOME_HOME, OUTCOME_DRAW, OUTCOME_AWAY = 0, 1, 2
+
+REPLAY_SQL = """
+    SELECT m.id, m.match_date, m.home_team_id, m.away_team_id, m.home_score, m.away_score,
+           m.home_odd, m.draw_odd, m.away_odd, t.league_id
+    FROM matches m LEFT JOIN teams t ON t.id = m.home_team_id
+    WHERE m.status = 'FT' AND m.home_score IS NOT NULL AND m.away_score IS NOT NULL
+    ORDER BY m.match_date, m.id
+"""
+
+
+def _result(goals_for, goals_against):
+    if goals_for > goals_against:
+        return 'W'
+    return 'D' if goals_for == goals_against else 'L'
+
+
+def replay_components(conn, form_length=FORM_LENGTH, min_played=MIN_PLAYED):
+    """
+    Walks finished matches chronologically and records the hybrid model's
+    inputs as they were before each kickoff. Matches kicking off at the same
+    time never see each other's results. Returns a dict of NumPy arrays.
+    """
+    team_totals = defaultdict(lambda: [0, 0, 0])   # played, goals_for, goals_against
+    team_form = defaultdict(lambda: deque(maxlen=form_length))
+    league_totals = defaultdict(lambda: [0, 0, 0])  # matches, home goals, away goals
+
+    columns = defaultdict(list)
+    for _, group in itertools.groupby(conn.execute(REPLAY_SQL), key=lambda row: row[1]):
+        group = list(group)
+        for match_id, _, home_id, away_id, home_goals, away_goals, home_odd, draw_odd, away_odd, league_id in group:
+            home, away = team_totals[home_id], team_totals[away_id]
+            league_matches, league_home_goals, league_away_goals = league_totals[league_id]
+            if home[0] < min_played or away[0] < min_played or not league_home_goals or not league_away_goals:
+                continue
+            avg_home = league_home_goals / league_matches
+            avg_away = league_away_goals / league_matches
+
+            # Same formulas as the Poisson model in detailed_analysis.
+            home_attack = (home[1] / home[0]) / avg_home
+            away_attack = (away[1] / away[0]) / avg_away
+            home_defense = (home[2] / home[0]) / avg_away
+            away_defense = (away[2] / away[0]) / avg_home
+
+            columns["match_id"].append(match_id)
+            columns["home_xg"].append(home_attack * away_defense * avg_home)
+            columns["away_xg"].append(away_attack * home_defense * avg_away)
+            columns["home_injuries"].append(0)
+            columns["away_injuries"].append(0)
+            has_odds = bool(home_odd and draw_odd and away_odd and home_odd > 0 and draw_odd > 0 and away_odd > 0)
+            columns["has_odds"].append(has_odds)
+            columns["odds"].append((home_odd, draw_odd, away_odd) if has_odds else (1.0, 1.0, 1.0))
+            columns["home_form"].append(sum(FORM_POINTS[r] for r in team_form[home_id]))
+            columns["away_form"].append(sum(FORM_POINTS[r] for r in team_form[away_id]))
+            columns["outcome"].append(
+                OUTCOME_HOME if home_goals > away_goals else OUTCOME_DRAW if home_goals == away_goals else OUTCOME_AWAY
+            )
+
+        for match_id, _, home_id, away_id, home_goals, away_goals, *_, league_id in group:
+            for team_id, scored, conceded in ((home_id, home_goals, away_goals), (away_id, away_goals, home_goals)):
+                totals = team_totals[team_id]
+                totals[0] += 1
+                totals[1] += scored
+                totals[2] += conceded
+                team_form[team_id].append(_result(scored, conceded))
+            league = league_totals[league_id]
+            league[0] += 1
+            league[1] += home_goals
+            league[2] += away_goals
+
+    odds = np.array(columns["odds"], dtype=float).reshape(-1, 3)
+    implied = 1.0 / odds
+    odds_probs = implied / implied.sum(axis=1, keepdims=True)
+    has_odds = np.array(columns["has_odds"], dtype=bool)
+    odds_probs[~has_odds] = 0.0
+    return {
+        "match_id": np.array(columns["match_id"], dtype=np.int64),
+        "home_xg": np.array(columns["home_xg"], dtype=float),
+        "away_xg": np.array(columns["away_xg"], dtype=float),
+        "home_injuries": np.array(columns["home_injuries"], dtype=float),
+        "away_injuries": np.array(columns["away_injuries"], dtype=float),
+        "has_odds": has_odds,
+        "odds_probs": odds_probs,
+        "home_form": np.array(columns["home_form"], dtype=float),
+        "away_form": np.array(columns["away_form"], dtype=float),
+        "outcome": np.array(columns["outcome"], dtype=np.int64),
+    }
+
+
+def poisson_component(components, injury_factor):
+    """(N, 3) Poisson home/draw/away probabilities for one injury_factor."""
+    home_xg = components["home_xg"] * (1 - components["home_injuries"] * injury_factor)
+    away_xg = components["away_xg"] * (1 - components["away_injuries"] * injury_factor)
+    scored = batch_outcome_probabilities(home_xg, away_xg)
+    return np.column_stack((scored["home_win"], scored["draw"], scored["away_win"]))
+
+
+def baseline_config():
+    """The configuration analysis.py currently ships with."""
+    return make_configs(
+        [HYBRID_WEIGHTS['poisson']], [HYBRID_WEIGHTS['odds']], [HYBRID_WEIGHTS['form']], [HOME_FORM_ADV], [INJURY_FACTOR]
+    )
+
+
+def make_configs(poisson, odds, form, home_form_adv, injury_factor):
+    return {
+        "poisson": np.asarray(poisson, dtype=float),
+        "odds": np.asarray(odds, dtype=float),
+        "form": np.asarray(form, dtype=float),
+        "home_form_adv": np.asarray(home_form_adv, dtype=float),
+        "injury_factor": np.asarray(injury_factor, dtype=float),
+    }
+
+
+def grid_configs(weight_step=0.05, adv_values=None):
+    """Every blend on a simplex grid, crossed with home_form_adv values."""
+    adv_values = np.round(np.arange(0.30, 0.801, 0.05), 2) if adv_values is None else adv_values
+    steps = int(round(1 / weight_step))
+    blends = [(p, o, steps - p - o) for p in range(steps + 1) for o in range(steps + 1 - p)]
+    rows = [
+        (p / steps, o / steps, f / steps, adv, INJURY_FACTOR)
+        for (p, o, f), adv in itertools.product(blends, adv_values)
+    ]
+    return make_configs(*np.array(rows).T)
+
+
+def random_configs(samples, seed=0):
+    """Dirichlet-distributed blends with uniform home_form_adv."""
+    rng = np.random.default_rng(seed)
+    weights = rng.dirichlet(np.ones(3), size=samples)
+    return make_configs(
+        weights[:, 0], weights[:, 1], weights[:, 2],
+        rng.uniform(0.3, 0.8, samples), np.full(samples, INJURY_FACTOR),
+    )
+
+
+def _blend(components, poisson_probs, wp, wo, wf, adv):
+    """
+    Hybrid probabilities for a block of configurations: returns three (C, N)
+    arrays, mirroring detailed_analysis (including the 2:1 redistribution of
+    the odds weight when a match has no odds).
+    """
+    has_odds = components["has_odds"][None, :]
+    wo_eff = np.where(has_odds, wo, 0.0)
+    wp_eff = wp + np.where(has_odds, 0.0, wo * 2 / 3)
+    wf_eff = wf + np.where(has_odds, 0.0, wo / 3)
+
+    home_form, away_form = components["home_form"], components["away_form"]
+    total_form = home_form + away_form
+    has_form = (total_form > 0)[None, :]
+    safe_total = np.where(total_form > 0, total_form, 1.0)
+    form_home = np.where(has_form, (home_form / safe_total)[None, :] * (1 - adv) + adv * 0.5, 0.33)
+    form_away = np.where(has_form, (away_form / safe_total)[None, :] * (1 - adv), 0.33)
+    form_draw = np.where(has_form, 1 - form_home - form_away, 0.33)
+
+    odds_probs = components["odds_probs"]
+    home = wp_eff * poisson_probs[..., 0] + wo_eff * odds_probs[None, :, 0] + wf_eff * form_home
+    draw = wp_eff * poisson_probs[..., 1] + wo_eff * odds_probs[None, :, 1] + wf_eff * form_draw
+    away = wp_eff * poisson_probs[..., 2] + wo_eff * odds_probs[None, :, 2] + wf_eff * form_away
+    total = home + draw + away
+    total = np.where(total > 0, total, 1.0)
+    return home / total, draw / total, away / total
+
+
+def evaluate_configs(components, configs, chunk_size=None):
+    """
+    Scores every configuration against the replayed outcomes. Returns a dict
+    with per-configuration log_loss and brier arrays.
+    """
+    n_matches = len(components["outcome"])
+    n_configs = len(configs["poisson"])
+    if chunk_size is None:
+        chunk_size = max(1, CELLS_PER_CHUNK // max(n_matches, 1))
+
+    # Poisson probabilities depend only on injury_factor; compute once per distinct value.
+    injury_values, injury_index = np.unique(configs["injury_factor"], return_inverse=True)
+    injury_index = injury_index.ravel()
+    if not components["home_injuries"].any() and not components["away_injuries"].any():
+        poisson_by_injury = np.repeat(poisson_component(components, 0.0)[None], len(injury_values), axis=0)
+    else:
+        poisson_by_injury = np.stack([poisson_component(components, f) for f in injury_values])
+
+    outcome = components["outcome"]
+    onehot = np.eye(3)[outcome]
+    log_loss = np.empty(n_configs)
+    brier = np.empty(n_configs)
+    for start in range(0, n_configs, chunk_size):
+        stop = min(start + chunk_size, n_configs)
+        column = lambda key: configs[key][start:stop, None]
+        home, draw, away = _blend(
+            components, poisson_by_injury[injury_index[start:stop]],
+            column("poisson"), column("odds"), column("form"), column("home_form_adv"),
+        )
+        actual = np.choose(outcome, (home, draw, away))
+        log_loss[start:stop] = -np.log(np.maximum(actual, PROB_FLOOR)).mean(axis=1)
+        brier[start:stop] = ((home - onehot[:, 0]) ** 2 + (draw - onehot[:, 1]) ** 2 + (away - onehot[:, 2]) ** 2).mean(axis=1)
+    return {"log_loss": log_loss, "brier": brier}
+
+
+def predict(components, config_index, configs):
+    """(N, 3) hybrid probabilities for one configuration."""
+    single = {key: values[config_index:config_index + 1] for key, values in configs.items()}
+    poisson_probs = poisson_component(components, float(single["injury_factor"][0]))[None]
+    column = lambda key: single[key][:, None]
+    home, draw, away = _blend(components, poisson_probs, column("poisson"), column("odds"), column("form"), column("home_form_adv"))
+    return np.column_stack((home[0], draw[0], away[0]))
+
+
+def calibration_curve(probabilities, outcome, bins=10):
+    """
+    Reliability table per outcome class: for each probability bin, the mean
+    predicted probability, the observed frequency and the number of matches.
+    """
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    curves = {}
+    for label, k in (("home_win", OUTCOME_HOME), ("draw", OUTCOME_DRAW), ("away_win", OUTCOME_AWAY)):
+        predicted = probabilities[:, k]
+        observed = (outcome == k).astype(float)
+        which = np.clip(np.digitize(predicted, edges) - 1, 0, bins - 1)
+        counts = np.bincount(which, minlength=bins)
+        sums_pred = np.bincount(which, predicted, minlength=bins)
+        sums_obs = np.bincount(which, observed, minlength=bins)
+        curves[label] = [
+            {
+                "bin": [round(edges[b], 2), round(edges[b + 1], 2)],
+                "mean_predicted": round(sums_pred[b] / counts[b], 4),
+                "observed": round(sums_obs[b] / counts[b], 4),
+                "count": int(counts[b]),
+            }
+            for b in range(bins) if counts[b]
+        ]
+    return curves
+
+
+def _describe(configs, scores, i):
+    return {
+        "weights": {
+            "poisson": round(float(configs["poisson"][i]), 4),
+            "odds": round(float(configs["odds"][i]), 4),
+            "form": round(float(configs["form"][i]), 4),
+        },
+        "home_form_adv": round(float(configs["home_form_adv"][i]), 4),
+        "injury_factor": round(float(configs["injury_factor"][i]), 4),
+        "log_loss": round(float(scores["log_loss"][i]), 6),
+        "brier": round(float(scores["brier"][i]), 6),
+    }
+
+
+def run_backtest(conn, search="grid", samples=5000, seed=0, top=10, min_played=MIN_PLAYED):
+    """Replays history, evaluates the baseline and a search space, and returns a report dict."""
+    started = time.perf_counter()
+    components = replay_components(conn, min_played=min_played)
+    replay_seconds = time.perf_counter() - started
+    if len(components["outcome"]) == 0:
+        raise ValueError("No finished matches with enough pre-match history to backtest.")
+
+    baseline = baseline_config()
+    configs = grid_configs() if search == "grid" else random_configs(samples, seed)
+    configs = {key: np.concatenate([baseline[key], configs[key]]) for key in configs}
+
+    started = time.perf_counter()
+    scores = evaluate_configs(components, configs)
+    search_seconds = time.perf_counter() - started
+
+    ranking = np.argsort(scores["log_loss"], kind="stable")
+    best = int(ranking[0])
+    outcome = components["outcome"]
+    return {
+        "matches": int(len(outcome)),
+        "configurations": int(len(scores["log_loss"])),
+        "replay_seconds": round(replay_seconds, 3),
+        "search_seconds": round(search_seconds, 3),
+        "baseline": _describe(configs, scores, 0),
+        "best": [_describe(configs, scores, int(i)) for i in ranking[:top]],
+        "calibration": {
+            "baseline": calibration_curve(predict(components, 0, configs), outcome),
+            "best": calibration_curve(predict(components, best, configs), outcome),
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest and tune the hybrid model on finished matches in bahis.db.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--search", choices=("grid", "random"), default="grid")
+    parser.add_argument("--samples", type=int, default=5000, help="Configurations drawn for --search random.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--min-played", type=int, default=MIN_PLAYED, help="Skip matches until both teams have this many results.")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    try:
+        report = run_backtest(conn, args.search, args.samples, args.seed, args.top, args.min_played)
+    finally:
+        conn.close()
+
+    print(
+        f"[BACKTEST] {report['matches']} matches x {report['configurations']} configurations "
+        f"in {report['search_seconds']:.2f}s (baseline log-loss {report['baseline']['log_loss']}, "
+        f"best {report['best'][0]['log_loss']})",
+        file=sys.stderr,
+    )
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""
+Bulk analysis pipeline behind `python analysis.py batch`.
+
+Match inputs are streamed (from a JSON-lines file or from unanalyzed rows in
+bahis.db), run through the hybrid model and written back to the `matches`
+table in chunked transactions, so memory stays bounded by the chunk size.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import analysis
+import form_index
+from parallel import chunked, parallel_map
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bahis.db')
+DEFAULT_CHUNK_SIZE = 500
+FORM_LENGTH = form_index.DEFAULT_FORM_LENGTH
+
+# Same fallbacks the ai-predict route uses when league averages cannot be computed.
+DEFAULT_LEAGUE_AVG_HOME_GOALS = 1.45
+DEFAULT_LEAGUE_AVG_AWAY_GOALS = 1.15
+
+UPDATE_SQL = """
+    UPDATE matches
+    SET home_win_prob = ?, draw_prob = ?, away_win_prob = ?, predicted_score = ?, confidence = ?
+    WHERE id = ?
+"""
+
+
+def connect(db_path, readonly=False):
+    """Read-only connection with `readonly`; otherwise a WAL connection tuned for bulk writes."""
+    if readonly:
+        return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def load_team_context(conn, form_length=FORM_LENGTH, save=True):
+    """
+    Aggregates finished matches once into per-team season totals and
+    per-league goal averages, and takes recent form from the form index
+    (updated in place, see form_index.py; only in memory unless `save`).
+    Memory is O(teams), not O(matches).
+    """
+    teams = {}
+    for team_id, name, league_id in conn.execute("SELECT id, name, league_id FROM teams"):
+        teams[team_id] = {"id": team_id, "name": name, "league_id": league_id, "played": 0, "goals_for": 0, "goals_against": 0, "form": []}
+
+    totals_sql = """
+        SELECT team_id, COUNT(*), SUM(goals_for), SUM(goals_against) FROM (
+            SELECT home_team_id AS team_id, home_score AS goals_for, away_score AS goals_against
+            FROM matches WHERE status = 'FT' AND home_score IS NOT NULL AND away_score IS NOT NULL
+            UNION ALL
+            SELECT away_team_id, away_score, home_score
+            FROM matches WHERE status = 'FT' AND home_score IS NOT NULL AND away_score IS NOT NULL
+        )
+        GROUP BY team_id
+    """
+    for team_id, played, goals_for, goals_against in conn.execute(totals_sql):
+        team = teams.get(team_id)
+        if team:
+            team.update(played=played, goals_for=goals_for, goals_against=goals_against)
+
+    index, _ = form_index.update_index(conn, form_length, save=save)
+    for team_id, team in teams.items():
+        team["form"] = index.form_raw(team_id)
+
+    league_avgs = {}
+    league_sql = """
+        SELECT t.league_id, AVG(m.home_score), AVG(m.away_score)
+        FROM matches m JOIN teams t ON t.id = m.home_team_id
+        WHERE m.status = 'FT' AND m.home_score IS NOT NULL AND m.away_score IS NOT NULL
+        GROUP BY t.league_id
+    """
+    for league_id, avg_home, avg_away in conn.execute(league_sql):
+        league_avgs[league_id] = (avg_home or DEFAULT_LEAGUE_AVG_HOME_GOALS, avg_away or DEFAULT_LEAGUE_AVG_AWAY_GOALS)
+
+    return teams, league_avgs
+
+
+def build_stats(home, away, league_avgs, odds):
+    """Builds the `stats` payload analysis.run_analysis expects for one fixture."""
+    if not home["played"] or not away["played"]:
+        return {"is_simulation": True, "home_name": home["name"], "away_name": away["name"], "home_id": home["id"], "away_id": away["id"]}
+
+    avg_home, avg_away = league_avgs.get(home["league_id"], (DEFAULT_LEAGUE_AVG_HOME_GOALS, DEFAULT_LEAGUE_AVG_AWAY_GOALS))
+    return {
+        "is_simulation": False,
+        "home": {"name": home["name"], "played": home["played"], "goals_for": home["goals_for"], "goals_against": home["goals_against"]},
+        "away": {"name": away["name"], "played": away["played"], "goals_for": away["goals_for"], "goals_against": away["goals_against"]},
+        "league_avg_home_goals": avg_home,
+        "league_avg_away_goals": avg_away,
+        "home_form_raw": home["form"],
+        "away_form_raw": away["form"],
+        "odds": odds,
+        "injuries": {"home": 0, "away": 0},
+    }
+
+
+def requests_from_db(conn, page_size=DEFAULT_CHUNK_SIZE, markets=False, save_index=True):
+    """
+    Yields {"id", "stats"} requests for scheduled matches that have not been analyzed.
+    Pages by id instead of holding a cursor open, so the writer can commit between pages.
+    With `markets`, every request also asks for the derived betting markets.
+    The form index update is written back only with `save_index`.
+    """
+    teams, league_avgs = load_team_context(conn, save=save_index)
+    last_id = -1
+    while True:
+        rows = conn.execute(
+            """
+            SELECT id, home_team_id, away_team_id, home_odd, draw_odd, away_odd
+            FROM matches
+            WHERE status = 'NS' AND confidence IS NULL AND id > ?
+            ORDER BY id LIMIT ?
+            """,
+            (last_id, page_size),
+        ).fetchall()
+        if not rows:
+            return
+        for match_id, home_id, away_id, home_odd, draw_odd, away_odd in rows:
+            home, away = teams.get(home_id), teams.get(away_id)
+            if not home or not away:
+                print(f"[BATCH] Skipping match ID {match_id} due to missing team data.", file=sys.stderr)
+                continue
+            odds = {}
+            if home_odd and draw_odd and away_odd:
+                odds = {"home": home_odd, "draw": draw_odd, "away": away_odd}
+            stats = build_stats(home, away, league_avgs, odds)
+            if markets:
+                stats["markets"] = True
+            yield {"id": match_id, "stats": stats}
+        last_id = rows[-1][0]
+
+
+def requests_from_jsonl(path):
+    """Yields {"id", "stats"} requests from a JSON-lines file (same format as --serve)."""
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                print(f"[BATCH] Skipping line {line_number}: {e}", file=sys.stderr)
+                continue
+            if not isinstance(request, dict) or not isinstance(request.get("stats"), dict):
+                print(f"[BATCH] Skipping line {line_number}: expected {{\"id\", \"stats\"}}", file=sys.stderr)
+                continue
+            yield request
+
+
+def analyze_requests(requests):
+    """Runs each request through the hybrid model, yielding (id, result or None, error or None)."""
+    for request in requests:
+        try:
+            yield request.get("id"), analysis.run_analysis(request["stats"], return_dict=True), None
+        except Exception as e:
+            yield request.get("id"), None, str(e)
+
+
+def analyze_payload(payload):
+    """
+    Process-pool entry point: analyzes one JSON-lines chunk of requests and
+    returns the results as JSON lines of [id, result, error].
+    """
+    requests = (json.loads(line) for line in payload.splitlines())
+    return "\n".join(json.dumps(list(item)) for item in analyze_requests(requests))
+
+
+def analyze_requests_parallel(requests, workers, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Same output as analyze_requests, computed on a process pool. Each chunk of
+    requests travels as one JSON-lines string and results keep input order.
+    """
+    payloads = ("\n".join(json.dumps(r) for r in chunk) for chunk in chunked(requests, chunk_size))
+    for payload in parallel_map(analyze_payload, payloads, workers=workers):
+        for line in payload.splitlines():
+            match_id, result, error = json.loads(line)
+            yield match_id, result, error
+
+
+def write_results(conn, results, chunk_size=DEFAULT_CHUNK_SIZE, output=None):
+    """
+    Writes results to the `matches` table with executemany, one transaction per
+    chunk, and optionally mirrors every result to a JSON-lines stream.
+    Returns (written, failed).
+    """
+    written = failed = 0
+    started = time.perf_counter()
+    for chunk in chunked(results, chunk_size):
+        rows = []
+        for match_id, result, error in chunk:
+            timings = result.pop("timings", None) if result else None
+            if timings:
+                analysis.PROFILER.add(timings)
+            if output is not None:
+                line = {"id": match_id, "error": error} if error else {"id": match_id, "result": result}
+                if timings:
+                    line["timings"] = timings
+                output.write(json.dumps(line) + "\n")
+            if error:
+                failed += 1
+                print(f"[BATCH] Failed to analyze match ID {match_id}: {error}", file=sys.stderr)
+                continue
+            rows.append((
+                result["home_win"], result["draw"], result["away_win"],
+                result["score_prediction"], result["confidence"], match_id,
+            ))
+        if conn is not None and rows:
+            with conn:
+                conn.executemany(UPDATE_SQL, rows)
+        written += len(rows)
+
+        elapsed = time.perf_counter() - started
+        rate = (written + failed) / elapsed if elapsed > 0 else 0.0
+        print(f"[BATCH] {written + failed} matches processed ({failed} failed), {rate:,.0f} matches/sec", file=sys.stderr)
+    return written, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="analysis.py batch", description="Analyze many matches in one process.")
+    parser.add_argument("--input", help="JSON-lines file of {\"id\", \"stats\"} requests. Defaults to unanalyzed matches in the database.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database to read from / write results to.")
+    parser.add_argument("--output", help="Also write every result as JSON lines to this file ('-' for stdout).")
+    parser.add_argument("--no-db-write", action="store_true", help="Do not write results back to the database.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Matches per write transaction and per worker payload.")
+    parser.add_argument("--markets", action="store_true", help="Include derived markets (over/under, BTTS, handicaps, ...) in --output results for database matches.")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (0 = one per CPU core).")
+    parser.add_argument("--profile", action="store_true", help="Aggregate per-stage timings (p50/p95/p99) and report them on stderr.")
+    args = parser.parse_args(argv)
+    if args.profile:
+        analysis.enable_profiling()
+
+    needs_db = not args.input or not args.no_db_write
+    conn = connect(args.db, readonly=args.no_db_write) if needs_db else None
+    output = None
+    try:
+        if args.output == '-':
+            output = sys.stdout
+        elif args.output:
+            output = open(args.output, 'w', encoding='utf-8')
+
+        requests = requests_from_jsonl(args.input) if args.input else requests_from_db(
+            conn, args.chunk_size, markets=args.markets, save_index=not args.no_db_write
+        )
+        if args.workers == 1:
+            results = analyze_requests(requests)
+        else:
+            results = analyze_requests_parallel(requests, args.workers or None, args.chunk_size)
+
+        started = time.perf_counter()
+        written, failed = write_results(
+            None if args.no_db_write else conn,
+            results,
+            chunk_size=args.chunk_size,
+            output=output,
+        )
+        elapsed = time.perf_counter() - started
+        print(f"[BATCH] Done: {written} analyzed, {failed} failed in {elapsed:.2f}s", file=sys.stderr)
+        analysis.report_profile("batch")
+    finally:
+        if output is not None and output is not sys.stdout:
+            output.close()
+        if conn is not None:
+            conn.close()
+    return 0 if not failed else 1
@@ -0,0 +1,204 @@
+"""
+Vectorized batch version of analysis.calculate_outcome_probabilities.
+
+Scores many matches at once with NumPy over a shared goal grid that is sized
+per chunk from the largest xG (the same tail-mass rule as analysis.goal_pmf),
+producing the same numbers as the scalar function (to float tolerance).
+"""
+import numpy as np
+
+from analysis import TAIL_EPSILON, goal_pmf
+from markets import ASIAN_HANDICAP_LINES, CORRECT_SCORE_TOP_N, OVER_UNDER_LINES
+
+# Keeps the per-chunk arrays at a few tens of MB regardless of N.
+DEFAULT_CHUNK_SIZE = 65536
+
+
+def grid_size(xg, epsilon=TAIL_EPSILON):
+    """Number of goal cells (0..n-1) needed so every xG in the array has tail mass below epsilon."""
+    xg = np.asarray(xg, dtype=float)
+    largest = float(xg.max()) if xg.size else 0.0
+    # Poisson tails grow with the mean, so the largest xG bounds the whole array.
+    return len(goal_pmf(largest, epsilon))
+
+
+def goal_probabilities(xg, size):
+    """Poisson goal PMFs over 0..size-1, one row per xG, via the multiplicative recurrence."""
+    xg = np.maximum(np.asarray(xg, dtype=float), 0.0)
+    pmf = np.empty((len(xg), size))
+    pmf[:, 0] = np.exp(-xg)
+    pmf[:, 1:] = xg[:, None] / np.arange(1, size)[None, :]
+    np.cumprod(pmf, axis=1, out=pmf)
+    return pmf
+
+
+def score_matrices(home_xg, away_xg, epsilon=TAIL_EPSILON):
+    """Returns an (N, H, A) array of scoreline probabilities, home goals on axis 1."""
+    home = goal_probabilities(home_xg, grid_size(home_xg, epsilon))
+    away = goal_probabilities(away_xg, grid_size(away_xg, epsilon))
+    return home[:, :, None] * away[:, None, :]
+
+
+def _mass_below(pmf, size):
+    """P(X < k) for k in 0..size-1, one row per PMF."""
+    cdf = np.cumsum(pmf, axis=1)
+    below = cdf[:, np.clip(np.arange(size) - 1, 0, pmf.shape[1] - 1)]
+    below[:, 0] = 0.0
+    return below
+
+
+def _score_chunk(home_xg, away_xg, epsilon):
+    home = goal_probabilities(home_xg, grid_size(home_xg, epsilon))
+    away = goal_probabilities(away_xg, grid_size(away_xg, epsilon))
+
+    # Skellam (goal-difference) evaluation from running CDFs, O(N * grid).
+    shared = min(home.shape[1], away.shape[1])
+    draw = (home[:, :shared] * away[:, :shared]).sum(axis=1)
+    home_win = (home * _mass_below(away, home.shape[1])).sum(axis=1)
+    away_win = (away * _mass_below(home, away.shape[1])).sum(axis=1)
+
+    total = home_win + draw + away_win
+    home_win, draw, away_win = home_win / total, draw / total, away_win / total
+
+    # argmax returns the first maximum, matching the scalar mode selection.
+    home_mode = home.argmax(axis=1)
+    away_mode = away.argmax(axis=1)
+    rows = np.arange(len(home))
+    max_prob = home[rows, home_mode] * away[rows, away_mode]
+    return home_win, draw, away_win, home_mode, away_mode, max_prob
+
+
+def batch_outcome_probabilities(home_xg, away_xg, chunk_size=DEFAULT_CHUNK_SIZE, epsilon=TAIL_EPSILON, precision=None):
+    """
+    Calculates win/draw/loss probabilities, the most likely score and its
+    probability for N matches at once.
+
+    With `precision` set, xG is rounded to that many decimals (as ScoreCache
+    keys are) and each distinct pair is scored only once.
+
+    Returns a dict of length-N arrays: home_win, draw, away_win,
+    most_likely_home, most_likely_away and max_prob.
+    """
+    home_xg = np.atleast_1d(np.asarray(home_xg, dtype=float))
+    away_xg = np.atleast_1d(np.asarray(away_xg, dtype=float))
+    if home_xg.shape != away_xg.shape or home_xg.ndim != 1:
+        raise ValueError("home_xg and away_xg must be 1-D arrays of the same length")
+
+    if precision is not None:
+        pairs = np.round(np.column_stack((home_xg, away_xg)), precision)
+        unique_pairs, inverse = np.unique(pairs, axis=0, return_inverse=True)
+        unique_result = batch_outcome_probabilities(unique_pairs[:, 0], unique_pairs[:, 1], chunk_size, epsilon)
+        return {key: values[inverse.ravel()] for key, values in unique_result.items()}
+
+    n = len(home_xg)
+    result = {
+        "home_win": np.empty(n),
+        "draw": np.empty(n),
+        "away_win": np.empty(n),
+        "most_likely_home": np.empty(n, dtype=int),
+        "most_likely_away": np.empty(n, dtype=int),
+        "max_prob": np.empty(n),
+    }
+    keys = list(result)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        for key, values in zip(keys, _score_chunk(home_xg[start:stop], away_xg[start:stop], epsilon)):
+            result[key][start:stop] = values
+    return result
+
+
+def _handicap_weights(diff_values, lines):
+    """(home, push, away) settlement fractions per (line, goal difference); quarter lines split the stake."""
+    home = np.zeros((len(lines), len(diff_values)))
+    push = np.zeros_like(home)
+    away = np.zeros_like(home)
+    for i, line in enumerate(lines):
+        halves = (line - 0.25, line + 0.25) if (line * 4) % 2 else (line,)
+        for part in halves:
+            adjusted = diff_values + part
+            home[i] += (adjusted > 0) / len(halves)
+            push[i] += (adjusted == 0) / len(halves)
+            away[i] += (adjusted < 0) / len(halves)
+    return home, push, away
+
+
+def _markets_chunk(home_xg, away_xg, low_score_shift, epsilon, top_n):
+    matrices = score_matrices(home_xg, away_xg, epsilon)
+    n, n_home, n_away = matrices.shape
+    if low_score_shift is not None:
+        shift = low_score_shift[:, None, None] * np.array([[-1.0, 1.0], [1.0, -1.0]])
+        matrices[:, :2, :2] += shift[:, :min(2, n_home), :min(2, n_away)]
+    mass = matrices.sum(axis=(1, 2))
+    matrices /= mass[:, None, None]
+
+    # Total-goals and goal-difference distributions, one home-goals row at a time.
+    totals = np.zeros((n, n_home + n_away - 1))
+    diffs = np.zeros_like(totals)
+    for h in range(n_home):
+        totals[:, h:h + n_away] += matrices[:, h, :]
+        diffs[:, h:h + n_away] += matrices[:, h, ::-1]
+    diff_values = np.arange(-(n_away - 1), n_home)
+
+    home_win = diffs[:, diff_values > 0].sum(axis=1)
+    draw = diffs[:, n_away - 1]
+    away_win = diffs[:, diff_values < 0].sum(axis=1)
+    decisive = home_win + away_win
+    safe_decisive = np.where(decisive > 0, decisive, 1.0)
+
+    cumulative = np.cumsum(totals, axis=1)
+    under = cumulative[:, [min(int(line), totals.shape[1] - 1) for line in OVER_UNDER_LINES]]
+
+    ah_home, ah_push, ah_away = _handicap_weights(diff_values, ASIAN_HANDICAP_LINES)
+
+    flat = matrices.reshape(n, n_home * n_away)
+    # Stable sort keeps ties in (home, away) order, as heapq.nlargest does in markets.py.
+    top = np.argsort(-flat, axis=1, kind='stable')[:, :top_n]
+
+    return {
+        "home_win": home_win,
+        "draw": draw,
+        "away_win": away_win,
+        "double_chance_1x": home_win + draw,
+        "double_chance_x2": draw + away_win,
+        "double_chance_12": decisive,
+        "draw_no_bet_home": np.where(decisive > 0, home_win / safe_decisive, 0.5),
+        "draw_no_bet_away": np.where(decisive > 0, away_win / safe_decisive, 0.5),
+        "under": under,
+        "over": 1.0 - under,
+        "btts_yes": matrices[:, 1:, 1:].sum(axis=(1, 2)),
+        "ah_home": diffs @ ah_home.T,
+        "ah_push": diffs @ ah_push.T,
+        "ah_away": diffs @ ah_away.T,
+        "correct_score_home": top // n_away,
+        "correct_score_away": top % n_away,
+        "correct_score_prob": np.take_along_axis(flat, top, axis=1),
+    }
+
+
+def batch_markets(home_xg, away_xg, low_score_shift=None, chunk_size=DEFAULT_CHUNK_SIZE // 8,
+                  epsilon=TAIL_EPSILON, top_n=CORRECT_SCORE_TOP_N):
+    """
+    Vectorized markets.derive_markets: every market for N matches from one
+    (N, H, A) score matrix per chunk.
+
+    Returns a dict of arrays. Per-match markets are length N; `over`/`under`
+    have one column per markets.OVER_UNDER_LINES entry, `ah_*` one column per
+    markets.ASIAN_HANDICAP_LINES entry and `correct_score_*` the top_n scores
+    in descending order. `low_score_shift` (length N) applies the Dixon-Coles
+    adjustment as in derive_markets.
+    """
+    home_xg = np.atleast_1d(np.asarray(home_xg, dtype=float))
+    away_xg = np.atleast_1d(np.asarray(away_xg, dtype=float))
+    if home_xg.shape != away_xg.shape or home_xg.ndim != 1:
+        raise ValueError("home_xg and away_xg must be 1-D arrays of the same length")
+    if low_score_shift is not None:
+        low_score_shift = np.broadcast_to(np.asarray(low_score_shift, dtype=float), home_xg.shape)
+
+    chunks = []
+    for start in range(0, len(home_xg), chunk_size):
+        stop = start + chunk_size
+        shift = None if low_score_shift is None else low_score_shift[start:stop]
+        chunks.append(_markets_chunk(home_xg[start:stop], away_xg[start:stop], shift, epsilon, top_n))
+    if not chunks:
+        return _markets_chunk(home_xg, away_xg, None, epsilon, top_n)
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
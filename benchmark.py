@@ -0,0 +1,376 @@
+"""
+Offline benchmark suite for the analysis and scraper hot paths.
+
+Every benchmark runs on seeded synthetic fixtures or on the recorded pages in
+scraper/corpus, so results only depend on the code and the machine. Each one
+is timed best-of-N and reported per item (call, match, line, page or process)
+together with environment metadata. `compare` fails when a benchmark got
+slower than a stored baseline by more than the threshold.
+
+Usage:
+    python benchmark.py run [--output results.json] [--quick] [--only NAME,...]
+    python benchmark.py run --save-baseline            # store as benchmark_baseline.json
+    python benchmark.py run --baseline benchmark_baseline.json [--threshold 0.15]
+    python benchmark.py compare BASELINE.json CURRENT.json [--threshold 0.15]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRAPER_DIR = os.path.join(ROOT_DIR, 'scraper')
+sys.path.insert(0, SCRAPER_DIR)
+
+import analysis  # noqa: E402
+import page_parser  # noqa: E402
+import text_parser  # noqa: E402
+
+DEFAULT_OUTPUT = os.path.join(ROOT_DIR, 'benchmark_results.json')
+DEFAULT_BASELINE = os.path.join(ROOT_DIR, 'benchmark_baseline.json')
+HTML_FIXTURE = os.path.join(text_parser.CORPUS_DIR, 'league-page.html')
+DEFAULT_THRESHOLD = 0.15
+DEFAULT_REPEAT = 5
+SEED = 20240601
+
+# Fixture sizes: (default, --quick).
+SCALAR_MATCHES = (10_000, 1_000)
+BATCH_MATCHES = (1_000_000, 100_000)
+TEXT_LINES = (1_000_000, 100_000)
+HTML_PAGES = (50, 5)
+COLD_STARTS = (10, 3)
+WEEKEND_CARD = (250, 50)
+
+
+def synthetic_xg(rng, n):
+    return [(rng.uniform(0.2, 3.5), rng.uniform(0.2, 3.0)) for _ in range(n)]
+
+
+def synthetic_stats(rng, n):
+    """detailed_analysis inputs shaped like the ai-predict route's payload."""
+    requests = []
+    for _ in range(n):
+        def team():
+            played = rng.randint(5, 38)
+            return {"played": played, "goals_for": rng.randint(played // 2, played * 2), "goals_against": rng.randint(played // 2, played * 2)}
+
+        stats = {
+            "is_simulation": False,
+            "home": team(),
+            "away": team(),
+            "league_avg_home_goals": rng.uniform(1.3, 1.7),
+            "league_avg_away_goals": rng.uniform(1.0, 1.3),
+            "home_form_raw": [{"result": rng.choice("WDL")} for _ in range(5)],
+            "away_form_raw": [{"result": rng.choice("WDL")} for _ in range(5)],
+            "injuries": {"home": rng.randint(0, 3), "away": rng.randint(0, 3)},
+        }
+        if rng.random() < 0.7:
+            stats["odds"] = {"home": rng.uniform(1.2, 6.0), "draw": rng.uniform(2.8, 4.5), "away": rng.uniform(1.5, 9.0)}
+        requests.append(stats)
+    return requests
+
+
+def clear_caches():
+    analysis.SCORE_CACHE.clear()
+    analysis.MARKET_CACHE.clear()
+
+
+# --- Benchmarks: each setup returns (run, unit); run() does the work and returns the item count. ---
+
+def bench_poisson_probability(rng, n):
+    means = [rng.uniform(0.2, 3.5) for _ in range(n)]
+    poisson_probability = analysis.poisson_probability
+
+    def run():
+        for mean in means:
+            for goals in range(10):
+                poisson_probability(goals, mean)
+        return len(means) * 10
+    return run, "call"
+
+
+def bench_calculate_outcome_probabilities(rng, n):
+    pairs = synthetic_xg(rng, n)
+    calculate = analysis.calculate_outcome_probabilities
+
+    def run():
+        for home_xg, away_xg in pairs:
+            calculate(home_xg, away_xg, return_details=True)
+        return len(pairs)
+    return run, "match"
+
+
+def bench_detailed_analysis(rng, n):
+    requests = synthetic_stats(rng, n)
+    detailed_analysis = analysis.detailed_analysis
+
+    def run():
+        clear_caches()
+        for stats in requests:
+            detailed_analysis(stats)
+        return len(requests)
+    return run, "match"
+
+
+def bench_fallback_analysis(rng, n):
+    names = [(f"Team {rng.randint(0, 10**6)}", f"Team {rng.randint(0, 10**6)}") for _ in range(n)]
+    fallback_analysis = analysis.fallback_analysis
+
+    def run():
+        clear_caches()
+        for home, away in names:
+            fallback_analysis(home, away)
+        return len(names)
+    return run, "match"
+
+
+def bench_batch_outcome_probabilities(rng, n):
+    import numpy as np
+    from batch_scoring import batch_outcome_probabilities
+
+    generator = np.random.default_rng(rng.randrange(2**32))
+    home_xg = generator.uniform(0.2, 3.5, n)
+    away_xg = generator.uniform(0.2, 3.0, n)
+
+    def run():
+        batch_outcome_probabilities(home_xg, away_xg)
+        return n
+    return run, "match"
+
+
+def bench_stake_optimizer(rng, n):
+    import numpy as np
+    from stake_optimizer import optimize_stakes
+
+    generator = np.random.default_rng(rng.randrange(2**32))
+    market = generator.dirichlet([4, 3, 3], n)
+    odds = np.round(1 / (market * 1.05), 2)
+    model = market * generator.uniform(0.9, 1.1, (n, 3))
+
+    def run():
+        optimize_stakes(model, odds)
+        return n * 3
+    return run, "market"
+
+
+def bench_in_play_events(rng, n):
+    from in_play import LiveMatch
+
+    matches = [LiveMatch(rng.uniform(0.5, 2.5), rng.uniform(0.4, 2.0)) for _ in range(300)]
+    kinds = ("tick", "tick", "tick", "goal", "red_card")
+    events = [
+        (rng.choice(matches), {"type": rng.choice(kinds), "team": rng.choice(("home", "away")), "minute": 95 * i / n})
+        for i in range(n)
+    ]
+
+    def run():
+        for match in matches:
+            match.minute = 0.0
+            match.goals = {"home": 0, "away": 0}
+            match.reds = {"home": 0, "away": 0}
+        for match, event in events:
+            match.apply(event)
+        return len(events)
+    return run, "event"
+
+
+def bench_text_parser(rng, n):
+    corpus = text_parser.load_corpus()
+    for name, page_text, expected in corpus:
+        if text_parser.parse_page_text(page_text, text_parser.CORPUS_TODAY) != expected:
+            raise AssertionError(f"text parser no longer matches the recorded corpus ({name})")
+    page_lines = "\n".join(page_text for _, page_text, _ in corpus).split("\n")
+    lines = page_lines * max(1, -(-n // len(page_lines)))
+
+    def run():
+        text_parser.parse_lines(lines)
+        return len(lines)
+    return run, "line"
+
+
+def bench_row_parser(rng, n):
+    with open(HTML_FIXTURE, encoding='utf-8') as f:
+        html = f.read()
+    with open(HTML_FIXTURE[:-len('.html')] + '.expected.json', encoding='utf-8') as f:
+        expected = json.load(f)
+    if page_parser.parse_matches(html) != expected:
+        raise AssertionError("row parser no longer matches the recorded page")
+
+    def run():
+        for _ in range(n):
+            page_parser.parse_matches(html)
+        return n
+    return run, "page"
+
+
+def bench_analysis_cold_start(rng, n):
+    command = [sys.executable, os.path.join(ROOT_DIR, 'analysis.py')]
+
+    def run():
+        # One run of `python analysis.py`; the harness keeps the fastest of `repeat` runs.
+        for _ in range(n):
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, cwd=ROOT_DIR)
+        return n
+    return run, "process"
+
+
+BENCHMARKS = [
+    ("poisson_probability", bench_poisson_probability, SCALAR_MATCHES),
+    ("calculate_outcome_probabilities", bench_calculate_outcome_probabilities, SCALAR_MATCHES),
+    ("detailed_analysis", bench_detailed_analysis, SCALAR_MATCHES),
+    ("fallback_analysis", bench_fallback_analysis, SCALAR_MATCHES),
+    ("batch_outcome_probabilities", bench_batch_outcome_probabilities, BATCH_MATCHES),
+    ("stake_optimizer", bench_stake_optimizer, WEEKEND_CARD),
+    ("in_play_events", bench_in_play_events, SCALAR_MATCHES),
+    ("text_parser", bench_text_parser, TEXT_LINES),
+    ("row_parser", bench_row_parser, HTML_PAGES),
+    ("analysis_cold_start", bench_analysis_cold_start, COLD_STARTS),
+]
+
+
+def environment():
+    """Metadata stored with every result file, so comparisons across machines can be spotted."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": numpy_version,
+    }
+
+
+def run_benchmarks(only=None, quick=False, repeat=DEFAULT_REPEAT):
+    results = {}
+    for name, setup, sizes in BENCHMARKS:
+        if only and name not in only:
+            continue
+        size = sizes[1] if quick else sizes[0]
+        try:
+            run, unit = setup(random.Random(SEED), size)
+        except ImportError as e:
+            print(f"[BENCH] {name}: skipped ({e})", file=sys.stderr)
+            continue
+
+        best, items = float("inf"), 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            items = run()
+            best = min(best, time.perf_counter() - started)
+        results[name] = {
+            "items": items,
+            "unit": unit,
+            "best_s": round(best, 6),
+            "per_item_us": round(best / items * 1e6, 4),
+            "items_per_sec": round(items / best, 1),
+            "repeat": repeat,
+        }
+        print(f"[BENCH] {name}: {results[name]['per_item_us']:,.3f} us/{unit} ({items:,} items, best of {repeat})", file=sys.stderr)
+    return results
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Prints a comparison table and returns the names of benchmarks that regressed beyond `threshold`."""
+    for key in ("python", "machine", "cpu_count", "numpy"):
+        if baseline["environment"].get(key) != current["environment"].get(key):
+            print(f"warning: {key} differs ({baseline['environment'].get(key)} vs {current['environment'].get(key)}); "
+                  "timings may not be comparable")
+
+    regressions = []
+    print(f"{'benchmark':34} {'baseline':>14} {'current':>14} {'change':>9}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:34} {'-':>14} {result['per_item_us']:>11,.3f} us {'new':>9}")
+            continue
+        change = result["per_item_us"] / base["per_item_us"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:34} {base['per_item_us']:>11,.3f} us {result['per_item_us']:>11,.3f} us {change:>+8.1%}{flag}")
+    for name in baseline["results"]:
+        if name not in current["results"]:
+            print(f"{name:34} not run")
+    return regressions
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write(path, payload):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2)
+        f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the analysis and scraper hot paths.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks and write a JSON result file.")
+    run_parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    run_parser.add_argument("--only", help="Comma-separated benchmark names: " + ", ".join(name for name, _, _ in BENCHMARKS))
+    run_parser.add_argument("--quick", action="store_true", help="Smaller fixtures (1k matches) for a fast smoke run.")
+    run_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Runs per benchmark; the fastest counts.")
+    run_parser.add_argument("--save-baseline", action="store_true", help=f"Also store the results as {os.path.basename(DEFAULT_BASELINE)}.")
+    run_parser.add_argument("--baseline", help="Compare against this result file and fail on regressions.")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown per item (0.15 = 15%%).")
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files; exit 1 on regressions.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown per item (0.15 = 15%%).")
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        baseline, current = _load(args.baseline), _load(args.current)
+    else:
+        only = set(args.only.split(",")) if args.only else None
+        current = {
+            "environment": environment(),
+            "settings": {"quick": args.quick, "repeat": args.repeat},
+            "results": run_benchmarks(only, quick=args.quick, repeat=max(1, args.repeat)),
+        }
+        _write(args.output, current)
+        print(f"[BENCH] Results written to {args.output}", file=sys.stderr)
+        if args.save_baseline:
+            _write(DEFAULT_BASELINE, current)
+            print(f"[BENCH] Baseline stored in {DEFAULT_BASELINE}", file=sys.stderr)
+        if not args.baseline:
+            return 0
+        baseline = _load(args.baseline)
+
+    if baseline.get("settings", {}).get("quick") != current.get("settings", {}).get("quick"):
+        print("warning: baseline and current runs used different fixture sizes (--quick)")
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,407 @@
+"""
+Dixon-Coles team ratings fitted on finished matches in bahis.db.
+
+Each team gets an attack and a defense rating; together with a shared home
+advantage they give log-linear expected goals
+
+    log(home_xg) = home_advantage + attack[home] + defense[away]
+    log(away_xg) = attack[away] + defense[home]
+
+and rho corrects the probabilities of the 0-0, 1-0, 0-1 and 1-1 scores.
+Matches are weighted by an exponential time decay. The fit is a vectorized
+maximum likelihood (block Fisher scoring), and an update warm-starts from the
+stored ratings so a new round of results only needs a few iterations.
+
+Usage: python dixon_coles.py [--db bahis.db] [--half-life 180] [--full]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bahis.db')
+DEFAULT_HALF_LIFE_DAYS = 180.0
+DEFAULT_HOME_ADVANTAGE = 0.25
+FULL_FIT_MAX_ITER = 200
+WARM_START_MAX_ITER = 10
+TOLERANCE = 1e-6
+# Small ridge penalty keeps teams with very few matches close to average.
+RIDGE = 1e-3
+SECONDS_PER_DAY = 86400.0
+
+RESULTS_SQL = """
+    SELECT home_team_id, away_team_id, home_score, away_score, match_date
+    FROM matches
+    WHERE status = 'FT' AND home_score IS NOT NULL AND away_score IS NOT NULL
+      AND home_team_id IS NOT NULL AND away_team_id IS NOT NULL AND match_date IS NOT NULL
+    ORDER BY match_date
+"""
+
+
+def load_results(conn, before=None):
+    """Finished results as NumPy arrays (home, away, home_goals, away_goals, kickoff seconds)."""
+    sql, params = RESULTS_SQL, ()
+    if before is not None:
+        sql = RESULTS_SQL.replace("ORDER BY", "AND match_date < ? ORDER BY")
+        params = (before,)
+    rows = conn.execute(sql, params).fetchall()
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return {"home": empty, "away": empty, "home_goals": empty, "away_goals": empty, "kickoff": empty}
+    data = np.array(rows, dtype=np.float64)
+    return {
+        "home": data[:, 0].astype(np.int64),
+        "away": data[:, 1].astype(np.int64),
+        "home_goals": data[:, 2],
+        "away_goals": data[:, 3],
+        "kickoff": data[:, 4],
+    }
+
+
+def time_decay_weights(kickoff, half_life_days=DEFAULT_HALF_LIFE_DAYS, reference_time=None):
+    """Exponential weights halving every `half_life_days` before the reference time."""
+    if len(kickoff) == 0:
+        return np.empty(0)
+    if reference_time is None:
+        reference_time = kickoff.max()
+    age_days = np.maximum(reference_time - kickoff, 0.0) / SECONDS_PER_DAY
+    return 0.5 ** (age_days / half_life_days)
+
+
+def tau(home_goals, away_goals, home_xg, away_xg, rho):
+    """Dixon-Coles low-score correction factor for each match."""
+    result = np.ones_like(home_xg)
+    low = (home_goals <= 1) & (away_goals <= 1)
+    h, a = home_goals[low], away_goals[low]
+    lam, mu = home_xg[low], away_xg[low]
+    result[low] = np.select(
+        [(h == 0) & (a == 0), (h == 0) & (a == 1), (h == 1) & (a == 0)],
+        [1 - lam * mu * rho, 1 + lam * rho, 1 + mu * rho],
+        default=1 - rho,
+    )
+    return result
+
+
+def connected_components(home, away, n):
+    """Labels teams 0..k-1 by the groups (e.g. separate leagues) connected through matches."""
+    labels = np.arange(n)
+    while True:
+        lowest = np.minimum(labels[home], labels[away])
+        updated = labels.copy()
+        np.minimum.at(updated, home, lowest)
+        np.minimum.at(updated, away, lowest)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    return np.unique(labels, return_inverse=True)[1].ravel()
+
+
+class DixonColesModel:
+    """Fitted Dixon-Coles ratings with O(1) expected-goals lookups by team id."""
+
+    def __init__(self, team_ids=(), attack=None, defense=None, home_advantage=DEFAULT_HOME_ADVANTAGE, rho=0.0,
+                 half_life_days=DEFAULT_HALF_LIFE_DAYS, fitted_through=None, matches_used=0):
+        self.team_ids = [int(t) for t in team_ids]
+        self.index = {team_id: i for i, team_id in enumerate(self.team_ids)}
+        n = len(self.team_ids)
+        self.attack = np.zeros(n) if attack is None else np.asarray(attack, dtype=float)
+        self.defense = np.zeros(n) if defense is None else np.asarray(defense, dtype=float)
+        self.home_advantage = float(home_advantage)
+        self.rho = float(rho)
+        self.half_life_days = float(half_life_days)
+        self.fitted_through = fitted_through
+        self.matches_used = matches_used
+
+    def __contains__(self, team_id):
+        return team_id in self.index
+
+    def expected_goals(self, home_id, away_id):
+        """Returns (home_xg, away_xg) for a fixture. Raises KeyError for unrated teams."""
+        h, a = self.index[home_id], self.index[away_id]
+        home_xg = np.exp(self.home_advantage + self.attack[h] + self.defense[a])
+        away_xg = np.exp(self.attack[a] + self.defense[h])
+        return float(home_xg), float(away_xg)
+
+    def _extend_teams(self, team_ids):
+        """Adds unseen teams with average (zero) ratings so a warm start can cover them."""
+        new_ids = sorted(set(int(t) for t in team_ids) - set(self.index))
+        if not new_ids:
+            return
+        for team_id in new_ids:
+            self.index[team_id] = len(self.team_ids)
+            self.team_ids.append(team_id)
+        self.attack = np.concatenate([self.attack, np.zeros(len(new_ids))])
+        self.defense = np.concatenate([self.defense, np.zeros(len(new_ids))])
+
+    def log_likelihood(self, results, weights):
+        home, away, lam, mu = self._rates(results)
+        x, y = results["home_goals"], results["away_goals"]
+        t = tau(x, y, lam, mu, self.rho)
+        return float(np.sum(weights * (np.log(t) + x * np.log(lam) - lam + y * np.log(mu) - mu)))
+
+    def _rates(self, results):
+        home = np.fromiter((self.index[t] for t in results["home"]), dtype=np.int64, count=len(results["home"]))
+        away = np.fromiter((self.index[t] for t in results["away"]), dtype=np.int64, count=len(results["away"]))
+        lam = np.exp(self.home_advantage + self.attack[home] + self.defense[away])
+        mu = np.exp(self.attack[away] + self.defense[home])
+        return home, away, lam, mu
+
+    def fit(self, results, max_iter=FULL_FIT_MAX_ITER, tol=TOLERANCE, reference_time=None):
+        """
+        Maximises the time-weighted Dixon-Coles likelihood, starting from the
+        current parameters. Returns the number of iterations used.
+        """
+        if len(results["home"]) == 0:
+            return 0
+        self._extend_teams(np.concatenate([results["home"], results["away"]]))
+        n = len(self.team_ids)
+        x, y = results["home_goals"], results["away_goals"]
+        w = time_decay_weights(results["kickoff"], self.half_life_days, reference_time)
+        home = np.fromiter((self.index[t] for t in results["home"]), dtype=np.int64, count=len(x))
+        away = np.fromiter((self.index[t] for t in results["away"]), dtype=np.int64, count=len(x))
+        component = connected_components(home, away, n)
+        n_components = component.max() + 1
+        component_sizes = np.bincount(component, minlength=n_components)
+        low = (x <= 1) & (y <= 1)
+        is00, is01 = low & (x == 0) & (y == 0), low & (x == 0) & (y == 1)
+        is10, is11 = low & (x == 1) & (y == 0), low & (x == 1) & (y == 1)
+
+        def rates():
+            lam = np.exp(self.home_advantage + self.attack[home] + self.defense[away])
+            mu = np.exp(self.attack[away] + self.defense[home])
+            t = tau(x, y, lam, mu, self.rho)
+            # d log(tau) / d log(rate) for the low-score cells.
+            dlam = np.where(is00, -lam * mu * self.rho, 0.0) + np.where(is01, lam * self.rho, 0.0)
+            dmu = np.where(is00, -lam * mu * self.rho, 0.0) + np.where(is10, mu * self.rho, 0.0)
+            return lam, mu, t, w * (x - lam + dlam / t), w * (y - mu + dmu / t)
+
+        iterations = 0
+        for iterations in range(1, max_iter + 1):
+            previous = (self.attack.copy(), self.defense.copy(), self.home_advantage, self.rho)
+
+            # Attack block: Fisher scoring, exact diagonal information for the Poisson part.
+            lam, mu, t, g_lam, g_mu = rates()
+            grad = np.bincount(home, g_lam, n) + np.bincount(away, g_mu, n) - RIDGE * self.attack
+            info = np.bincount(home, w * lam, n) + np.bincount(away, w * mu, n) + RIDGE
+            self.attack += grad / info
+
+            lam, mu, t, g_lam, g_mu = rates()
+            grad = np.bincount(away, g_lam, n) + np.bincount(home, g_mu, n) - RIDGE * self.defense
+            info = np.bincount(away, w * lam, n) + np.bincount(home, w * mu, n) + RIDGE
+            self.defense += grad / info
+
+            # Ratings are only identified up to a shift between attack and defense,
+            # separately for every group of teams that have played each other.
+            shift = (np.bincount(component, self.attack, n_components) / component_sizes)[component]
+            self.attack -= shift
+            self.defense += shift
+
+            lam, mu, t, g_lam, g_mu = rates()
+            self.home_advantage += g_lam.sum() / np.sum(w * lam)
+
+            lam, mu, t, g_lam, g_mu = rates()
+            d_rho = (np.where(is00, -lam * mu, 0.0) + np.where(is01, lam, 0.0)
+                     + np.where(is10, mu, 0.0) + np.where(is11, -1.0, 0.0)) / t
+            info_rho = np.sum(w * d_rho ** 2)
+            step_rho = np.sum(w * d_rho) / info_rho if info_rho > 0 else 0.0
+            self.rho = self._clip_rho(self.rho + step_rho, lam[low], mu[low])
+
+            largest_change = max(
+                np.abs(self.attack - previous[0]).max(), np.abs(self.defense - previous[1]).max(),
+                abs(self.home_advantage - previous[2]), abs(self.rho - previous[3]),
+            )
+            if largest_change < tol:
+                break
+
+        self.fitted_through = int(results["kickoff"].max())
+        self.matches_used = len(x)
+        return iterations
+
+    @staticmethod
+    def _clip_rho(rho, lam, mu):
+        """Keeps every tau factor positive."""
+        upper, lower = 1.0, -1.0
+        if len(lam):
+            upper = min(upper, 1.0 / float(np.max(lam * mu)))
+            lower = max(lower, -1.0 / float(np.max(lam)), -1.0 / float(np.max(mu)))
+        return float(np.clip(rho, 0.99 * lower, 0.99 * upper))
+
+    def outcome_probabilities(self, home_id, away_id):
+        """(home_xg, away_xg, home_win, draw, away_win, most_likely_score, max_prob) with the rho correction."""
+        from analysis import goal_pmf, skellam_outcome_probabilities
+
+        home_xg, away_xg = self.expected_goals(home_id, away_id)
+        home_pmf, away_pmf = goal_pmf(home_xg), goal_pmf(away_xg)
+        home_win, draw, away_win = skellam_outcome_probabilities(home_pmf, away_pmf)
+
+        # tau moves mass only between the four low-score cells, and the moves cancel
+        # out: 0-0 and 1-1 each lose rho*lam*mu*p00, 1-0 and 0-1 each gain it.
+        p00 = home_pmf[0] * away_pmf[0]
+        shift = self.rho * home_xg * away_xg * p00
+        home_win, draw, away_win = home_win + shift, draw - 2 * shift, away_win + shift
+
+        def cell(h, a):
+            p = (home_pmf[h] if h < len(home_pmf) else 0.0) * (away_pmf[a] if a < len(away_pmf) else 0.0)
+            if h <= 1 and a <= 1:
+                p += shift if h != a else -shift
+            return p
+
+        home_mode = max(range(len(home_pmf)), key=home_pmf.__getitem__)
+        away_mode = max(range(len(away_pmf)), key=away_pmf.__getitem__)
+        candidates = [(home_mode, away_mode), (0, 0), (1, 0), (0, 1), (1, 1)]
+        best = max(candidates, key=lambda score: cell(*score))
+        return home_xg, away_xg, home_win, draw, away_win, list(best), cell(*best)
+
+    def markets(self, home_id, away_id):
+        """markets.derive_markets for the rho-corrected score matrix of one fixture."""
+        from analysis import goal_pmf
+        from markets import derive_markets
+
+        home_xg, away_xg = self.expected_goals(home_id, away_id)
+        home_pmf, away_pmf = goal_pmf(home_xg), goal_pmf(away_xg)
+        shift = self.rho * home_xg * away_xg * home_pmf[0] * away_pmf[0]
+        return derive_markets(home_pmf, away_pmf, low_score_shift=shift)
+
+    def save(self, conn):
+        """Stores the ratings in bahis.db (dc_team_ratings / dc_model_params)."""
+        create_tables(conn)
+        with conn:
+            conn.execute("DELETE FROM dc_team_ratings")
+            conn.executemany(
+                "INSERT INTO dc_team_ratings (team_id, attack, defense) VALUES (?, ?, ?)",
+                zip(self.team_ids, self.attack.tolist(), self.defense.tolist()),
+            )
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO dc_model_params
+                    (id, home_advantage, rho, half_life_days, fitted_through, matches_used, fitted_at)
+                VALUES (1, ?, ?, ?, ?, ?, ?)
+                """,
+                (self.home_advantage, self.rho, self.half_life_days, self.fitted_through, self.matches_used, int(time.time())),
+            )
+
+    @classmethod
+    def load(cls, conn):
+        """Loads stored ratings, or returns None if nothing has been fitted yet."""
+        try:
+            params = conn.execute(
+                "SELECT home_advantage, rho, half_life_days, fitted_through, matches_used FROM dc_model_params WHERE id = 1"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        if params is None:
+            return None
+        rows = conn.execute("SELECT team_id, attack, defense FROM dc_team_ratings ORDER BY team_id").fetchall()
+        team_ids = [r[0] for r in rows]
+        return cls(
+            team_ids,
+            attack=[r[1] for r in rows],
+            defense=[r[2] for r in rows],
+            home_advantage=params[0],
+            rho=params[1],
+            half_life_days=params[2],
+            fitted_through=params[3],
+            matches_used=params[4],
+        )
+
+
+def create_tables(conn):
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS dc_team_ratings (
+            team_id INTEGER PRIMARY KEY,
+            attack REAL NOT NULL,
+            defense REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS dc_model_params (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            home_advantage REAL NOT NULL,
+            rho REAL NOT NULL,
+            half_life_days REAL NOT NULL,
+            fitted_through INTEGER,
+            matches_used INTEGER,
+            fitted_at INTEGER
+        );
+        """
+    )
+
+
+def update_ratings(conn, half_life_days=DEFAULT_HALF_LIFE_DAYS, full=False, max_iter=None):
+    """
+    Fits ratings on all finished matches. Warm-starts from the stored ratings
+    (a few iterations) unless `full` is set or nothing is stored yet.
+    Returns (model, iterations).
+    """
+    model = None if full else DixonColesModel.load(conn)
+    if model is not None and model.half_life_days != half_life_days:
+        model = None
+    warm = model is not None
+    if model is None:
+        model = DixonColesModel(half_life_days=half_life_days)
+    if max_iter is None:
+        max_iter = WARM_START_MAX_ITER if warm else FULL_FIT_MAX_ITER
+
+    results = load_results(conn)
+    iterations = model.fit(results, max_iter=max_iter)
+    model.save(conn)
+    return model, iterations
+
+
+_loaded_models = {}
+
+
+def _stored_version(conn):
+    """(fitted_through, fitted_at) of the stored fit, or None if nothing has been fitted yet."""
+    try:
+        return conn.execute("SELECT fitted_through, fitted_at FROM dc_model_params WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+
+
+def get_model(db_path=DEFAULT_DB_PATH):
+    """
+    Stored ratings for a database (None if unavailable). Kept per process and
+    reloaded only when a newer fit has been saved.
+    """
+    if not os.path.exists(db_path):
+        _loaded_models.pop(db_path, None)
+        return None
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        version = _stored_version(conn)
+        cached = _loaded_models.get(db_path)
+        if cached is None or cached[0] != version:
+            cached = _loaded_models[db_path] = (version, DixonColesModel.load(conn) if version else None)
+    finally:
+        conn.close()
+    return cached[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit Dixon-Coles team ratings on finished matches in bahis.db.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--half-life", type=float, default=DEFAULT_HALF_LIFE_DAYS, help="Time-decay half-life in days.")
+    parser.add_argument("--full", action="store_true", help="Refit from scratch instead of warm-starting.")
+    parser.add_argument("--max-iter", type=int, help="Iteration cap (default: 10 warm, 200 full).")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        started = time.perf_counter()
+        model, iterations = update_ratings(conn, args.half_life, full=args.full, max_iter=args.max_iter)
+        elapsed = time.perf_counter() - started
+    finally:
+        conn.close()
+    print(
+        f"[DIXON-COLES] {model.matches_used} matches, {len(model.team_ids)} teams, {iterations} iterations "
+        f"in {elapsed:.3f}s (home advantage {model.home_advantage:.3f}, rho {model.rho:.3f})"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
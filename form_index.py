@@ -0,0 +1,371 @@
+"""
+Rolling form and head-to-head index over finished matches in bahis.db.
+
+Per team, ring buffers hold the last N results overall, at home and away,
+with running points and goal totals. Per pair of teams, running head-to-head
+aggregates and the last N meetings are kept. Adding a finished match touches
+two teams and one pair, O(1), so an update only reads the matches finished
+since the stored watermark (kickoff, id). A match that finishes with an older
+kickoff than the watermark (postponed, late result) triggers a full rebuild,
+since ring buffers only take results in order.
+
+The index is stored in bahis.db (form_teams / form_pairs / form_index_params),
+and only teams and pairs touched by an update are rewritten.
+
+Usage:
+    python form_index.py [--db bahis.db] [--full]
+    python form_index.py --team 57 [--pair 57 61]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import deque
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bahis.db')
+DEFAULT_FORM_LENGTH = 5
+RESULT_POINTS = {'W': 3, 'D': 1, 'L': 0}
+
+FINISHED_SQL = """
+    SELECT id, match_date, home_team_id, away_team_id, home_score, away_score
+    FROM matches
+    WHERE status = 'FT' AND home_score IS NOT NULL AND away_score IS NOT NULL
+      AND home_team_id IS NOT NULL AND away_team_id IS NOT NULL AND match_date IS NOT NULL
+"""
+FINISHED_COUNT_SQL = FINISHED_SQL.replace(
+    "SELECT id, match_date, home_team_id, away_team_id, home_score, away_score", "SELECT COUNT(*)"
+)
+
+
+def _result(goals_for, goals_against):
+    return 'W' if goals_for > goals_against else 'D' if goals_for == goals_against else 'L'
+
+
+class FormWindow:
+    """Last `length` results of one team as (match_id, kickoff, result, goals_for, goals_against), with running totals."""
+
+    __slots__ = ("entries", "points", "goals_for", "goals_against")
+
+    def __init__(self, length, entries=()):
+        self.entries = deque(maxlen=length)
+        self.points = self.goals_for = self.goals_against = 0
+        for entry in entries:
+            self.push(tuple(entry))
+
+    def push(self, entry):
+        if len(self.entries) == self.entries.maxlen:
+            _, _, result, goals_for, goals_against = self.entries[0]
+            self.points -= RESULT_POINTS[result]
+            self.goals_for -= goals_for
+            self.goals_against -= goals_against
+        self.entries.append(entry)
+        _, _, result, goals_for, goals_against = entry
+        self.points += RESULT_POINTS[result]
+        self.goals_for += goals_for
+        self.goals_against += goals_against
+
+    def form_raw(self):
+        """Newest first, in the {'result': 'W'|'D'|'L'} shape detailed_analysis takes."""
+        return [{"result": entry[2]} for entry in reversed(self.entries)]
+
+    def summary(self):
+        played = len(self.entries)
+        return {
+            "played": played,
+            "results": "".join(entry[2] for entry in reversed(self.entries)),
+            "points": self.points,
+            "points_per_game": round(self.points / played, 3) if played else 0.0,
+            "goals_for": self.goals_for,
+            "goals_against": self.goals_against,
+            "goal_diff_per_game": round((self.goals_for - self.goals_against) / played, 3) if played else 0.0,
+        }
+
+
+class TeamForm:
+    __slots__ = ("overall", "home", "away")
+
+    def __init__(self, length, state=None):
+        state = state or {}
+        self.overall = FormWindow(length, state.get("overall", ()))
+        self.home = FormWindow(length, state.get("home", ()))
+        self.away = FormWindow(length, state.get("away", ()))
+
+    def state(self):
+        return {"overall": list(self.overall.entries), "home": list(self.home.entries), "away": list(self.away.entries)}
+
+    def summary(self):
+        return {"overall": self.overall.summary(), "home": self.home.summary(), "away": self.away.summary()}
+
+
+class HeadToHead:
+    """All-time aggregates of one pair, from the point of view of the lower team id (a), plus the last meetings."""
+
+    __slots__ = ("played", "wins_a", "wins_b", "draws", "goals_a", "goals_b", "recent")
+
+    def __init__(self, length, state=None):
+        state = state or {}
+        self.played = state.get("played", 0)
+        self.wins_a = state.get("wins_a", 0)
+        self.wins_b = state.get("wins_b", 0)
+        self.draws = state.get("draws", 0)
+        self.goals_a = state.get("goals_a", 0)
+        self.goals_b = state.get("goals_b", 0)
+        self.recent = deque((tuple(m) for m in state.get("recent", ())), maxlen=length)
+
+    def add(self, goals_a, goals_b, meeting):
+        self.played += 1
+        self.goals_a += goals_a
+        self.goals_b += goals_b
+        if goals_a > goals_b:
+            self.wins_a += 1
+        elif goals_a < goals_b:
+            self.wins_b += 1
+        else:
+            self.draws += 1
+        self.recent.append(meeting)
+
+    def state(self):
+        return {"played": self.played, "wins_a": self.wins_a, "wins_b": self.wins_b, "draws": self.draws,
+                "goals_a": self.goals_a, "goals_b": self.goals_b, "recent": list(self.recent)}
+
+
+class FormIndex:
+    def __init__(self, form_length=DEFAULT_FORM_LENGTH, through=(None, None), matches_used=0):
+        self.form_length = form_length
+        self.teams = {}
+        self.pairs = {}
+        # (kickoff, id) of the last match applied.
+        self.through = tuple(through)
+        self.matches_used = matches_used
+        self.dirty_teams = set()
+        self.dirty_pairs = set()
+
+    def _team(self, team_id):
+        team = self.teams.get(team_id)
+        if team is None:
+            team = self.teams[team_id] = TeamForm(self.form_length)
+        return team
+
+    def add_match(self, match_id, kickoff, home_id, away_id, home_goals, away_goals):
+        """Applies one finished match; matches must arrive in (kickoff, id) order."""
+        home_result, away_result = _result(home_goals, away_goals), _result(away_goals, home_goals)
+        home, away = self._team(home_id), self._team(away_id)
+        home.overall.push((match_id, kickoff, home_result, home_goals, away_goals))
+        home.home.push((match_id, kickoff, home_result, home_goals, away_goals))
+        away.overall.push((match_id, kickoff, away_result, away_goals, home_goals))
+        away.away.push((match_id, kickoff, away_result, away_goals, home_goals))
+
+        key = (min(home_id, away_id), max(home_id, away_id))
+        pair = self.pairs.get(key)
+        if pair is None:
+            pair = self.pairs[key] = HeadToHead(self.form_length)
+        meeting = (match_id, kickoff, home_id, away_id, home_goals, away_goals)
+        if home_id == key[0]:
+            pair.add(home_goals, away_goals, meeting)
+        else:
+            pair.add(away_goals, home_goals, meeting)
+
+        self.dirty_teams.update((home_id, away_id))
+        self.dirty_pairs.add(key)
+        self.through = (kickoff, match_id)
+        self.matches_used += 1
+
+    def form_raw(self, team_id, venue="overall"):
+        team = self.teams.get(team_id)
+        return getattr(team, venue).form_raw() if team else []
+
+    def team_form(self, team_id):
+        team = self.teams.get(team_id)
+        return team.summary() if team else None
+
+    def head_to_head(self, team_id, other_id):
+        """Meetings of two teams from `team_id`'s point of view, or None if they never met."""
+        pair = self.pairs.get((min(team_id, other_id), max(team_id, other_id)))
+        if pair is None:
+            return None
+        first = team_id < other_id
+        return {
+            "played": pair.played,
+            "wins": pair.wins_a if first else pair.wins_b,
+            "draws": pair.draws,
+            "losses": pair.wins_b if first else pair.wins_a,
+            "goals_for": pair.goals_a if first else pair.goals_b,
+            "goals_against": pair.goals_b if first else pair.goals_a,
+            "recent": [
+                {"id": match_id, "match_date": kickoff, "home_team_id": home_id, "away_team_id": away_id,
+                 "score": f"{home_goals} - {away_goals}"}
+                for match_id, kickoff, home_id, away_id, home_goals, away_goals in reversed(pair.recent)
+            ],
+        }
+
+    def match_form(self, home_id, away_id):
+        """Everything the index knows for one fixture: both teams' form and their head-to-head."""
+        return {
+            "home": self.team_form(home_id),
+            "away": self.team_form(away_id),
+            "head_to_head": self.head_to_head(home_id, away_id),
+        }
+
+    def save(self, conn, replace=False):
+        """Writes the teams and pairs changed since the last save (everything else is dropped with `replace`), and the watermark."""
+        create_tables(conn)
+        with conn:
+            if replace:
+                conn.execute("DELETE FROM form_teams")
+                conn.execute("DELETE FROM form_pairs")
+            conn.executemany(
+                "INSERT OR REPLACE INTO form_teams (team_id, state) VALUES (?, ?)",
+                [(team_id, json.dumps(self.teams[team_id].state())) for team_id in self.dirty_teams],
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO form_pairs (team_a, team_b, state) VALUES (?, ?, ?)",
+                [(a, b, json.dumps(self.pairs[(a, b)].state())) for a, b in self.dirty_pairs],
+            )
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO form_index_params (id, form_length, through_date, through_id, matches_used, updated_at)
+                VALUES (1, ?, ?, ?, ?, ?)
+                """,
+                (self.form_length, self.through[0], self.through[1], self.matches_used, int(time.time())),
+            )
+        self.dirty_teams.clear()
+        self.dirty_pairs.clear()
+
+    @classmethod
+    def load(cls, conn):
+        """Loads the stored index, or returns None if nothing has been built yet."""
+        try:
+            params = conn.execute(
+                "SELECT form_length, through_date, through_id, matches_used FROM form_index_params WHERE id = 1"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        if params is None:
+            return None
+        index = cls(params[0], (params[1], params[2]), params[3])
+        for team_id, state in conn.execute("SELECT team_id, state FROM form_teams"):
+            index.teams[team_id] = TeamForm(index.form_length, json.loads(state))
+        for team_a, team_b, state in conn.execute("SELECT team_a, team_b, state FROM form_pairs"):
+            index.pairs[(team_a, team_b)] = HeadToHead(index.form_length, json.loads(state))
+        return index
+
+
+def create_tables(conn):
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS form_teams (
+            team_id INTEGER PRIMARY KEY,
+            state TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS form_pairs (
+            team_a INTEGER NOT NULL,
+            team_b INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            PRIMARY KEY (team_a, team_b)
+        );
+        CREATE TABLE IF NOT EXISTS form_index_params (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            form_length INTEGER NOT NULL,
+            through_date INTEGER,
+            through_id INTEGER,
+            matches_used INTEGER NOT NULL,
+            updated_at INTEGER
+        );
+        """
+    )
+
+
+def update_index(conn, form_length=DEFAULT_FORM_LENGTH, full=False, save=True):
+    """
+    Applies matches finished since the stored watermark and saves the changes
+    (with save=False the index is only updated in memory). Rebuilds from
+    scratch when `full` is set, nothing is stored, the form length changed or
+    a match finished out of kickoff order. Returns (index, matches applied).
+    """
+    index = None if full else FormIndex.load(conn)
+    if index is not None and index.form_length != form_length:
+        index = None
+
+    sql, params = FINISHED_SQL, ()
+    if index is not None and index.through[0] is not None:
+        sql += " AND (match_date > ? OR (match_date = ? AND id > ?))"
+        params = (index.through[0], index.through[0], index.through[1])
+    new_matches = conn.execute(sql + " ORDER BY match_date, id", params).fetchall()
+
+    if index is not None:
+        finished = conn.execute(FINISHED_COUNT_SQL).fetchone()[0]
+        if finished != index.matches_used + len(new_matches):
+            print(f"[FORM] {finished - index.matches_used - len(new_matches)} matches finished out of order; rebuilding",
+                  file=sys.stderr)
+            index = None
+            new_matches = conn.execute(FINISHED_SQL + " ORDER BY match_date, id").fetchall()
+
+    rebuild = index is None
+    if rebuild:
+        index = FormIndex(form_length)
+    for match in new_matches:
+        index.add_match(*match)
+    if save:
+        index.save(conn, replace=rebuild)
+    return index, len(new_matches)
+
+
+_loaded_indexes = {}
+
+
+def _stored_version(conn):
+    """(updated_at, matches_used) of the stored index, or None if nothing has been built yet."""
+    try:
+        return conn.execute("SELECT updated_at, matches_used FROM form_index_params WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+
+
+def get_index(db_path=DEFAULT_DB_PATH):
+    """
+    Stored index for a database (None if not built). Kept per process and
+    reloaded only when an update has been saved since.
+    """
+    if not os.path.exists(db_path):
+        _loaded_indexes.pop(db_path, None)
+        return None
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        version = _stored_version(conn)
+        cached = _loaded_indexes.get(db_path)
+        if cached is None or cached[0] != version:
+            cached = _loaded_indexes[db_path] = (version, FormIndex.load(conn) if version else None)
+    finally:
+        conn.close()
+    return cached[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or update the rolling form / head-to-head index in bahis.db.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--form-length", type=int, default=DEFAULT_FORM_LENGTH, help="Results kept per team and venue.")
+    parser.add_argument("--full", action="store_true", help="Rebuild from all finished matches.")
+    parser.add_argument("--team", type=int, help="Print this team's form after updating.")
+    parser.add_argument("--pair", type=int, nargs=2, metavar=("TEAM", "OTHER"), help="Print a head-to-head after updating.")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        started = time.perf_counter()
+        index, applied = update_index(conn, args.form_length, full=args.full)
+        elapsed = time.perf_counter() - started
+    finally:
+        conn.close()
+    print(f"[FORM] {applied} new matches applied ({index.matches_used} total, {len(index.teams)} teams, "
+          f"{len(index.pairs)} pairs) in {elapsed:.3f}s", file=sys.stderr)
+    if args.team is not None:
+        print(json.dumps({"team_id": args.team, "form": index.team_form(args.team)}, indent=2))
+    if args.pair:
+        print(json.dumps({"pair": args.pair, "head_to_head": index.head_to_head(*args.pair)}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+In-play model: 1X2, next goal, totals and final-score probabilities from the
+live state of a match (score, minute, red cards).
+
+The pre-match expected goals are spread over the match by an intensity curve
+(relative goal rate per minute, piecewise linear, configurable). At minute m
+each side's remaining goals are Poisson with mean
+
+    xg * (share of the curve after m) * red-card factor
+
+and the final result is the current score plus those remaining goals.
+Remaining-goal PMFs are memoized on the mean quantized to PMF_STEP, so after
+warm-up an event costs a table lookup and an O(goals) pass over two short
+PMFs instead of a rebuild.
+
+Usage:
+    python in_play.py --home-xg 1.6 --away-xg 1.1 --minute 63 --score 1-0 [--red-cards 0-1]
+    python in_play.py --serve     # JSON lines on stdin/stdout, one live match per match_id
+"""
+import argparse
+import heapq
+import json
+import sys
+import time
+from bisect import bisect_right
+
+from analysis import detailed_analysis, goal_pmf
+from markets import OVER_UNDER_LINES
+from stage_profiler import StageProfiler
+
+MATCH_MINUTES = 95  # 90 plus typical stoppage time
+# (minute, relative goal rate): goals get more frequent as a match goes on,
+# with a dip just after half time.
+DEFAULT_INTENSITY = ((0, 0.85), (44, 1.0), (45, 1.15), (46, 0.9), (89, 1.2), (90, 1.35), (95, 1.35))
+# Per red card: the side's remaining scoring rate and its opponent's.
+RED_CARD_OWN_FACTOR = 0.67
+RED_CARD_OPPONENT_FACTOR = 1.25
+PMF_STEP = 0.002
+FINAL_SCORE_TOP_N = 5
+
+_pmf_cache = {}
+
+
+def remaining_pmf(mean):
+    """Goal PMF for `mean` quantized to PMF_STEP, computed once per process."""
+    key = round(mean / PMF_STEP)
+    pmf = _pmf_cache.get(key)
+    if pmf is None:
+        pmf = _pmf_cache[key] = goal_pmf(key * PMF_STEP)
+    return pmf
+
+
+class IntensityCurve:
+    """Share of a match's expected goals still to come after any minute."""
+
+    def __init__(self, points=DEFAULT_INTENSITY, minutes=MATCH_MINUTES):
+        points = sorted((float(minute), float(rate)) for minute, rate in points)
+        if not points or any(rate < 0 for _, rate in points):
+            raise ValueError("intensity curve needs at least one point and no negative rates")
+        self.minutes = minutes
+        xs = [minute for minute, _ in points]
+
+        def rate_at(t):
+            i = bisect_right(xs, t)
+            if i == 0:
+                return points[0][1]
+            if i == len(points):
+                return points[-1][1]
+            (x0, y0), (x1, y1) = points[i - 1], points[i]
+            return y0 + (y1 - y0) * (t - x0) / (x1 - x0)
+
+        # cumulative[m]: share of the goals expected by the end of minute m (midpoint rule).
+        cumulative = [0.0]
+        for minute in range(minutes):
+            cumulative.append(cumulative[-1] + rate_at(minute + 0.5))
+        total = cumulative[-1]
+        if total <= 0:
+            raise ValueError("intensity curve has no goal rate")
+        self.cumulative = [c / total for c in cumulative]
+
+    @classmethod
+    def parse(cls, text):
+        """'0:0.85,45:1.1,90:1.3' -> IntensityCurve."""
+        return cls([tuple(float(x) for x in point.split(":")) for point in text.split(",")])
+
+    def remaining(self, minute):
+        if minute <= 0:
+            return 1.0
+        if minute >= self.minutes:
+            return 0.0
+        whole = int(minute)
+        share = self.cumulative[whole] + (self.cumulative[whole + 1] - self.cumulative[whole]) * (minute - whole)
+        return 1.0 - share
+
+
+DEFAULT_CURVE = IntensityCurve()
+
+
+def remaining_means(home_xg, away_xg, minute, home_reds=0, away_reds=0, curve=DEFAULT_CURVE):
+    share = curve.remaining(minute)
+    home = home_xg * share * RED_CARD_OWN_FACTOR ** home_reds * RED_CARD_OPPONENT_FACTOR ** away_reds
+    away = away_xg * share * RED_CARD_OWN_FACTOR ** away_reds * RED_CARD_OPPONENT_FACTOR ** home_reds
+    return home, away
+
+
+def in_play_probabilities(home_goals, away_goals, home_mean, away_mean, top_n=FINAL_SCORE_TOP_N):
+    """
+    Probabilities (0-1) given the current score and the remaining expected
+    goals of each side: final 1X2, next goal, final totals and the most
+    likely final scores.
+    """
+    home_pmf, away_pmf = remaining_pmf(home_mean), remaining_pmf(away_mean)
+    lead = home_goals - away_goals
+
+    # Final 1X2: home wins when away's remaining goals y < x + lead.
+    away_cdf, running = [], 0.0
+    for p in away_pmf:
+        running += p
+        away_cdf.append(running)
+    home_win = draw = 0.0
+    last = len(away_pmf) - 1
+    for x, p in enumerate(home_pmf):
+        y = x + lead
+        if y > last:
+            home_win += p * running
+        elif y >= 0:
+            draw += p * away_pmf[y]
+            if y:
+                home_win += p * away_cdf[y - 1]
+    total = home_win + draw
+    away_win = max(0.0, 1.0 - total)
+
+    # The curve scales both sides alike, so whoever scores next does so in proportion to the remaining means.
+    no_goal = home_pmf[0] * away_pmf[0]
+    remaining = home_mean + away_mean
+    home_next = (1 - no_goal) * home_mean / remaining if remaining > 0 else 0.0
+
+    goals = home_goals + away_goals
+    total_pmf = remaining_pmf(remaining)
+    over_under = {}
+    for line in OVER_UNDER_LINES:
+        under = sum(total_pmf[:max(0, int(line) - goals + 1)], 0.0)
+        over_under[f"{line:g}"] = {"over": 1 - under, "under": under}
+
+    cells = heapq.nlargest(
+        top_n, ((ph * pa, x, y) for x, ph in enumerate(home_pmf[:top_n + 2]) for y, pa in enumerate(away_pmf[:top_n + 2]))
+    )
+    return {
+        "home_win": home_win,
+        "draw": draw,
+        "away_win": away_win,
+        "next_goal": {"home": home_next, "none": no_goal, "away": max(0.0, 1 - no_goal - home_next)},
+        "over_under": over_under,
+        "final_scores": [(home_goals + x, away_goals + y, p) for p, x, y in cells],
+        "remaining_xg": {"home": home_mean, "away": away_mean},
+    }
+
+
+def format_probabilities(probs):
+    """Percentages rounded like the pre-match analysis output."""
+    return {
+        "home_win": round(probs["home_win"] * 100, 1),
+        "draw": round(probs["draw"] * 100, 1),
+        "away_win": round(probs["away_win"] * 100, 1),
+        "next_goal": {side: round(p * 100, 1) for side, p in probs["next_goal"].items()},
+        "over_under": {line: {k: round(p * 100, 1) for k, p in v.items()} for line, v in probs["over_under"].items()},
+        "final_scores": [{"score": f"{h} - {a}", "probability": round(p * 100, 1)} for h, a, p in probs["final_scores"]],
+        "remaining_xg": {side: round(xg, 3) for side, xg in probs["remaining_xg"].items()},
+    }
+
+
+class LiveMatch:
+    """State of one live match; apply() takes one event and returns the updated probabilities."""
+
+    EVENTS = ("goal", "goal_cancelled", "red_card", "tick")
+
+    def __init__(self, home_xg, away_xg, curve=DEFAULT_CURVE):
+        if home_xg < 0 or away_xg < 0:
+            raise ValueError("expected goals must not be negative")
+        self.home_xg = home_xg
+        self.away_xg = away_xg
+        self.curve = curve
+        self.minute = 0.0
+        self.goals = {"home": 0, "away": 0}
+        self.reds = {"home": 0, "away": 0}
+
+    @classmethod
+    def from_stats(cls, stats, curve=DEFAULT_CURVE):
+        """Pre-match xG from the same `stats` payload detailed_analysis takes."""
+        result = detailed_analysis(stats, return_dict=True)["stats"]
+        return cls(result["home_xg_poisson"], result["away_xg_poisson"], curve)
+
+    def apply(self, event):
+        kind = event.get("type", "tick")
+        if kind not in self.EVENTS:
+            raise ValueError(f"Unknown event type: {kind}")
+        if event.get("minute") is not None:
+            # Late or re-sent events do not move the clock backwards.
+            self.minute = max(self.minute, min(float(event["minute"]), self.curve.minutes))
+        if kind != "tick":
+            team = event.get("team")
+            if team not in ("home", "away"):
+                raise ValueError("event 'team' must be 'home' or 'away'")
+            if kind == "goal":
+                self.goals[team] += 1
+            elif kind == "goal_cancelled":
+                self.goals[team] = max(0, self.goals[team] - 1)
+            else:
+                self.reds[team] += 1
+        return self.probabilities()
+
+    def probabilities(self):
+        home_mean, away_mean = remaining_means(
+            self.home_xg, self.away_xg, self.minute, self.reds["home"], self.reds["away"], self.curve
+        )
+        return in_play_probabilities(self.goals["home"], self.goals["away"], home_mean, away_mean)
+
+    def state(self):
+        return {"minute": self.minute, "score": f"{self.goals['home']} - {self.goals['away']}",
+                "red_cards": dict(self.reds)}
+
+
+def serve(stdin=sys.stdin, stdout=sys.stdout):
+    """
+    Long-lived in-play worker, one JSON request per line:
+      {"id", "match_id", "home_xg", "away_xg"} or {"id", "match_id", "stats": {...}}  starts tracking a match;
+      {"id", "match_id", "event": {"type": "goal"|"goal_cancelled"|"red_card"|"tick", "team", "minute"}};
+      {"id", "match_id", "command": "close"} stops tracking it;
+      {"id", "command": "stats"} reports tracked matches and per-event latency.
+    Every reply echoes the id; a bad request produces an error line.
+    """
+    matches = {}
+    profiler = StageProfiler(enabled=True)
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            request_id = request.get("id")
+            if request.get("command") == "stats":
+                reply = {"matches": len(matches), "latency": profiler.summary()}
+            else:
+                timer = profiler.timer()
+                match_id = request.get("match_id")
+                if request.get("command") == "close":
+                    reply = {"closed": matches.pop(match_id, None) is not None}
+                elif "event" in request:
+                    match = matches.get(match_id)
+                    if match is None:
+                        raise ValueError(f"Unknown match_id: {match_id}")
+                    probs = match.apply(request["event"])
+                    reply = {**match.state(), **format_probabilities(probs)}
+                    timer.lap("event")
+                else:
+                    curve = IntensityCurve(request["curve"]) if request.get("curve") else DEFAULT_CURVE
+                    if "stats" in request:
+                        match = LiveMatch.from_stats(request["stats"], curve)
+                    else:
+                        match = LiveMatch(float(request["home_xg"]), float(request["away_xg"]), curve)
+                    matches[match_id] = match
+                    reply = {**match.state(), **format_probabilities(match.probabilities())}
+                    timer.lap("start")
+                profiler.add(timer.timings)
+            stdout.write(json.dumps({"id": request_id, "match_id": request.get("match_id"), "result": reply}) + "\n")
+        except Exception as e:
+            stdout.write(json.dumps({"id": request_id, "error": str(e)}) + "\n")
+        stdout.flush()
+
+
+def _pair(text):
+    home, away = text.split("-")
+    return int(home), int(away)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="In-play probabilities from the live state of a match.")
+    parser.add_argument("--serve", action="store_true", help="Track live matches from JSON lines on stdin.")
+    parser.add_argument("--home-xg", type=float)
+    parser.add_argument("--away-xg", type=float)
+    parser.add_argument("--minute", type=float, default=0.0)
+    parser.add_argument("--score", type=_pair, default=(0, 0), help="Current score, HOME-AWAY.")
+    parser.add_argument("--red-cards", type=_pair, default=(0, 0), help="Red cards so far, HOME-AWAY.")
+    parser.add_argument("--curve", type=IntensityCurve.parse, default=DEFAULT_CURVE,
+                        help="Relative goal rate as MINUTE:RATE points, e.g. 0:0.85,45:1.1,90:1.3.")
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve()
+        return 0
+    if args.home_xg is None or args.away_xg is None:
+        parser.error("--home-xg and --away-xg are required without --serve")
+
+    started = time.perf_counter()
+    home_mean, away_mean = remaining_means(args.home_xg, args.away_xg, args.minute, *args.red_cards, curve=args.curve)
+    probs = in_play_probabilities(*args.score, home_mean, away_mean)
+    print(json.dumps(format_probabilities(probs), indent=2))
+    print(f"[IN-PLAY] computed in {(time.perf_counter() - started) * 1000:.3f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
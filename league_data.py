@@ -0,0 +1,350 @@
+"""
+League-level data assembly for detailed_analysis.
+
+The ai-predict route makes six football-data.org calls per fixture and
+downloads the same standings and scheduled-matches list for every fixture of
+a league. This module fetches each league's standings and season match list
+once, indexes them by team id and builds the detailed_analysis `stats` for
+every scheduled fixture of the league in one pass:
+
+- requests go through an asyncio token bucket sized to the API's rate limit
+  (10 requests/minute on the free tier); 429 responses are retried after the
+  server's reset time;
+- responses are cached on disk with a TTL per endpoint, so a refresh within
+  the TTL costs no requests at all, and a failed request falls back to the
+  last cached copy.
+
+The HTTP calls use urllib in the default executor, so only the standard
+library is needed.
+
+Output is one {"id", "stats", ...} JSON line per fixture, the format
+`python analysis.py batch --input` reads.
+
+Usage:
+    python league_data.py PL BL1 [--output fixtures.jsonl] [--injuries]
+    python league_data.py PL --base-url http://127.0.0.1:8000/v4 --rate 100
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from batch_runner import DEFAULT_LEAGUE_AVG_AWAY_GOALS, DEFAULT_LEAGUE_AVG_HOME_GOALS, FORM_LENGTH
+
+DEFAULT_BASE_URL = 'https://api.football-data.org/v4'
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'http_cache')
+# football-data.org free tier: 10 requests per minute.
+DEFAULT_RATE = 10
+DEFAULT_PER = 60.0
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 30
+MAX_RETRIES = 3
+# Seconds a cached response stays fresh, per endpoint kind.
+DEFAULT_TTLS = {"standings": 3600, "matches": 900, "team": 86400}
+
+RESULT_POINTS = {"HOME_TEAM": ("W", "L"), "AWAY_TEAM": ("L", "W"), "DRAW": ("D", "D")}
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per `per` seconds, with bursts of up to `rate`."""
+
+    def __init__(self, rate=DEFAULT_RATE, per=DEFAULT_PER):
+        if rate <= 0 or per <= 0:
+            raise ValueError("rate and per must be positive")
+        self.capacity = rate
+        self.fill_rate = rate / per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.fill_rate)
+
+    def drain(self, seconds):
+        """Empties the bucket so the next request waits at least `seconds` (used after a 429)."""
+        self.tokens = min(self.tokens, -seconds * self.fill_rate + 1)
+        self.updated = time.monotonic()
+
+
+class ResponseCache:
+    """JSON responses on disk, one file per URL, each stamped with its fetch time."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode()).hexdigest() + '.json')
+
+    def get(self, url, ttl=None):
+        """The cached body, or None when missing or older than `ttl` seconds (ttl=None: any age)."""
+        try:
+            with open(self._path(url), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if ttl is not None and time.time() - entry["fetched_at"] > ttl:
+            return None
+        return entry["body"]
+
+    def put(self, url, body):
+        path = self._path(url)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"url": url, "fetched_at": time.time(), "body": body}, f)
+        os.replace(tmp_path, path)
+
+
+class FootballDataClient:
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, cache=None, bucket=None,
+                 ttls=None, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache
+        self.bucket = bucket or TokenBucket()
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.stats = {"requests": 0, "cache_hits": 0, "stale_hits": 0, "rate_limited": 0}
+
+    def _fetch(self, url):
+        request = urllib.request.Request(url, headers={"X-Auth-Token": self.api_key, "Accept": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.load(response)
+
+    async def get_json(self, path, kind):
+        """GET `path` (relative to the base URL) through the cache, the rate limiter and the executor."""
+        url = self.base_url + path
+        ttl = self.ttls[kind]
+        if self.cache is not None:
+            body = self.cache.get(url, ttl)
+            if body is not None:
+                self.stats["cache_hits"] += 1
+                return body
+
+        loop = asyncio.get_running_loop()
+        for attempt in range(MAX_RETRIES + 1):
+            await self.bucket.acquire()
+            self.stats["requests"] += 1
+            try:
+                async with self._semaphore:
+                    body = await loop.run_in_executor(None, self._fetch, url)
+            except urllib.error.HTTPError as e:
+                if e.code == 429 and attempt < MAX_RETRIES:
+                    self.stats["rate_limited"] += 1
+                    wait = float(e.headers.get("X-RequestCounter-Reset") or e.headers.get("Retry-After") or DEFAULT_PER)
+                    print(f"[LEAGUE] Rate limited on {path}; waiting {wait:.0f}s", file=sys.stderr)
+                    self.bucket.drain(wait)
+                    continue
+                return self._stale(url, path, f"HTTP {e.code}")
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                return self._stale(url, path, e)
+            if self.cache is not None:
+                self.cache.put(url, body)
+            return body
+        return self._stale(url, path, "rate limited")
+
+    def _stale(self, url, path, error):
+        body = self.cache.get(url) if self.cache is not None else None
+        if body is None:
+            raise RuntimeError(f"{path}: {error}")
+        self.stats["stale_hits"] += 1
+        print(f"[LEAGUE] {path}: {error}; using cached copy", file=sys.stderr)
+        return body
+
+
+def index_standings(standings):
+    """{team id: TOTAL table row} from a /competitions/{code}/standings response."""
+    for group in standings.get("standings", []):
+        if group.get("type", "TOTAL") == "TOTAL":
+            return {row["team"]["id"]: row for row in group.get("table", [])}
+    return {}
+
+
+def index_matches(matches, form_length=FORM_LENGTH):
+    """
+    Splits a season match list into scheduled fixtures, each team's last
+    `form_length` results (newest first, as the team-matches endpoint returns
+    them) and the league's home/away goal averages (None without finished matches).
+    """
+    scheduled, finished = [], []
+    for match in matches.get("matches", []):
+        if match.get("status") in ("SCHEDULED", "TIMED"):
+            scheduled.append(match)
+        elif match.get("status") == "FINISHED" and match.get("score", {}).get("winner") in RESULT_POINTS:
+            finished.append(match)
+
+    form = {}
+    home_goals = away_goals = 0
+    for match in sorted(finished, key=lambda m: m["utcDate"], reverse=True):
+        home_result, away_result = RESULT_POINTS[match["score"]["winner"]]
+        for team, result in ((match["homeTeam"]["id"], home_result), (match["awayTeam"]["id"], away_result)):
+            results = form.setdefault(team, [])
+            if len(results) < form_length:
+                results.append({"result": result})
+        full_time = match["score"].get("fullTime") or {}
+        home_goals += full_time.get("home") or 0
+        away_goals += full_time.get("away") or 0
+
+    averages = None
+    if finished and home_goals and away_goals:
+        averages = (home_goals / len(finished), away_goals / len(finished))
+    scheduled.sort(key=lambda m: (m.get("utcDate") or "", m["id"]))
+    return scheduled, form, averages
+
+
+def table_averages(table):
+    """The ai-predict route's league averages from standings alone, for leagues without finished matches listed."""
+    goals = sum(row.get("goalsFor", 0) for row in table.values())
+    games = sum(row.get("playedGames", 0) for row in table.values()) / 2
+    if not goals or not games:
+        return DEFAULT_LEAGUE_AVG_HOME_GOALS, DEFAULT_LEAGUE_AVG_AWAY_GOALS
+    return goals / games * 0.55, goals / games * 0.45
+
+
+def match_odds(match):
+    odds = match.get("odds") or {}
+    home, draw, away = odds.get("homeWin") or odds.get("home"), odds.get("draw"), odds.get("awayWin") or odds.get("away")
+    if home and draw and away:
+        return {"home": home, "draw": draw, "away": away}
+    return {}
+
+
+def build_fixture_stats(match, table, form, averages, injuries=None):
+    """detailed_analysis input for one fixture, in the shape the ai-predict route builds."""
+    home_id, away_id = match["homeTeam"]["id"], match["awayTeam"]["id"]
+    home_name, away_name = match["homeTeam"].get("name"), match["awayTeam"].get("name")
+    home, away = table.get(home_id), table.get(away_id)
+    if not home or not away or not home.get("playedGames") or not away.get("playedGames"):
+        return {"is_simulation": True, "home_name": home_name, "away_name": away_name, "home_id": home_id, "away_id": away_id}
+
+    injuries = injuries or {}
+    return {
+        "is_simulation": False,
+        "home": {"name": home_name, "played": home["playedGames"], "goals_for": home["goalsFor"], "goals_against": home["goalsAgainst"]},
+        "away": {"name": away_name, "played": away["playedGames"], "goals_for": away["goalsFor"], "goals_against": away["goalsAgainst"]},
+        "league_avg_home_goals": averages[0],
+        "league_avg_away_goals": averages[1],
+        "home_form_raw": form.get(home_id, []),
+        "away_form_raw": form.get(away_id, []),
+        "odds": match_odds(match),
+        "injuries": {"home": injuries.get(home_id, 0), "away": injuries.get(away_id, 0)},
+    }
+
+
+def build_league_inputs(code, standings, matches, injuries=None):
+    """One {"id", "league", "homeTeam", "awayTeam", "utcDate", "stats"} request per scheduled fixture."""
+    table = index_standings(standings)
+    scheduled, form, averages = index_matches(matches)
+    averages = averages or table_averages(table)
+    return [
+        {
+            "id": match["id"],
+            "league": code,
+            "homeTeam": match["homeTeam"].get("name"),
+            "awayTeam": match["awayTeam"].get("name"),
+            "utcDate": match.get("utcDate"),
+            "stats": build_fixture_stats(match, table, form, averages, injuries),
+        }
+        for match in scheduled
+    ]
+
+
+async def fetch_injuries(client, team_ids):
+    """{team id: INJURED squad members}; one /teams/{id} request per team, cached for a day."""
+    team_ids = sorted(team_ids)
+    teams = await asyncio.gather(*(client.get_json(f"/teams/{team_id}", "team") for team_id in team_ids), return_exceptions=True)
+    injuries = {}
+    for team_id, team in zip(team_ids, teams):
+        if isinstance(team, Exception):
+            print(f"[LEAGUE] No squad for team {team_id}: {team}", file=sys.stderr)
+            continue
+        injuries[team_id] = sum(1 for player in team.get("squad") or [] if player.get("status") == "INJURED")
+    return injuries
+
+
+async def assemble_league(client, code, with_injuries=False):
+    standings, matches = await asyncio.gather(
+        client.get_json(f"/competitions/{code}/standings", "standings"),
+        client.get_json(f"/competitions/{code}/matches", "matches"),
+    )
+    injuries = None
+    if with_injuries:
+        scheduled, _, _ = index_matches(matches)
+        team_ids = {m["homeTeam"]["id"] for m in scheduled} | {m["awayTeam"]["id"] for m in scheduled}
+        injuries = await fetch_injuries(client, team_ids)
+    return build_league_inputs(code, standings, matches, injuries)
+
+
+async def assemble_leagues(client, codes, with_injuries=False):
+    """{league code: fixture requests}; a league whose data cannot be fetched maps to an empty list."""
+    results = await asyncio.gather(*(assemble_league(client, code, with_injuries) for code in codes), return_exceptions=True)
+    leagues = {}
+    for code, result in zip(codes, results):
+        if isinstance(result, Exception):
+            print(f"[LEAGUE] {code}: {result}", file=sys.stderr)
+            result = []
+        leagues[code] = result
+    return leagues
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build detailed_analysis inputs for every scheduled fixture of a league.")
+    parser.add_argument("leagues", nargs="+", help="football-data.org competition codes (PL, BL1, ...).")
+    parser.add_argument("--output", help="JSON-lines file to write (default: stdout).")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="Always hit the API.")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Requests allowed per --per seconds.")
+    parser.add_argument("--per", type=float, default=DEFAULT_PER)
+    parser.add_argument("--injuries", action="store_true", help="Also count injured players (one request per team).")
+    args = parser.parse_args(argv)
+
+    api_key = os.environ.get("FOOTBALL_DATA_API_KEY", "")
+    if not api_key and args.base_url == DEFAULT_BASE_URL:
+        print("FOOTBALL_DATA_API_KEY is not configured.", file=sys.stderr)
+        return 1
+
+    async def run():
+        client = FootballDataClient(
+            api_key, args.base_url,
+            cache=None if args.no_cache else ResponseCache(args.cache_dir),
+            bucket=TokenBucket(args.rate, args.per),
+        )
+        return client, await assemble_leagues(client, args.leagues, with_injuries=args.injuries)
+
+    started = time.perf_counter()
+    client, leagues = asyncio.run(run())
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for requests in leagues.values():
+            for request in requests:
+                out.write(json.dumps(request, ensure_ascii=False) + "\n")
+    finally:
+        if args.output:
+            out.close()
+    fixtures = sum(len(requests) for requests in leagues.values())
+    print(
+        f"[LEAGUE] {fixtures} fixtures from {len(leagues)} leagues in {time.perf_counter() - started:.2f}s: "
+        f"{client.stats['requests']} requests, {client.stats['cache_hits']} cache hits, "
+        f"{client.stats['stale_hits']} stale, {client.stats['rate_limited']} rate limited",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
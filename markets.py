@@ -0,0 +1,111 @@
+"""
+Betting markets derived from one score matrix.
+
+The matrix is the outer product of the home and away goal PMFs from
+analysis.goal_pmf, optionally with the Dixon-Coles low-score adjustment. One
+pass over its cells accumulates the total-goals and goal-difference
+distributions and the most likely scores. Every market is read off those.
+"""
+import heapq
+import itertools
+import math
+
+OVER_UNDER_LINES = (0.5, 1.5, 2.5, 3.5, 4.5, 5.5)
+# Home-team Asian handicap lines; quarter lines settle half the stake on each neighbour.
+ASIAN_HANDICAP_LINES = tuple(x / 4 for x in range(-10, 11))
+CORRECT_SCORE_TOP_N = 10
+
+
+def _line_key(line):
+    return f"{line:+g}" if line else "0"
+
+
+def handicap_outcome(diff_cdf, diff_offset, line):
+    """
+    (home, push, away) settlement probabilities for a home handicap line.
+    diff_cdf[k] is P(home goals - away goals <= k - diff_offset).
+    """
+    if (line * 4) % 2:
+        # Quarter line: average the two neighbouring half/whole lines.
+        lower = handicap_outcome(diff_cdf, diff_offset, line - 0.25)
+        upper = handicap_outcome(diff_cdf, diff_offset, line + 0.25)
+        return tuple((a + b) / 2 for a, b in zip(lower, upper))
+
+    def at_most(diff):
+        k = min(diff + diff_offset, len(diff_cdf) - 1)
+        return diff_cdf[k] if k >= 0 else 0.0
+
+    # The bet wins for the home side when diff + line > 0.
+    away = at_most(math.ceil(-line) - 1)
+    home = 1.0 - at_most(math.floor(-line))
+    return home, max(0.0, 1.0 - home - away), away
+
+
+def derive_markets(home_pmf, away_pmf, low_score_shift=0.0, top_n=CORRECT_SCORE_TOP_N):
+    """
+    Prices 1X2, double chance, draw-no-bet, over/under, both-teams-to-score,
+    Asian handicap and the top-N correct scores from one score matrix.
+
+    `low_score_shift` applies the Dixon-Coles adjustment: the mass moved out
+    of 0-0 and 1-1 into 1-0 and 0-1 (rho * home_xg * away_xg * P(0-0)).
+    """
+    n_home, n_away = len(home_pmf), len(away_pmf)
+    total_probs = [0.0] * (n_home + n_away - 1)
+    diff_offset = n_away - 1
+    diff_probs = [0.0] * (n_home + n_away - 1)
+    btts_yes = 0.0
+    cells = []
+    for h, ph in enumerate(home_pmf):
+        for a, pa in enumerate(away_pmf):
+            p = ph * pa
+            if low_score_shift and h <= 1 and a <= 1:
+                p += low_score_shift if h != a else -low_score_shift
+            total_probs[h + a] += p
+            diff_probs[h - a + diff_offset] += p
+            if h and a:
+                btts_yes += p
+            cells.append((p, h, a))
+
+    mass = sum(total_probs)
+    total_probs = [p / mass for p in total_probs]
+    diff_probs = [p / mass for p in diff_probs]
+
+    home_win = sum(diff_probs[diff_offset + 1:])
+    draw = diff_probs[diff_offset]
+    away_win = sum(diff_probs[:diff_offset])
+
+    over_under = {}
+    for line in OVER_UNDER_LINES:
+        under = sum(total_probs[:int(line) + 1])
+        over_under[f"{line:g}"] = {"over": round(1 - under, 4), "under": round(under, 4)}
+
+    btts_yes /= mass
+
+    diff_cdf = list(itertools.accumulate(diff_probs))
+    asian_handicap = {}
+    for line in ASIAN_HANDICAP_LINES:
+        home, push, away = handicap_outcome(diff_cdf, diff_offset, line)
+        asian_handicap[_line_key(line)] = {"home": round(home, 4), "push": round(push, 4), "away": round(away, 4)}
+
+    correct_score = [
+        {"score": f"{h} - {a}", "prob": round(p / mass, 4)}
+        for p, h, a in heapq.nlargest(top_n, cells, key=lambda cell: cell[0])
+    ]
+    decisive = home_win + away_win
+
+    return {
+        "1x2": {"home_win": round(home_win, 4), "draw": round(draw, 4), "away_win": round(away_win, 4)},
+        "double_chance": {
+            "1X": round(home_win + draw, 4),
+            "X2": round(draw + away_win, 4),
+            "12": round(decisive, 4),
+        },
+        "draw_no_bet": {
+            "home": round(home_win / decisive, 4) if decisive else 0.5,
+            "away": round(away_win / decisive, 4) if decisive else 0.5,
+        },
+        "over_under": over_under,
+        "btts": {"yes": round(btts_yes, 4), "no": round(1 - btts_yes, 4)},
+        "asian_handicap": asian_handicap,
+        "correct_score": correct_score,
+    }
@@ -2,58 +2,331 @@ import sys
 import json
 import sqlite3
 import os
+import argparse
+import time
+from array import array
+from collections import deque
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT_DIR)
+
+from analysis import HYBRID_WEIGHTS, cached_outcome_probabilities, form_probabilities  # noqa: E402
+
+DEFAULT_DB_PATH = os.path.join(ROOT_DIR, 'bahis.db')
+FORM_LENGTH = 5
+# Venue goal rates are shrunk toward the league average by this many pseudo-matches,
+# so teams with a handful of games do not get extreme strengths.
+PRIOR_MATCHES = 3
+# No odds here, so the odds weight goes to Poisson and form 2:1 as in detailed_analysis.
+POISSON_WEIGHT = HYBRID_WEIGHTS['poisson'] + HYBRID_WEIGHTS['odds'] * 2 / 3
+FORM_WEIGHT = HYBRID_WEIGHTS['form'] + HYBRID_WEIGHTS['odds'] / 3
+DEFAULT_LEAGUE_AVG_HOME_GOALS = 1.45
+DEFAULT_LEAGUE_AVG_AWAY_GOALS = 1.15
+LATENCY_WINDOW = 10000
+
+FINISHED = "status = 'FT' AND home_score IS NOT NULL AND away_score IS NOT NULL"
+
+
+def connect_readonly(db_path):
+    """One read-only connection; WAL databases can be read while the scraper writes."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class TeamFeatureIndex:
+    """
+    Per-team features held in flat arrays, one slot per team id: home and away
+    record (played, scored, conceded), recent form points and league. Built
+    once from bahis.db; predictions never touch the database.
+    """
+
+    def __init__(self):
+        self.slots = {}
+        self.league = array('q')
+        self.home_played = array('l')
+        self.home_goals_for = array('l')
+        self.home_goals_against = array('l')
+        self.away_played = array('l')
+        self.away_goals_for = array('l')
+        self.away_goals_against = array('l')
+        self.form_points = array('l')
+        self.form_played = array('l')
+        self.league_avgs = {}
+        self.matches = 0
+        self.load_ms = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.predictions = 0
+
+    def __contains__(self, team_id):
+        return team_id in self.slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    @classmethod
+    def load(cls, db_path=DEFAULT_DB_PATH, form_length=FORM_LENGTH):
+        started = time.perf_counter()
+        index = cls()
+        conn = connect_readonly(db_path)
+        try:
+            index._load(conn, form_length)
+        finally:
+            conn.close()
+        index.load_ms = (time.perf_counter() - started) * 1000
+        return index
+
+    def _load(self, conn, form_length):
+        for team_id, league_id in conn.execute("SELECT id, league_id FROM teams ORDER BY id"):
+            self.slots[team_id] = len(self.league)
+            self.league.append(league_id if league_id is not None else -1)
+        n = len(self.slots)
+        for column in (self.home_played, self.home_goals_for, self.home_goals_against, self.away_played,
+                       self.away_goals_for, self.away_goals_against, self.form_points, self.form_played):
+            column.extend([0] * n)
+
+        venues = (
+            ("home_team_id", "home_score", "away_score", self.home_played, self.home_goals_for, self.home_goals_against),
+            ("away_team_id", "away_score", "home_score", self.away_played, self.away_goals_for, self.away_goals_against),
+        )
+        for team_col, for_col, against_col, played, goals_for, goals_against in venues:
+            sql = f"""
+                SELECT {team_col}, COUNT(*), SUM({for_col}), SUM({against_col})
+                FROM matches WHERE {FINISHED} GROUP BY {team_col}
+            """
+            for team_id, count, scored, conceded in conn.execute(sql):
+                slot = self.slots.get(team_id)
+                if slot is None:
+                    continue
+                played[slot], goals_for[slot], goals_against[slot] = count, scored, conceded
+        self.matches = sum(self.home_played)
+
+        form_sql = f"""
+            SELECT team_id, SUM(points), COUNT(*) FROM (
+                SELECT team_id, points,
+                       ROW_NUMBER() OVER (PARTITION BY team_id ORDER BY match_date DESC, id DESC) AS recency
+                FROM (
+                    SELECT id, match_date, home_team_id AS team_id,
+                           CASE WHEN home_score > away_score THEN 3 WHEN home_score = away_score THEN 1 ELSE 0 END AS points
+                    FROM matches WHERE {FINISHED}
+                    UNION ALL
+                    SELECT id, match_date, away_team_id AS team_id,
+                           CASE WHEN away_score > home_score THEN 3 WHEN home_score = away_score THEN 1 ELSE 0 END AS points
+                    FROM matches WHERE {FINISHED}
+                )
+            )
+            WHERE recency <= ?
+            GROUP BY team_id
+        """
+        for team_id, points, count in conn.execute(form_sql, (form_length,)):
+            slot = self.slots.get(team_id)
+            if slot is not None:
+                self.form_points[slot], self.form_played[slot] = points, count
+
+        league_sql = """
+            SELECT t.league_id, AVG(m.home_score), AVG(m.away_score)
+            FROM matches m JOIN teams t ON t.id = m.home_team_id
+            WHERE m.status = 'FT' AND m.home_score IS NOT NULL AND m.away_score IS NOT NULL
+            GROUP BY t.league_id
+        """
+        for league_id, avg_home, avg_away in conn.execute(league_sql):
+            self.league_avgs[league_id] = (avg_home or DEFAULT_LEAGUE_AVG_HOME_GOALS, avg_away or DEFAULT_LEAGUE_AVG_AWAY_GOALS)
+
+    def expected_goals(self, home_slot, away_slot):
+        """Venue-split attack/defense strengths against the home team's league averages."""
+        avg_home, avg_away = self.league_avgs.get(
+            self.league[home_slot], (DEFAULT_LEAGUE_AVG_HOME_GOALS, DEFAULT_LEAGUE_AVG_AWAY_GOALS)
+        )
+        home_played = self.home_played[home_slot] + PRIOR_MATCHES
+        away_played = self.away_played[away_slot] + PRIOR_MATCHES
+        home_attack = (self.home_goals_for[home_slot] + PRIOR_MATCHES * avg_home) / home_played / avg_home
+        home_defense = (self.home_goals_against[home_slot] + PRIOR_MATCHES * avg_away) / home_played / avg_away
+        away_attack = (self.away_goals_for[away_slot] + PRIOR_MATCHES * avg_away) / away_played / avg_away
+        away_defense = (self.away_goals_against[away_slot] + PRIOR_MATCHES * avg_home) / away_played / avg_home
+        return avg_home * home_attack * away_defense, avg_away * away_attack * home_defense
+
+    def predict(self, home_team_id, away_team_id):
+        """Prediction for one pair from the in-memory index."""
+        started = time.perf_counter()
+        home_team_id, away_team_id = int(home_team_id), int(away_team_id)
+        for team_id in (home_team_id, away_team_id):
+            if team_id not in self.slots:
+                return {"error": f"Unknown team id: {team_id}"}
+        h, a = self.slots[home_team_id], self.slots[away_team_id]
+
+        home_xg, away_xg = self.expected_goals(h, a)
+        poisson_home, poisson_draw, poisson_away, most_likely_score, _ = cached_outcome_probabilities(home_xg, away_xg)
+        form = form_probabilities(self.form_points[h], self.form_points[a])
+        home_win = poisson_home * POISSON_WEIGHT + form['home_win'] * FORM_WEIGHT
+        draw = poisson_draw * POISSON_WEIGHT + form['draw'] * FORM_WEIGHT
+        away_win = poisson_away * POISSON_WEIGHT + form['away_win'] * FORM_WEIGHT
+        total = home_win + draw + away_win
+        home_win, draw, away_win = home_win / total, draw / total, away_win / total
+
+        best = max(home_win, draw, away_win)
+        prediction = "HOME_WIN" if best == home_win else "AWAY_WIN" if best == away_win else "DRAW"
+        analysis = (
+            f"Expected goals {home_xg:.2f} - {away_xg:.2f} from home/away scoring records "
+            f"({self.home_played[h]} home games for {home_team_id}, {self.away_played[a]} away games for {away_team_id}). "
+            f"Recent form: {self.form_points[h]} vs {self.form_points[a]} points from the last "
+            f"{max(self.form_played[h], self.form_played[a])} matches. Most likely score "
+            f"{most_likely_score[0]} - {most_likely_score[1]}."
+        )
+        result = {
+            "prediction": prediction,
+            "confidence": round(best * 100),
+            "analysis": analysis,
+            "home_win": round(home_win * 100, 1),
+            "draw": round(draw * 100, 1),
+            "away_win": round(away_win * 100, 1),
+            "expected_goals": {"home": round(home_xg, 2), "away": round(away_xg, 2)},
+            "score_prediction": f"{most_likely_score[0]} - {most_likely_score[1]}",
+        }
+        self.latencies.append(time.perf_counter() - started)
+        self.predictions += 1
+        return result
+
+    def predict_many(self, pairs):
+        """Predictions for many (home_team_id, away_team_id) pairs, in order."""
+        return [self.predict(home_team_id, away_team_id) for home_team_id, away_team_id in pairs]
+
+    def stats(self):
+        """Index size, load time and per-prediction latency over the recent window (ms)."""
+        latencies = sorted(self.latencies)
+        return {
+            "teams": len(self.slots),
+            "matches": self.matches,
+            "index_load_ms": round(self.load_ms, 2),
+            "predictions": self.predictions,
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies) * 1000, 4) if latencies else 0.0,
+                "p50": round(_percentile(latencies, 0.50) * 1000, 4),
+                "p95": round(_percentile(latencies, 0.95) * 1000, 4),
+                "p99": round(_percentile(latencies, 0.99) * 1000, 4),
+            },
+        }
+
+
+_INDEX = None
+
+
+def get_index(db_path=DEFAULT_DB_PATH):
+    """Process-wide index, loaded on first use."""
+    global _INDEX
+    if _INDEX is None:
+        _INDEX = TeamFeatureIndex.load(db_path)
+    return _INDEX
+
 
 def get_prediction(home_team_id, away_team_id):
     """
-    Generates a mock prediction for a match between two teams.
-    In a real scenario, this function would load a trained model and
-    use team data from the database to make a prediction.
-    """
-    # For now, we are not using the database, but this is how you would connect:
-    # db_path = os.path.join(os.path.dirname(__file__), '..', 'bahis.db')
-    # try:
-    #     conn = sqlite3.connect(db_path)
-    #     cursor = conn.cursor()
-    #     # Example query:
-    #     # cursor.execute("SELECT * FROM teams WHERE id = ? OR id = ?", (home_team_id, away_team_id))
-    #     # teams_data = cursor.fetchall()
-    #     conn.close()
-    # except sqlite3.Error as e:
-    #     return {
-    #         "error": f"Database error: {e}"
-    #     }
-
-    # Mock prediction logic
-    confidence = 50 + (int(home_team_id) % 10) * 5 - (int(away_team_id) % 10) * 2
-    if confidence > 66:
-        prediction = "HOME_WIN"
-    elif confidence < 33:
-        prediction = "AWAY_WIN"
+    Generates a prediction for a match between two teams from the team-feature
+    index over bahis.db (loaded once per process).
+    """
+    try:
+        return get_index().predict(home_team_id, away_team_id)
+    except sqlite3.Error as e:
+        return {
+            "error": f"Database error: {e}"
+        }
+
+
+def _parse_pair(line_number, request):
+    """(id, home_team_id, away_team_id) from one JSON line, either an object or a [home, away] pair."""
+    if isinstance(request, list):
+        return line_number, request[0], request[1]
+    return request.get("id", line_number), request["home_team_id"], request["away_team_id"]
+
+
+def run_batch(index, stdin=sys.stdin, stdout=sys.stdout):
+    """
+    Predicts every pair in a JSON-lines stream and writes {"id", "result"} lines.
+    A line that cannot be parsed or predicted gets an {"id", "error"} line instead.
+    """
+    for line_number, line in enumerate(stdin, 1):
+        line = line.strip()
+        if not line:
+            continue
+        request_id, request = line_number, None
+        try:
+            request = json.loads(line)
+            request_id, home_team_id, away_team_id = _parse_pair(line_number, request)
+            result = index.predict(home_team_id, away_team_id)
+            stdout.write(json.dumps({"id": request_id, "result": result}) + "\n")
+        except Exception as e:
+            if isinstance(request, dict):
+                request_id = request.get("id", line_number)
+            stdout.write(json.dumps({"id": request_id, "error": str(e)}) + "\n")
+    stdout.flush()
+
+
+def serve(index, stdin=sys.stdin, stdout=sys.stdout):
+    """
+    Long-lived worker mode, one JSON request per line:
+    {"id", "home_team_id", "away_team_id"} for one pair, {"id", "pairs": [[home, away], ...]}
+    for many, and {"id", "command": "stats"} for index and latency stats.
+    """
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            if request.get("command") == "stats":
+                result = index.stats()
+            elif "pairs" in request:
+                result = index.predict_many(request["pairs"])
+            else:
+                result = index.predict(request["home_team_id"], request["away_team_id"])
+            stdout.write(json.dumps({"id": request_id, "result": result}) + "\n")
+        except Exception as e:
+            stdout.write(json.dumps({"id": request_id, "error": str(e)}) + "\n")
+        stdout.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Match predictions from the team-feature index over bahis.db.")
+    parser.add_argument("team_ids", nargs="*", help="<home_team_id> <away_team_id>")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--serve", action="store_true", help="Answer JSON-lines requests on stdin until EOF.")
+    parser.add_argument("--batch", action="store_true", help="Predict every JSON-lines pair on stdin, then exit.")
+    args = parser.parse_args(argv)
+
+    if not args.serve and not args.batch and len(args.team_ids) != 2:
+        print(json.dumps({"error": "Usage: predict.py <home_team_id> <away_team_id>"}), file=sys.stderr)
+        return 1
+
+    try:
+        index = TeamFeatureIndex.load(args.db)
+    except sqlite3.Error as e:
+        print(json.dumps({"error": f"Database error: {e}"}))
+        return 1
+    print(f"[PREDICT] Index loaded: {len(index)} teams, {index.matches} matches in {index.load_ms:.1f} ms", file=sys.stderr)
+
+    if args.serve:
+        serve(index)
+    elif args.batch:
+        run_batch(index)
     else:
-        prediction = "DRAW"
-        
-    analysis = (
-        f"Mock analysis based on team IDs. The model favors the home team due to its "
-        f"hypothetical strong offensive record (ID: {home_team_id}). "
-        f"The away team (ID: {away_team_id}) has a weaker defense in this simulation. "
-        f"Confidence is calculated at {confidence:.2f}%."
+        # Ensure only the JSON is printed to stdout
+        print(json.dumps(index.predict(*args.team_ids)))
+
+    stats = index.stats()
+    print(
+        f"[PREDICT] {stats['predictions']} predictions, latency p50 {stats['latency_ms']['p50']} ms, "
+        f"p95 {stats['latency_ms']['p95']} ms, p99 {stats['latency_ms']['p99']} ms",
+        file=sys.stderr,
     )
+    return 0
 
-    return {
-        "prediction": prediction,
-        "confidence": round(confidence),
-        "analysis": analysis
-    }
 
 if __name__ == '__main__':
-    if len(sys.argv) != 3:
-        print(json.dumps({"error": "Usage: predict.py <home_team_id> <away_team_id>"}), file=sys.stderr)
-        sys.exit(1)
-
-    home_id = sys.argv[1]
-    away_id = sys.argv[2]
-    
-    result = get_prediction(home_id, away_id)
-    
-    # Ensure only the JSON is printed to stdout
-    print(json.dumps(result))
+    sys.exit(main())
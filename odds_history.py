@@ -0,0 +1,341 @@
+"""
+Append-only, columnar store of every scraped 1X2 odds observation.
+
+A store is a directory of fixed-width column files plus a key dictionary:
+
+    ts.u4       uint32  observation time, unix seconds
+    match.u4    uint32  match id (line number in keys.jsonl)
+    home.u2     uint16  home odd in hundredths (0 = missing)
+    draw.u2     uint16  draw odd in hundredths
+    away.u2     uint16  away odd in hundredths
+    keys.jsonl  one [home, away, kickoff] key per match id
+
+The kickoff ("YYYY-MM-DD HH:MM", from the parsers' date headers) keeps every
+season's meeting of the same two teams a separate series; matches scraped
+without one are not recorded.
+
+That is 14 bytes per observation. Writers (the scrapers) append with the
+standard library only. OddsHistory memory-maps the columns with NumPy, so
+queries never load the store into memory: a match's line history, opening
+vs. closing odds, movement velocity, or every match's opening/closing odds
+at once. One writer per store; readers may run while it appends.
+
+Usage:
+    python odds_history.py DIR                         # row/match counts
+    python odds_history.py DIR --match HOME AWAY --kickoff "2026-10-18 19:30"
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from array import array
+
+DEFAULT_HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'odds_history')
+
+# (column, file name, array typecode, numpy dtype); all little-endian.
+COLUMNS = (
+    ("ts", "ts.u4", "I", "<u4"),
+    ("match", "match.u4", "I", "<u4"),
+    ("home", "home.u2", "H", "<u2"),
+    ("draw", "draw.u2", "H", "<u2"),
+    ("away", "away.u2", "H", "<u2"),
+)
+ODD_COLUMNS = ("home", "draw", "away")
+KEYS_FILE = "keys.jsonl"
+ODD_SCALE = 100
+MAX_ODD = 65535 / ODD_SCALE
+# Velocity is measured over this trailing window, in seconds.
+DEFAULT_VELOCITY_WINDOW = 6 * 3600
+
+if sys.byteorder != "little":
+    raise ImportError("odds_history column files are little-endian")
+
+
+def match_key(match):
+    """(home, away, kickoff) of a scraped match, or None when the parser found no kickoff."""
+    if not match.get("kickoff"):
+        return None
+    return (match["homeTeam"], match["awayTeam"], match["kickoff"])
+
+
+def _encode_odd(value):
+    # Odds above MAX_ODD (655.35) are clamped; 1X2 prices that long are not modelled anyway.
+    return min(65535, max(0, round(float(value) * ODD_SCALE)))
+
+
+def _column_rows(path, itemsize):
+    try:
+        return os.path.getsize(path) // itemsize
+    except FileNotFoundError:
+        return 0
+
+
+def _load_keys(directory):
+    keys = []
+    path = os.path.join(directory, KEYS_FILE)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.endswith("\n"):
+                    keys.append(tuple(json.loads(line)))
+    return keys
+
+
+class OddsHistoryWriter:
+    """Appends observations to a store directory, creating it if needed."""
+
+    def __init__(self, directory=DEFAULT_HISTORY_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._truncate_torn_writes()
+        self.keys = _load_keys(directory)
+        self.ids = {key: i for i, key in enumerate(self.keys)}
+
+    def _truncate_torn_writes(self):
+        # A crash between column appends leaves columns of different lengths;
+        # cut them back to the last complete row.
+        sizes = {file_name: array(typecode).itemsize for _, file_name, typecode, _ in COLUMNS}
+        rows = min(_column_rows(os.path.join(self.directory, name), size) for name, size in sizes.items())
+        for name, size in sizes.items():
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path) and os.path.getsize(path) != rows * size:
+                os.truncate(path, rows * size)
+        keys_path = os.path.join(self.directory, KEYS_FILE)
+        if os.path.exists(keys_path):
+            with open(keys_path, "rb+") as f:
+                data = f.read()
+                if data and not data.endswith(b"\n"):
+                    f.truncate(data.rfind(b"\n") + 1)
+
+    def _match_id(self, key, new_keys):
+        match_id = self.ids.get(key)
+        if match_id is None:
+            match_id = self.ids[key] = len(self.keys)
+            self.keys.append(key)
+            new_keys.append(key)
+        return match_id
+
+    def append(self, matches, observed_at=None):
+        """
+        Appends one observation per scraped match that has a kickoff; the rest
+        are skipped. Returns the number of rows written.
+        """
+        ts = int(time.time() if observed_at is None else observed_at)
+        columns = {name: array(typecode) for name, _, typecode, _ in COLUMNS}
+        new_keys = []
+        for match in matches:
+            key = match_key(match)
+            if key is None:
+                continue
+            columns["ts"].append(ts)
+            columns["match"].append(self._match_id(key, new_keys))
+            columns["home"].append(_encode_odd(match["homeOdd"]))
+            columns["draw"].append(_encode_odd(match["drawOdd"]))
+            columns["away"].append(_encode_odd(match["awayOdd"]))
+        rows = len(columns["ts"])
+        if not rows:
+            return 0
+
+        # Keys first, so every match id in the columns always resolves.
+        if new_keys:
+            with open(os.path.join(self.directory, KEYS_FILE), "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(list(key), ensure_ascii=False) + "\n" for key in new_keys))
+        for name, file_name, _, _ in COLUMNS:
+            with open(os.path.join(self.directory, file_name), "ab") as f:
+                columns[name].tofile(f)
+        return rows
+
+
+class OddsHistory:
+    """
+    Read side of a store. Columns are memory-mapped on open (and on refresh()),
+    and a per-match row index is built on the first per-match query.
+    """
+
+    def __init__(self, directory=DEFAULT_HISTORY_DIR):
+        import numpy as np
+
+        self._np = np
+        self.directory = directory
+        self.refresh()
+
+    def refresh(self):
+        """Picks up rows and matches appended since the store was opened."""
+        np = self._np
+        rows = min(
+            _column_rows(os.path.join(self.directory, file_name), np.dtype(dtype).itemsize)
+            for _, file_name, _, dtype in COLUMNS
+        )
+        self.columns = {}
+        for name, file_name, _, dtype in COLUMNS:
+            if rows:
+                self.columns[name] = np.memmap(os.path.join(self.directory, file_name), dtype=dtype, mode="r", shape=(rows,))
+            else:
+                self.columns[name] = np.empty(0, dtype=dtype)
+        self.rows = rows
+        self.keys = _load_keys(self.directory)
+        self.ids = {key: i for i, key in enumerate(self.keys)}
+        self._order = None
+        self._starts = None
+
+    def _index(self):
+        # Rows sorted by match id; a stable sort keeps each match's rows in time order.
+        if self._order is None:
+            np = self._np
+            self._order = np.argsort(self.columns["match"], kind="stable")
+            self._starts = np.searchsorted(self.columns["match"][self._order], np.arange(len(self.keys) + 1))
+        return self._order, self._starts
+
+    def _rows_for(self, key):
+        match_id = self.ids.get(tuple(key))
+        if match_id is None:
+            return None
+        order, starts = self._index()
+        return order[starts[match_id]:starts[match_id + 1]]
+
+    def history(self, key):
+        """
+        Full line history of one match: {"ts", "home", "draw", "away"} arrays in
+        observation order (odds as decimal floats, NaN where missing), or None
+        for an unknown key.
+        """
+        rows = self._rows_for(key)
+        if rows is None:
+            return None
+        np = self._np
+        result = {"ts": np.asarray(self.columns["ts"][rows], dtype=np.int64)}
+        for name in ODD_COLUMNS:
+            odds = self.columns[name][rows].astype(float) / ODD_SCALE
+            odds[odds == 0] = np.nan
+            result[name] = odds
+        return result
+
+    def opening_closing(self, key):
+        """First and last observed odds of one match, with the change between them."""
+        line = self.history(key)
+        if line is None or not len(line["ts"]):
+            return None
+
+        def at(i):
+            return {"ts": int(line["ts"][i]), **{name: float(line[name][i]) for name in ODD_COLUMNS}}
+
+        opening, closing = at(0), at(-1)
+        return {
+            "opening": opening,
+            "closing": closing,
+            "change": {name: round(closing[name] - opening[name], 2) for name in ODD_COLUMNS},
+            "observations": len(line["ts"]),
+        }
+
+    def velocity(self, key, window=DEFAULT_VELOCITY_WINDOW):
+        """
+        Least-squares slope of each odd over the trailing `window` seconds, in
+        decimal odds per hour (negative = shortening). Needs two distinct
+        observation times in the window, otherwise the slopes are 0.0.
+        """
+        line = self.history(key)
+        if line is None:
+            return None
+        np = self._np
+        ts = line["ts"]
+        result = {"observations": 0, "window_s": window}
+        if not len(ts):
+            return {**result, **{name: 0.0 for name in ODD_COLUMNS}}
+        in_window = ts >= ts[-1] - window
+        hours = (ts[in_window] - ts[-1]) / 3600.0
+        result["observations"] = int(in_window.sum())
+        for name in ODD_COLUMNS:
+            odds = line[name][in_window]
+            valid = ~np.isnan(odds)
+            x, y = hours[valid], odds[valid]
+            if len(x) < 2 or np.ptp(x) == 0:
+                result[name] = 0.0
+                continue
+            x = x - x.mean()
+            result[name] = round(float((x * (y - y.mean())).sum() / (x * x).sum()), 4) + 0.0
+        return result
+
+    def latest_odds(self, key):
+        """Closing odds in the {'home', 'draw', 'away'} shape detailed_analysis expects as stats['odds']."""
+        summary = self.opening_closing(key)
+        if summary is None:
+            return None
+        closing = summary["closing"]
+        if any(closing[name] != closing[name] for name in ODD_COLUMNS):  # NaN
+            return None
+        return {name: closing[name] for name in ODD_COLUMNS}
+
+    def line_summary(self):
+        """
+        Opening and closing odds of every match in one vectorized pass. Returns
+        arrays indexed by match id (see self.keys): observations, first_ts,
+        last_ts, and opening_/closing_ home/draw/away in decimal odds.
+        """
+        np = self._np
+        order, starts = self._index()
+        counts = np.diff(starts)
+        seen = counts > 0
+        first, last = order[starts[:-1][seen]], order[starts[1:][seen] - 1]
+        result = {"observations": counts}
+        for prefix, rows in (("first", first), ("last", last)):
+            ts = np.zeros(len(counts), dtype=np.int64)
+            ts[seen] = self.columns["ts"][rows]
+            result[f"{prefix}_ts"] = ts
+        for prefix, rows in (("opening", first), ("closing", last)):
+            for name in ODD_COLUMNS:
+                values = self.columns[name][rows] / ODD_SCALE
+                values[values == 0] = np.nan
+                odds = np.full(len(counts), np.nan)
+                odds[seen] = values
+                result[f"{prefix}_{name}"] = odds
+        return result
+
+    def size_bytes(self):
+        return sum(
+            os.path.getsize(os.path.join(self.directory, name))
+            for name in [file_name for _, file_name, _, _ in COLUMNS] + [KEYS_FILE]
+            if os.path.exists(os.path.join(self.directory, name))
+        )
+
+
+def record_observations(matches, directory=DEFAULT_HISTORY_DIR):
+    """Appends one scrape to the store at `directory`; used by both scrapers."""
+    rows = OddsHistoryWriter(directory).append(matches)
+    print(f"[HISTORY] Appended {rows} odds observations to {directory}")
+    if rows < len(matches):
+        print(f"[HISTORY] Skipped {len(matches) - rows} matches without a kickoff")
+    return rows
+
+
+def add_history_arguments(parser):
+    """History options shared by both scrapers' command lines."""
+    parser.add_argument("--history-dir", default=DEFAULT_HISTORY_DIR, help="Odds history store to append every scrape to.")
+    parser.add_argument("--no-history", action="store_true", help="Do not record this scrape in the odds history.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect an odds history store.")
+    parser.add_argument("directory", nargs="?", default=DEFAULT_HISTORY_DIR)
+    parser.add_argument("--match", nargs=2, metavar=("HOME", "AWAY"), help="Print one match's line history summary.")
+    parser.add_argument("--kickoff", default="", help='Kickoff part of the match key ("YYYY-MM-DD HH:MM").')
+    parser.add_argument("--window", type=int, default=DEFAULT_VELOCITY_WINDOW, help="Velocity window in seconds.")
+    args = parser.parse_args(argv)
+
+    history = OddsHistory(args.directory)
+    if not args.match:
+        print(json.dumps({"rows": history.rows, "matches": len(history.keys), "bytes": history.size_bytes()}))
+        return 0
+
+    key = (args.match[0], args.match[1], args.kickoff)
+    summary = history.opening_closing(key)
+    if summary is None:
+        print(json.dumps({"error": f"No history for {key}"}))
+        return 1
+    summary["velocity_per_hour"] = history.velocity(key, window=args.window)
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
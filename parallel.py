@@ -0,0 +1,55 @@
+"""
+Order-preserving process-pool execution for CPU-bound batch work.
+
+Callers split their input into chunks and encode each chunk as one compact
+payload (e.g. JSON-lines bytes), so a chunk crosses the process boundary as a
+single object rather than one pickle per match.
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def chunked(iterable, size):
+    """Yields lists of at most `size` items from any iterable."""
+    if size <= 0:
+        raise ValueError("chunk size must be positive")
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parallel_map(func, payloads, workers=None, max_pending=None, initializer=None, initargs=()):
+    """
+    Applies `func` to every payload and yields the results in input order.
+
+    `func` must be a picklable module-level function. With workers=1 the
+    payloads are processed in-process, which is also the reference serial
+    path. At most `max_pending` payloads (default 2 per worker) are in flight,
+    so a lazily generated input is never materialised in full.
+    """
+    workers = workers or default_workers()
+    if workers == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for payload in payloads:
+            yield func(payload)
+        return
+
+    max_pending = max_pending or workers * 2
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        pending = deque()
+        for payload in payloads:
+            pending.append(executor.submit(func, payload))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,105 @@
+"""
+Bounded LRU cache for per-match outcome probabilities, keyed by quantized xG.
+"""
+import json
+import os
+from collections import OrderedDict
+
+
+class ScoreCache:
+    """
+    Least-recently-used cache of derived outcome probabilities.
+
+    Keys are (home_xg, away_xg) rounded to `precision` decimals, and values are
+    always computed from the rounded pair so a key maps to one answer no matter
+    which raw xG populated it first. Optionally persisted to a JSON file so a
+    warm worker can reuse it between runs.
+    """
+
+    def __init__(self, maxsize=4096, precision=3, path=None):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.precision = precision
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, home_xg, away_xg):
+        """Quantizes an xG pair to the cache key."""
+        return (round(float(home_xg), self.precision), round(float(away_xg), self.precision))
+
+    def get_or_compute(self, home_xg, away_xg, compute):
+        """Returns the cached value for the pair, calling compute(home_xg, away_xg) on a miss."""
+        key = self.key(home_xg, away_xg)
+        entries = self._entries
+        value = entries.get(key)
+        if value is not None:
+            self.hits += 1
+            entries.move_to_end(key)
+            return value
+
+        self.misses += 1
+        value = compute(*key)
+        entries[key] = value
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        """Counters for monitoring the hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "precision": self.precision,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def save(self, path=None):
+        """Writes the cache (most recently used last) to disk atomically."""
+        path = path or self.path
+        if not path:
+            return
+        payload = {
+            "precision": self.precision,
+            "entries": [[h, a, value] for (h, a), value in self._entries.items()],
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path=None):
+        """Loads entries written by save(). Missing files and precision mismatches are ignored."""
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with open(path, encoding='utf-8') as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if payload.get("precision") != self.precision:
+            return 0
+
+        loaded = 0
+        for h, a, value in payload.get("entries", [])[-self.maxsize:]:
+            # JSON turns tuples into lists; restore the shape compute() returns.
+            self._entries[(h, a)] = tuple(value)
+            loaded += 1
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return loaded
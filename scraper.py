@@ -1,15 +1,20 @@
 
-import time
-import random
-import json
-import requests
+import os
+import sys
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 
+# Scraper helpers live in scraper/ (this file shadows the directory as a package name).
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scraper'))
+import page_parser  # noqa: E402
+import pipeline  # noqa: E402
+import readiness  # noqa: E402
+
+# "page_source" parses one HTML snapshot in-process; "elements" queries each row over WebDriver.
+PARSE_MODE = os.environ.get("SCRAPER_PARSE_MODE", "page_source")
+
 def setup_driver():
     """Sets up the Selenium WebDriver with anti-detection options."""
     options = webdriver.ChromeOptions()
@@ -27,36 +32,38 @@ def setup_driver():
     
     return driver
 
-def scrape_odds_portal(driver, url):
-    """Navigates to the URL, scrolls, and scrapes match data."""
+def scrape_odds_portal(driver, url, parse_mode=PARSE_MODE, max_wait=readiness.DEFAULT_MAX_WAIT, jitter=None, timings=None):
+    """
+    Navigates to the URL, scrolls until the match list stops growing, and scrapes match data.
+    Per-phase timings (navigation, ready, parse) are written into `timings` if given.
+    """
+    timer = readiness.PageTimer(timings)
     print(f"Navigating to {url}...")
+    timer.start("navigation")
     driver.get(url)
     
-    # Wait for the main content to be somewhat loaded
-    initial_wait = random.uniform(5, 8)
-    print(f"Waiting for {initial_wait:.2f} seconds for initial page load...")
-    time.sleep(initial_wait)
-    
-    # Scroll down to load lazy-loaded content
-    print("Scrolling down to load all matches...")
+    # Scroll until lazy-loaded rows stop appearing and the page has gone quiet
+    print("Waiting for the match list to finish loading...")
+    timer.start("ready")
     try:
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(random.uniform(2, 4))
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(random.uniform(2, 3))
+        ready = readiness.wait_for_rows(driver, page_parser.ROW_SELECTOR, max_wait=max_wait, jitter=jitter)
+        print(f"{ready['rows']} rows after {ready['scrolls']} scrolls in {ready['seconds']:.2f}s" + (" (upper bound reached)" if ready['timed_out'] else ""))
     except Exception as e:
-        print(f"Could not scroll page: {e}")
+        print(f"Could not wait for the page: {e}")
 
     scraped_matches = []
+    timer.start("parse")
     
     try:
-        # Wait for event rows to be present
-        WebDriverWait(driver, 20).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.flex.items-center.min-h-11.border-b.border-black-main-30"))
-        )
-        
+        if parse_mode == "page_source":
+            scraped_matches = page_parser.parse_matches(driver.page_source)
+            for match_data in scraped_matches:
+                print(f"  -> Scraped: {match_data['homeTeam']} vs {match_data['awayTeam']} | Odds: {match_data['homeOdd']}, {match_data['drawOdd']}, {match_data['awayOdd']}")
+            print(f"Page timings for {url}: {timer.summary()}")
+            return scraped_matches
+
         # Find all match rows. This selector is more robust.
-        match_rows = driver.find_elements(By.CSS_SELECTOR, "div.flex.items-center.min-h-11.border-b.border-black-main-30")
+        match_rows = driver.find_elements(By.CSS_SELECTOR, page_parser.ROW_SELECTOR)
         print(f"Found {len(match_rows)} potential match rows.")
 
         for row in match_rows:
@@ -109,42 +116,31 @@ def scrape_odds_portal(driver, url):
     except Exception as e:
         print(f"An error occurred during scraping: {e}")
         
+    print(f"Page timings for {url}: {timer.summary()}")
     return scraped_matches
 
-def send_data_to_api(data, api_url):
-    """Sends the scraped data to the specified API endpoint."""
-    if not data:
-        print("No data to send.")
-        return
-
-    payload = {"matches": data}
-    headers = {"Content-Type": "application/json"}
-    
-    print(f"\nSending {len(data)} matches to {api_url}...")
-    
-    try:
-        response = requests.post(api_url, data=json.dumps(payload), headers=headers)
-        response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
-        
-        print(f"API Response ({response.status_code}): {response.json()}")
-        print("Data successfully sent and processed.")
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Error sending data to API: {e}")
-        if e.response:
-            print(f"API Response Content: {e.response.text}")
-
 if __name__ == "__main__":
     TARGET_URL = "https://www.oddsportal.com/football/england/premier-league/"
     # The Next.js dev server runs on port 9002 in this environment
     API_ENDPOINT = "http://localhost:9002/api/update-odds" 
-    
+
+    parser = pipeline.build_parser("Scrape 1X2 odds from OddsPortal and upload them.", API_ENDPOINT)
+    args = parser.parse_args()
+
+    if args.urls or args.leagues:
+        scraped_data = pipeline.scrape_from_args(scrape_odds_portal, args)
+        if scraped_data:
+            pipeline.publish(scraped_data, args)
+        else:
+            print("\nNo matches were scraped from any league.")
+        sys.exit(0)
+
     driver = setup_driver()
     
     try:
-        scraped_data = scrape_odds_portal(driver, TARGET_URL)
+        scraped_data = scrape_odds_portal(driver, TARGET_URL, max_wait=args.max_wait, jitter=args.jitter)
         if scraped_data:
-            send_data_to_api(scraped_data, API_ENDPOINT)
+            pipeline.publish(scraped_data, args)
         else:
             print("\nNo matches were scraped. The website structure might have changed or there are no upcoming matches.")
     finally:
@@ -0,0 +1,188 @@
+"""
+Bounded pool of long-lived headless Chrome drivers for scraping many leagues.
+
+Drivers are created lazily (up to `size`), reused across pages, and replaced
+when a page times out or the browser dies. Images, fonts and stylesheets are
+blocked through CDP, so a page costs only its HTML and scripts. Selenium is
+imported only when a driver is actually built, so the pool logic can run with
+any driver factory offline.
+"""
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+LEAGUES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'leagues.json')
+DEFAULT_POOL_SIZE = 4
+DEFAULT_URL_TIMEOUT = 60
+
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.css",
+]
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36'
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def load_league_urls(path=LEAGUES_FILE):
+    """League page URLs from a JSON list (either URLs or {"name", "url"} objects)."""
+    with open(path, encoding='utf-8') as f:
+        leagues = json.load(f)
+    return [league["url"] if isinstance(league, dict) else league for league in leagues]
+
+
+def chromedriver_path():
+    """Resolves chromedriver once per process instead of once per browser."""
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+            _driver_path = ChromeDriverManager().install()
+        return _driver_path
+
+
+def make_headless_driver(page_load_timeout=DEFAULT_URL_TIMEOUT, block_resources=True):
+    """Headless Chrome with the scrapers' anti-detection settings and heavy resources blocked."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+    options.add_argument(f'user-agent={USER_AGENT}')
+    if block_resources:
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+
+    driver = webdriver.Chrome(service=Service(chromedriver_path()), options=options)
+    driver.set_page_load_timeout(page_load_timeout)
+    driver.set_script_timeout(page_load_timeout)
+
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
+        "source": "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
+    })
+    if block_resources:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    return driver
+
+
+class DriverPool:
+    """
+    Hands out at most `size` drivers at a time. A driver is returned to the
+    pool after each page unless the page failed, in which case it is quit and
+    a fresh one is built on the next acquire.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, factory=make_headless_driver):
+        if size <= 0:
+            raise ValueError("size must be positive")
+        self.size = size
+        self.factory = factory
+        self.created = 0
+        self.recycled = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._all = set()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            driver = self.factory()
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._all.add(driver)
+            self.created += 1
+        return driver
+
+    def release(self, driver, healthy=True):
+        if healthy:
+            self._idle.put(driver)
+        else:
+            self._discard(driver)
+        self._slots.release()
+
+    def _discard(self, driver):
+        with self._lock:
+            self._all.discard(driver)
+            self.recycled += 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        with self._lock:
+            drivers, self._all = list(self._all), set()
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def scrape_urls(urls, scrape_page, pool_size=DEFAULT_POOL_SIZE, url_timeout=DEFAULT_URL_TIMEOUT, factory=None):
+    """
+    Runs scrape_page(driver, url, timings) for every URL on a pool of reused
+    drivers; scrape_page may record per-phase seconds in the `timings` dict.
+
+    Returns one {"url", "matches", "error", "seconds", "timings"} dict per URL, in input
+    order. `url_timeout` is the drivers' page-load and script timeout; a page
+    that times out or raises is reported as an error and its driver is
+    replaced, while the other URLs carry on.
+    """
+    if factory is None:
+        def factory():
+            return make_headless_driver(page_load_timeout=url_timeout)
+
+    def run(url):
+        started = time.perf_counter()
+        try:
+            driver = pool.acquire()
+        except Exception as e:
+            return {"url": url, "matches": [], "error": f"Could not start browser: {e}", "seconds": 0.0, "timings": {}}
+        healthy = True
+        timings = {}
+        try:
+            matches = scrape_page(driver, url, timings)
+            error = None
+        except Exception as e:
+            healthy = False
+            matches, error = [], f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - started
+        pool.release(driver, healthy=healthy)
+        return {"url": url, "matches": matches, "error": error, "seconds": round(elapsed, 2), "timings": timings}
+
+    workers = max(1, min(pool_size, len(urls)))
+    with DriverPool(size=workers, factory=factory) as pool:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run, urls))
+        print(
+            f"[POOL] {len(urls)} pages on {pool.created} drivers ({pool.recycled} replaced)",
+            file=sys.stderr,
+        )
+    return results
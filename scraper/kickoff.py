@@ -0,0 +1,56 @@
+"""
+Kickoff dates for scraped matches.
+
+A league page lists matches under date headers ("Today, 18 Oct",
+"Tomorrow, 19 Oct - Premier League", "25 Oct 2026") and each row only shows
+the kickoff time. Both parsers remember the last header they passed and
+stamp every match with kickoff(date, time) = "YYYY-MM-DD HH:MM".
+"""
+import datetime
+import re
+from functools import lru_cache
+
+DATE_HEADER_REGEX = re.compile(
+    r'^(?:(?:Today|Tomorrow|Yesterday),\s*)?(\d{1,2}) (Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)(?: (\d{4}))?(?:\s+-\s.*)?$'
+)
+MONTHS = {name: number for number, name in enumerate(
+    ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1
+)}
+
+
+def today_iso():
+    return datetime.date.today().isoformat()
+
+
+@lru_cache(maxsize=1024)
+def header_date(text, today):
+    """
+    ISO date of a date header, or None if `text` is not one. Headers without
+    a year take the year that puts the date nearest to `today` (ISO date), so
+    a December fixture read in January still lands in the right season.
+    """
+    match = DATE_HEADER_REGEX.match(text.strip())
+    if match is None:
+        return None
+    day, month, year = int(match.group(1)), MONTHS[match.group(2)], match.group(3)
+    if year:
+        years = (int(year),)
+    else:
+        today = datetime.date.fromisoformat(today)
+        years = (today.year - 1, today.year, today.year + 1)
+    candidates = []
+    for candidate_year in years:
+        try:
+            candidates.append(datetime.date(candidate_year, month, day))
+        except ValueError:  # 30 Feb, or 29 Feb outside a leap year
+            pass
+    if not candidates:
+        return None
+    if year:
+        return candidates[0].isoformat()
+    return min(candidates, key=lambda date: abs(date - today)).isoformat()
+
+
+def kickoff(date, time_text):
+    """'YYYY-MM-DD HH:MM', or None when the date header is unknown."""
+    return f"{date} {time_text}" if date else None
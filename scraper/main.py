@@ -1,18 +1,16 @@
 
-import time
-import random
-import json
-import requests
 import sys
 import traceback
-import re
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 
+import page_parser
+import pipeline
+import readiness
+import text_parser
+
 def setup_driver():
     """Sets up the Selenium WebDriver for a visible, debug-friendly environment."""
     options = webdriver.ChromeOptions()
@@ -38,35 +36,28 @@ def setup_driver():
     
     return driver
 
-def convert_to_decimal(odd_str: str) -> float:
-    """Converts American or Decimal odds string to a decimal float."""
-    try:
-        # If it's already a decimal
-        if '.' in odd_str:
-            return float(odd_str)
-        
-        # American odds
-        odd_val = int(odd_str)
-        if odd_val > 0: # Positive odds
-            return round((odd_val / 100) + 1, 2)
-        else: # Negative odds
-            return round((100 / abs(odd_val)) + 1, 2)
-    except (ValueError, TypeError):
-        # Return a value that indicates an error, e.g., 0.0 or raise an exception
-        return 0.0
-
-
-def scrape_odds_portal(driver, url):
-    """Navigates to the URL and scrapes match data by parsing page text."""
+def scrape_odds_portal(driver, url, max_wait=readiness.DEFAULT_MAX_WAIT, jitter=None, timings=None):
+    """
+    Navigates to the URL and scrapes match data by parsing page text.
+    Per-phase timings (navigation, ready, parse) are written into `timings` if given.
+    """
+    timer = readiness.PageTimer(timings)
     print(f"Navigating to {url}...")
+    timer.start("navigation")
     driver.get(url)
     
-    # Increased wait time for manual CAPTCHA solving
-    wait_time = 15
-    print(f"Waiting for {wait_time} seconds for potential manual intervention (e.g., CAPTCHA)...")
-    time.sleep(wait_time)
+    # Wait until the match list stops growing. While no rows are present (e.g. a CAPTCHA
+    # waiting for manual intervention) this keeps waiting up to max_wait seconds.
+    print(f"Waiting up to {max_wait:.0f} seconds for the match list to finish loading...")
+    timer.start("ready")
+    try:
+        ready = readiness.wait_for_rows(driver, page_parser.ROW_SELECTOR, max_wait=max_wait, jitter=jitter)
+        print(f"{ready['rows']} rows after {ready['scrolls']} scrolls in {ready['seconds']:.2f}s" + (" (upper bound reached)" if ready['timed_out'] else ""))
+    except Exception as e:
+        print(f"Could not wait for the page: {e}")
     
     scraped_matches = []
+    timer.start("parse")
     
     try:
         # Get all visible text from the body
@@ -75,79 +66,9 @@ def scrape_odds_portal(driver, url):
         
         print(f"Analyzing {len(lines)} lines of text from the page.")
         
-        # Regex to identify time format like XX:XX
-        time_regex = re.compile(r'^\d{2}:\d{2}$')
-        # Regex for both decimal (e.g., 1.23) and American odds (e.g., -110, +250)
-        odd_regex = re.compile(r'^(\d+\.\d{2}|[+-]\d+)$')
-
-        i = 0
-        while i < len(lines) - 4:
-            # Find a line that looks like a time
-            if time_regex.match(lines[i]):
-                try:
-                    home_team_index = i + 1
-                    
-                    separator_index = -1
-                    for j in range(home_team_index, min(i + 5, len(lines))):
-                         if not lines[j].replace('.', '', 1).isdigit() and not lines[j][0].isalpha() and len(lines[j]) < 5 and lines[j] != '-':
-                             separator_index = j
-                             break
-                    
-                    if separator_index == -1:
-                        if i + 3 < len(lines) and lines[i+2] == '-': 
-                           home_team = lines[i+1]
-                           away_team = lines[i+3]
-                           odds_start_index = i + 4
-                        else:
-                           home_team = lines[i+1]
-                           away_team = lines[i+2]
-                           odds_start_index = i + 3
-                    else:
-                        home_team = " ".join(lines[home_team_index:separator_index])
-                        away_team_index = separator_index + 1
-                        away_team_end_index = away_team_index
-                        while away_team_end_index < len(lines) and not odd_regex.match(lines[away_team_end_index]):
-                            away_team_end_index += 1
-                        
-                        away_team = " ".join(lines[away_team_index:away_team_end_index])
-                        odds_start_index = away_team_end_index
-
-                    if not home_team or not away_team:
-                        i +=1
-                        continue
-
-                    # Clean team names by removing digits and extra spaces/dashes
-                    home_team = re.sub(r'\d+', '', home_team).replace('-', '').strip()
-                    away_team = re.sub(r'\d+', '', away_team).replace('-', '').strip()
-
-                    if odds_start_index + 2 < len(lines):
-                        home_odd_str = lines[odds_start_index]
-                        draw_odd_str = lines[odds_start_index + 1]
-                        away_odd_str = lines[odds_start_index + 2]
-
-                        if odd_regex.match(home_odd_str) and odd_regex.match(draw_odd_str) and odd_regex.match(away_odd_str):
-                            home_odd = convert_to_decimal(home_odd_str)
-                            draw_odd = convert_to_decimal(draw_odd_str)
-                            away_odd = convert_to_decimal(away_odd_str)
-
-                            match_data = {
-                                "homeTeam": home_team.strip(),
-                                "awayTeam": away_team.strip(),
-                                "homeOdd": home_odd,
-                                "drawOdd": draw_odd,
-                                "awayOdd": away_odd,
-                            }
-                            scraped_matches.append(match_data)
-                            print(f"  -> Scraped: {home_team} vs {away_team} | Odds: {home_odd}, {draw_odd}, {away_odd}")
-                            
-                            i = odds_start_index + 3
-                            continue
-
-                except (ValueError, IndexError):
-                    i += 1
-                    continue
-            
-            i += 1
+        scraped_matches = text_parser.parse_lines(lines)
+        for match_data in scraped_matches:
+            print(f"  -> Scraped: {match_data['homeTeam']} vs {match_data['awayTeam']} | Odds: {match_data['homeOdd']}, {match_data['drawOdd']}, {match_data['awayOdd']}")
 
     except Exception as e:
         print(f"An error occurred during scraping: {e}")
@@ -163,39 +84,28 @@ def scrape_odds_portal(driver, url):
         except Exception as save_e:
             print(f"Could not save debug files: {save_e}")
         
+    print(f"Page timings for {url}: {timer.summary()}")
     return scraped_matches
 
-def send_data_to_api(data, api_url):
-    """Sends the scraped data to the specified API endpoint."""
-    if not data:
-        print("No data to send.")
-        return
-
-    payload = {"matches": data}
-    headers = {"Content-Type": "application/json"}
-    
-    print(f"\nSending {len(data)} matches to {api_url}...")
-    
-    try:
-        response = requests.post(api_url, data=json.dumps(payload), headers=headers)
-        response.raise_for_status() 
-        
-        print(f"API Response ({response.status_code}): {response.json()}")
-        print("Data successfully sent and processed.")
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Error sending data to API: {e}")
-        if e.response:
-            print(f"API Response Content: {e.response.text}")
-
 if __name__ == "__main__":
     TARGET_URL = "https://www.oddsportal.com/football/england/premier-league/"
     API_ENDPOINT = "http://localhost:9002/api/update-odds" 
-    
+
+    parser = pipeline.build_parser("Scrape 1X2 odds from OddsPortal page text and upload them.", API_ENDPOINT)
+    args = parser.parse_args()
+
+    if args.urls or args.leagues:
+        scraped_data = pipeline.scrape_from_args(scrape_odds_portal, args)
+        if scraped_data:
+            pipeline.publish(scraped_data, args)
+        else:
+            print("\nNo matches were scraped from any league.")
+        sys.exit(0)
+
     driver = None
     try:
         driver = setup_driver()
-        scraped_data = scrape_odds_portal(driver, TARGET_URL)
+        scraped_data = scrape_odds_portal(driver, TARGET_URL, max_wait=args.max_wait, jitter=args.jitter)
         
         if not scraped_data:
             print("\nNo matches were scraped. The website structure might have changed or there are no upcoming matches.")
@@ -206,7 +116,7 @@ if __name__ == "__main__":
             except Exception as save_e:
                  print(f"Could not save debug.html file: {save_e}")
         else:
-             send_data_to_api(scraped_data, API_ENDPOINT)
+             pipeline.publish(scraped_data, args)
 
     except Exception as main_e:
         print(f"\nA critical error occurred in the main execution block: {main_e}")
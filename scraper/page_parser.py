@@ -0,0 +1,169 @@
+"""
+In-process OddsPortal page parser.
+
+Extracts teams and 1X2 odds from one HTML string (driver.page_source or a
+saved debug.html) with the standard-library HTML parser, instead of asking
+the browser for every row's text and child elements over WebDriver.
+Date headers between the rows give each match its kickoff (see kickoff.py).
+
+Usage: python scraper/page_parser.py debug.html [--repeat N]
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from html.parser import HTMLParser
+
+from kickoff import header_date, kickoff, today_iso
+
+# Same selectors as the WebDriver path in scraper.py.
+ROW_CLASSES = frozenset(("flex", "items-center", "min-h-11", "border-b", "border-black-main-30"))
+ROW_SELECTOR = "div." + ".".join(("flex", "items-center", "min-h-11", "border-b", "border-black-main-30"))
+TEAM_CLASS = "participant-name"
+ODD_CLASS = "h-7"
+TIME_REGEX = re.compile(r'^\d{2}:\d{2}$')
+DATE_HEADER_START = frozenset("0123456789TY")
+
+VOID_ELEMENTS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr",
+))
+
+
+class OddsPageParser(HTMLParser):
+    """
+    Collects match rows in one pass. For each `div.flex.items-center.min-h-11...`
+    row it keeps the text of `p.participant-name` and `div.h-7` descendants,
+    whitespace-collapsed the way WebElement.text renders it, the row's HH:MM
+    time and the date of the last date header before it.
+    """
+
+    def __init__(self, today=None):
+        super().__init__(convert_charrefs=True)
+        self.today = today or today_iso()
+        self.date = None
+        self.rows = []
+        self._stack = []      # (tag, kind) for open elements; kind is 'row', 'team', 'odd' or None
+        self._open = {}       # tag -> number of open elements, so stray end tags are O(1) to reject
+        self._row = None      # {"teams": [...], "odds": [...]} while inside a row
+        self._captures = []   # [kind, text parts] for open team/odd elements
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_ELEMENTS:
+            return
+        kind = None
+        class_attr = next((value for name, value in attrs if name == "class"), None)
+        if class_attr:
+            classes = class_attr.split()
+            if self._row is None:
+                if tag == "div" and ROW_CLASSES.issubset(classes):
+                    kind = "row"
+                    self._row = {"teams": [], "odds": [], "date": self.date, "time": None}
+            elif tag == "p" and TEAM_CLASS in classes:
+                kind = "team"
+            elif tag == "div" and ODD_CLASS in classes:
+                kind = "odd"
+        if kind in ("team", "odd"):
+            self._captures.append([kind, []])
+        self._stack.append((tag, kind))
+        self._open[tag] = self._open.get(tag, 0) + 1
+
+    def handle_startendtag(self, tag, attrs):
+        # <div ... /> never holds text; nothing to track.
+        pass
+
+    def handle_endtag(self, tag):
+        if not self._open.get(tag):
+            return
+        # Close everything up to the matching element (tolerates unclosed children).
+        while self._stack:
+            open_tag, kind = self._stack.pop()
+            self._open[open_tag] -= 1
+            if kind:
+                self._close(kind)
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        for _, parts in self._captures:
+            parts.append(data)
+        text = data.strip()
+        if not text:
+            return
+        if self._row is None:
+            if text[0] in DATE_HEADER_START:
+                self.date = header_date(text, self.today) or self.date
+        elif not self._captures and self._row["time"] is None and TIME_REGEX.match(text):
+            self._row["time"] = text
+
+    def close(self):
+        super().close()
+        while self._stack:
+            kind = self._stack.pop()[1]
+            if kind:
+                self._close(kind)
+        self._open.clear()
+
+    def _close(self, kind):
+        if kind in ("team", "odd"):
+            capture_kind, parts = self._captures.pop()
+            if self._row is not None:
+                self._row["teams" if capture_kind == "team" else "odds"].append(" ".join("".join(parts).split()))
+        elif kind == "row":
+            self.rows.append(self._row)
+            self._row = None
+
+
+def parse_matches(html, today=None):
+    """
+    Returns the matches on the page in the scraper's upload shape
+    (homeTeam/awayTeam/homeOdd/drawOdd/awayOdd) plus kickoff ("YYYY-MM-DD HH:MM",
+    None without a date header or row time). Rows without exactly two
+    participants or without three numeric leading odds are skipped, as in
+    the WebDriver path.
+    """
+    parser = OddsPageParser(today)
+    parser.feed(html)
+    parser.close()
+
+    matches = []
+    for row in parser.rows:
+        teams, odds = row["teams"], row["odds"]
+        if len(teams) != 2 or len(odds) < 3:
+            continue
+        try:
+            home_odd, draw_odd, away_odd = float(odds[0]), float(odds[1]), float(odds[2])
+        except ValueError:
+            continue
+        matches.append({
+            "homeTeam": teams[0].strip(),
+            "awayTeam": teams[1].strip(),
+            "homeOdd": home_odd,
+            "drawOdd": draw_odd,
+            "awayOdd": away_odd,
+            "kickoff": kickoff(row["date"], row["time"]) if row["time"] else None,
+        })
+    return matches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse matches and 1X2 odds from a saved OddsPortal page.")
+    parser.add_argument("html_file", help="Saved page source, e.g. debug.html")
+    parser.add_argument("--repeat", type=int, default=1, help="Parse the page this many times and report the mean time.")
+    args = parser.parse_args(argv)
+
+    with open(args.html_file, encoding="utf-8") as f:
+        html = f.read()
+
+    started = time.perf_counter()
+    for _ in range(max(1, args.repeat)):
+        matches = parse_matches(html)
+    elapsed_ms = (time.perf_counter() - started) * 1000 / max(1, args.repeat)
+
+    print(json.dumps(matches, indent=2, ensure_ascii=False))
+    print(f"Parsed {len(matches)} matches from {len(html):,} bytes in {elapsed_ms:.2f} ms per page.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Scrape-to-upload pipeline shared by both scrapers (scraper.py and scraper/main.py).
+
+Each scraper only provides its own page function, scrape_odds_portal(driver,
+url, max_wait=..., jitter=..., timings=...); the driver pool, the command
+line, team resolution, odds history and (delta) uploading live here.
+"""
+import argparse
+import os
+import sys
+
+import driver_pool
+import readiness
+from uploader import OddsUploader, add_upload_arguments, uploader_from_args
+from snapshot_store import add_delta_arguments, publish_changes, snapshot_store_from_args
+
+# odds_history and team_resolver live in the repository root.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from odds_history import add_history_arguments, record_observations  # noqa: E402
+import team_resolver  # noqa: E402
+
+
+def scrape_leagues(scrape_odds_portal, urls, pool_size=driver_pool.DEFAULT_POOL_SIZE,
+                   timeout=driver_pool.DEFAULT_URL_TIMEOUT, max_wait=readiness.DEFAULT_MAX_WAIT, jitter=None):
+    """Scrapes every league URL on a pool of reused headless drivers and returns all matches."""
+    def scrape_page(driver, url, timings):
+        return scrape_odds_portal(driver, url, max_wait=max_wait, jitter=jitter, timings=timings)
+
+    results = driver_pool.scrape_urls(urls, scrape_page, pool_size=pool_size, url_timeout=timeout)
+    scraped_matches = []
+    for result in results:
+        phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in result["timings"].items())
+        if result["error"]:
+            print(f"[{result['url']}] failed after {result['seconds']}s: {result['error']}")
+        else:
+            print(f"[{result['url']}] {len(result['matches'])} matches in {result['seconds']}s ({phases})")
+        scraped_matches.extend(result["matches"])
+    return scraped_matches
+
+
+def send_data_to_api(data, api_url, uploader=None, snapshots=None, full_sync=False):
+    """
+    Sends the scraped data to the specified API endpoint in gzip-compressed chunks.
+    Chunks that cannot be delivered stay in the spool and are replayed on the next run.
+    With a snapshot store, only new matches and moved odds are sent unless full_sync.
+    """
+    if not data:
+        print("No data to send.")
+        return
+
+    owned = uploader is None
+    if owned:
+        uploader = OddsUploader(api_url)
+    try:
+        if snapshots is not None:
+            return publish_changes(data, uploader, snapshots, full_sync=full_sync)
+        return uploader.upload(data)
+    finally:
+        if owned:
+            uploader.close()
+
+
+def build_parser(description, api_url):
+    """Command line shared by both scrapers."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("urls", nargs="*", help="League pages to scrape on the headless driver pool.")
+    parser.add_argument("--leagues", action="store_true", help="Scrape every league in scraper/leagues.json.")
+    parser.add_argument("--pool-size", type=int, default=driver_pool.DEFAULT_POOL_SIZE, help="Headless browsers to run at once.")
+    parser.add_argument("--timeout", type=int, default=driver_pool.DEFAULT_URL_TIMEOUT, help="Page-load timeout per URL in seconds.")
+    parser.add_argument("--max-wait", type=float, default=readiness.DEFAULT_MAX_WAIT, help="Upper bound in seconds for the match list to finish loading.")
+    parser.add_argument("--jitter", type=float, nargs=2, metavar=("LOW", "HIGH"), help="Wait at least a random LOW-HIGH seconds per page.")
+    add_upload_arguments(parser, api_url)
+    add_delta_arguments(parser)
+    add_history_arguments(parser)
+    parser.add_argument("--teams-db", default=team_resolver.DEFAULT_DB_PATH, help="bahis.db used to attach team ids to scraped names.")
+    return parser
+
+
+def scrape_from_args(scrape_odds_portal, args):
+    """Scrapes the URLs and/or configured leagues named on the command line."""
+    urls = args.urls + (driver_pool.load_league_urls() if args.leagues else [])
+    return scrape_leagues(scrape_odds_portal, urls, pool_size=args.pool_size, timeout=args.timeout,
+                          max_wait=args.max_wait, jitter=args.jitter)
+
+
+def publish(scraped_data, args):
+    """Attaches team ids, records the odds history and uploads the scrape as configured by `args`."""
+    team_resolver.resolve_scraped_teams(scraped_data, args.teams_db)
+    if not args.no_history:
+        record_observations(scraped_data, args.history_dir)
+    with snapshot_store_from_args(args) as snapshots, uploader_from_args(args) as uploader:
+        return send_data_to_api(scraped_data, args.api_url, uploader, snapshots, args.full_sync)
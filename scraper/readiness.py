@@ -0,0 +1,94 @@
+"""
+Event-driven page readiness for the Selenium scrapers.
+
+Instead of sleeping a fixed number of seconds, the page is polled (one script
+call per poll) for the number of match rows and how long the DOM and the
+network have been quiet. The page is scrolled each time it goes quiet, and is
+ready once a scroll no longer adds rows. A hard upper bound caps the wait,
+and an optional jitter enforces a randomized minimum for politeness.
+"""
+import random
+import time
+
+DEFAULT_MAX_WAIT = 30.0
+DEFAULT_QUIET = 0.5
+DEFAULT_POLL = 0.1
+
+# Installs a MutationObserver once per document and reports row count plus the
+# time since the last DOM mutation or completed network response.
+STATE_SCRIPT = """
+const selector = arguments[0];
+if (!window.__readiness) {
+  window.__readiness = {lastMutation: performance.now()};
+  new MutationObserver(() => { window.__readiness.lastMutation = performance.now(); })
+    .observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+}
+let lastResponse = 0;
+for (const entry of performance.getEntriesByType('resource')) {
+  lastResponse = Math.max(lastResponse, entry.responseEnd);
+}
+return {
+  rows: document.querySelectorAll(selector).length,
+  quietMs: performance.now() - Math.max(window.__readiness.lastMutation, lastResponse),
+  readyState: document.readyState,
+};
+"""
+
+SCROLL_SCRIPT = "window.scrollTo(0, document.body.scrollHeight);"
+
+
+def wait_for_rows(driver, selector, max_wait=DEFAULT_MAX_WAIT, quiet=DEFAULT_QUIET, poll=DEFAULT_POLL, jitter=None):
+    """
+    Scrolls until the count of `selector` rows stops growing while the page is
+    quiet for `quiet` seconds, or until `max_wait` seconds pass. With `jitter`
+    as (low, high) seconds, the wait lasts at least a random time in that range.
+
+    Returns {"rows", "scrolls", "seconds", "timed_out"}.
+    """
+    started = time.perf_counter()
+    deadline = started + max_wait
+    rows, last_rows, scrolls = 0, -1, 0
+    settled_after = started
+    timed_out = True
+    while time.perf_counter() < deadline:
+        state = driver.execute_script(STATE_SCRIPT, selector)
+        rows = state["rows"]
+        now = time.perf_counter()
+        # A scroll only counts as settled after a full quiet window of its own.
+        if rows and state["readyState"] == "complete" and state["quietMs"] >= quiet * 1000 and now >= settled_after:
+            if rows == last_rows:
+                timed_out = False
+                break
+            last_rows = rows
+            driver.execute_script(SCROLL_SCRIPT)
+            scrolls += 1
+            settled_after = time.perf_counter() + quiet
+        time.sleep(poll)
+
+    if jitter:
+        remaining = random.uniform(*jitter) - (time.perf_counter() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+    return {"rows": rows, "scrolls": scrolls, "seconds": round(time.perf_counter() - started, 3), "timed_out": timed_out}
+
+
+class PageTimer:
+    """Wall-clock time per phase of one page (navigation, ready, parse), in seconds."""
+
+    def __init__(self, timings=None):
+        self.timings = {} if timings is None else timings
+        self._phase = None
+        self._started = None
+
+    def start(self, phase):
+        self.stop()
+        self._phase, self._started = phase, time.perf_counter()
+
+    def stop(self):
+        if self._phase is not None:
+            self.timings[self._phase] = round(time.perf_counter() - self._started, 3)
+            self._phase = None
+        return self.timings
+
+    def summary(self):
+        return ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.stop().items())
@@ -0,0 +1,149 @@
+"""
+Local store of the odds last published to /api/update-odds.
+
+Each scraped match is keyed by (home, away, kickoff) and compared with the
+odds that were last published for it. Only new matches and matches whose
+1X2 odds moved by more than `tolerance` (decimal odds) are sent; a full sync
+sends everything. Comparisons are always against the last *published* odds,
+so slow drift still crosses the tolerance eventually.
+
+Parsers that do not report a kickoff key on (home, away, "").
+"""
+import os
+import sqlite3
+import time
+
+from uploader import DROPPED
+
+DEFAULT_SNAPSHOT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots.db')
+DEFAULT_TOLERANCE = 0.0
+# Matches not scraped for this long (finished or delisted) are dropped from the store.
+DEFAULT_RETENTION_DAYS = 7
+
+ODD_FIELDS = ("homeOdd", "drawOdd", "awayOdd")
+# Odds are quoted to two decimals; keeps 1.95 vs 1.94 from failing a 0.01 tolerance on float noise.
+EPSILON = 1e-9
+
+
+def match_key(match):
+    return (match["homeTeam"], match["awayTeam"], match.get("kickoff") or "")
+
+
+class SnapshotStore:
+    def __init__(self, db_path=DEFAULT_SNAPSHOT_DB, tolerance=DEFAULT_TOLERANCE, retention_days=DEFAULT_RETENTION_DAYS):
+        if tolerance < 0:
+            raise ValueError("tolerance must not be negative")
+        self.db_path = db_path
+        self.tolerance = tolerance
+        self.retention_days = retention_days
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS published_odds (
+                home_team TEXT NOT NULL,
+                away_team TEXT NOT NULL,
+                kickoff TEXT NOT NULL,
+                home_odd REAL NOT NULL,
+                draw_odd REAL NOT NULL,
+                away_odd REAL NOT NULL,
+                published_at REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                PRIMARY KEY (home_team, away_team, kickoff)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _published(self):
+        rows = self.conn.execute(
+            "SELECT home_team, away_team, kickoff, home_odd, draw_odd, away_odd FROM published_odds"
+        )
+        return {(home, away, kickoff): odds for home, away, kickoff, *odds in rows}
+
+    def diff(self, matches, full_sync=False):
+        """
+        Splits `matches` into what has to be published. Returns
+        (to_publish, counts) with counts for new, moved and unchanged matches.
+        Duplicate keys within one scrape keep their last occurrence.
+        """
+        latest = {match_key(match): match for match in matches}
+        published = self._published()
+        to_publish = []
+        counts = {"scraped": len(latest), "new": 0, "moved": 0, "unchanged": 0}
+        for key, match in latest.items():
+            previous = published.get(key)
+            if previous is None:
+                counts["new"] += 1
+            elif any(abs(match[field] - old) > self.tolerance + EPSILON for field, old in zip(ODD_FIELDS, previous)):
+                counts["moved"] += 1
+            else:
+                counts["unchanged"] += 1
+                if not full_sync:
+                    continue
+            to_publish.append(match)
+        return to_publish, counts
+
+    def record(self, published, seen=()):
+        """
+        Stores `published` matches as the last published odds and bumps the
+        last-seen time of everything else in `seen`, then prunes stale rows.
+        Call only after the upload has been accepted or spooled.
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO published_odds VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (home_team, away_team, kickoff) DO UPDATE SET
+                    home_odd = excluded.home_odd, draw_odd = excluded.draw_odd, away_odd = excluded.away_odd,
+                    published_at = excluded.published_at, last_seen = excluded.last_seen
+                """,
+                [(*match_key(m), m["homeOdd"], m["drawOdd"], m["awayOdd"], now, now) for m in published],
+            )
+            self.conn.executemany(
+                "UPDATE published_odds SET last_seen = ? WHERE home_team = ? AND away_team = ? AND kickoff = ?",
+                [(now, *match_key(m)) for m in seen],
+            )
+            self.conn.execute("DELETE FROM published_odds WHERE last_seen < ?", (now - self.retention_days * 86400,))
+
+
+def publish_changes(matches, uploader, store, full_sync=False):
+    """
+    Uploads only new or moved matches (everything with full_sync) and records
+    the ones the uploader did not drop in the snapshot store. Returns the
+    uploader summary.
+    """
+    to_publish, counts = store.diff(matches, full_sync=full_sync)
+    print(
+        f"[DELTA] {counts['scraped']} scraped: {counts['new']} new, {counts['moved']} moved, "
+        f"{counts['unchanged']} unchanged; publishing {len(to_publish)}"
+        + (" (full sync)" if full_sync else f" (tolerance {store.tolerance})")
+    )
+    # Called even when nothing changed, so chunks spooled by earlier runs are replayed.
+    summary = uploader.upload(to_publish)
+    # Accepted chunks are published; spooled ones will be replayed by the next run,
+    # so they count as published too. Matches in dropped chunks (payload rejected)
+    # are not recorded, so they are sent again next time.
+    published = [match for chunk, outcome in summary["chunks"] if outcome != DROPPED for match in chunk]
+    store.record(published, seen=matches)
+    return summary
+
+
+def add_delta_arguments(parser):
+    """Delta-publishing options shared by both scrapers' command lines."""
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Publish a known match only when an odd moved by more than this (decimal odds).")
+    parser.add_argument("--full-sync", action="store_true", help="Publish every scraped match, changed or not.")
+    parser.add_argument("--snapshot-db", default=DEFAULT_SNAPSHOT_DB, help="SQLite file with the last published odds.")
+
+
+def snapshot_store_from_args(args):
+    return SnapshotStore(args.snapshot_db, tolerance=args.tolerance)
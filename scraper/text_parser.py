@@ -0,0 +1,250 @@
+"""
+Page-text parser for scraper/main.py.
+
+The body text of an OddsPortal league page is split into lines, and every line
+is classified once (time, odd, separator, dash, empty, date header or text). A small state
+machine then walks the time anchors: home team lines, an optional separator,
+away team lines, and three odds. A precomputed "next odd" table keeps every
+anchor O(1), so a page is parsed in one pass instead of rescanning ahead.
+Date header lines ("Today, 18 Oct") passed on the way give each match its
+kickoff (see kickoff.py).
+
+Usage:
+    python scraper/text_parser.py --check            # compare against scraper/corpus/*.expected.json
+    python scraper/text_parser.py --bench [--lines N]
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+from functools import lru_cache
+
+from kickoff import DATE_HEADER_REGEX, header_date, kickoff, today_iso
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+# Regex to identify time format like XX:XX
+TIME_REGEX = re.compile(r'^\d{2}:\d{2}$')
+# Regex for both decimal (e.g., 1.23) and American odds (e.g., -110, +250)
+ODD_REGEX = re.compile(r'^(\d+\.\d{2}|[+-]\d+)$')
+DIGITS_REGEX = re.compile(r'\d+')
+# First characters of a date header line ("Today, ...", "Tomorrow, ...", "Yesterday, ...", "25 Oct 2026").
+DATE_HEADER_START = frozenset("0123456789TY")
+# The corpus pages' date headers carry no year; they were recorded in this season.
+CORPUS_TODAY = "2025-10-18"
+
+# Line classes
+TEXT, TIME, ODD, SEPARATOR, DASH, EMPTY, DATE = range(7)
+
+
+@lru_cache(maxsize=4096)
+def convert_to_decimal(odd_str: str) -> float:
+    """Converts American or Decimal odds string to a decimal float."""
+    try:
+        # If it's already a decimal
+        if '.' in odd_str:
+            return float(odd_str)
+
+        # American odds
+        odd_val = int(odd_str)
+        if odd_val > 0: # Positive odds
+            return round((odd_val / 100) + 1, 2)
+        else: # Negative odds
+            return round((100 / abs(odd_val)) + 1, 2)
+    except (ValueError, TypeError):
+        # Return a value that indicates an error, e.g., 0.0 or raise an exception
+        return 0.0
+
+
+@lru_cache(maxsize=4096)
+def clean_team_name(name):
+    """Removes digits and dashes left over from scores and separators."""
+    return DIGITS_REGEX.sub('', name).replace('-', '').strip()
+
+
+@lru_cache(maxsize=16384)
+def classify(line):
+    """Token class of one line of page text."""
+    if not line:
+        return EMPTY
+    if line == '-':
+        return DASH
+    if ODD_REGEX.match(line):
+        # Short American odds such as "+150" also satisfy the separator rule below;
+        # the separator scan checks for them explicitly.
+        return ODD
+    if TIME_REGEX.match(line):
+        return TIME
+    if len(line) < 5 and not line[0].isalpha() and not line.replace('.', '', 1).isdigit():
+        return SEPARATOR
+    if line[0] in DATE_HEADER_START and DATE_HEADER_REGEX.match(line.strip()):
+        return DATE
+    return TEXT
+
+
+def _is_separator(line, kind):
+    # A separator is any short, non-numeric line that does not start with a letter.
+    if kind == SEPARATOR:
+        return True
+    return kind == ODD and len(line) < 5 and not line.replace('.', '', 1).isdigit()
+
+
+def _has_text(lines, start, stop):
+    # Whether " ".join(lines[start:stop]) is non-empty, without building it.
+    return stop - start > 1 or (stop - start == 1 and bool(lines[start]))
+
+
+def parse_lines(lines, today=None):
+    """
+    Returns matches in the upload shape (homeTeam/awayTeam/homeOdd/drawOdd/awayOdd)
+    plus kickoff ("YYYY-MM-DD HH:MM", None before the first date header).
+    Headers without a year are dated relative to `today` (ISO date, default today).
+    """
+    today = today or today_iso()
+    n = len(lines)
+    kinds = [classify(line) for line in lines]
+
+    # next_odd[k]: first index >= k holding an odd (n if none).
+    next_odd = [n] * (n + 1)
+    for k in range(n - 1, -1, -1):
+        next_odd[k] = k if kinds[k] == ODD else next_odd[k + 1]
+
+    # next_header: the first date header not yet applied; list.index scans in C.
+    def find_header(start):
+        try:
+            return kinds.index(DATE, start)
+        except ValueError:
+            return n
+    next_header = find_header(0)
+    date = None
+
+    matches = []
+    i = 0
+    while i < n - 4:
+        if kinds[i] != TIME:
+            i += 1
+            continue
+
+        # State: HOME -> look for a separator in the next four lines.
+        # An empty line before one means this is not a match block.
+        separator_index = -1
+        blank = False
+        for j in range(i + 1, min(i + 5, n)):
+            if kinds[j] == EMPTY:
+                blank = True
+                break
+            if _is_separator(lines[j], kinds[j]):
+                separator_index = j
+                break
+        if blank:
+            i += 1
+            continue
+
+        # State: AWAY -> team lines up to the first odd, kept as line ranges.
+        if separator_index == -1:
+            away_team_index = i + 3 if kinds[i + 2] == DASH else i + 2
+            home_team_end, away_team_end = i + 2, away_team_index + 1
+            odds_start_index = away_team_end
+        else:
+            home_team_end, away_team_index = separator_index, separator_index + 1
+            odds_start_index = away_team_end = next_odd[min(away_team_index, n)]
+
+        # State: ODDS -> three consecutive odds and two non-empty teams close the match.
+        # Team lines are joined only for accepted rows, whose lines are consumed,
+        # so a page costs O(lines) however many anchors fail.
+        if (odds_start_index + 2 < n and kinds[odds_start_index] == ODD
+                and kinds[odds_start_index + 1] == ODD and kinds[odds_start_index + 2] == ODD
+                and _has_text(lines, i + 1, home_team_end) and _has_text(lines, away_team_index, away_team_end)):
+            home_team = " ".join(lines[i + 1:home_team_end])
+            away_team = " ".join(lines[away_team_index:away_team_end])
+            while next_header < i:
+                date = header_date(lines[next_header], today) or date
+                next_header = find_header(next_header + 1)
+            matches.append({
+                "homeTeam": clean_team_name(home_team),
+                "awayTeam": clean_team_name(away_team),
+                "homeOdd": convert_to_decimal(lines[odds_start_index]),
+                "drawOdd": convert_to_decimal(lines[odds_start_index + 1]),
+                "awayOdd": convert_to_decimal(lines[odds_start_index + 2]),
+                "kickoff": kickoff(date, lines[i]),
+            })
+            i = odds_start_index + 3
+            continue
+
+        i += 1
+    return matches
+
+
+def parse_page_text(page_text, today=None):
+    return parse_lines(page_text.split('\n'), today)
+
+
+def load_corpus(corpus_dir=CORPUS_DIR):
+    """(name, page_text, expected matches) for every corpus page with a recorded result."""
+    corpus = []
+    for text_path in sorted(glob.glob(os.path.join(corpus_dir, '*.txt'))):
+        expected_path = text_path[:-len('.txt')] + '.expected.json'
+        with open(text_path, encoding='utf-8') as f:
+            page_text = f.read()
+        with open(expected_path, encoding='utf-8') as f:
+            expected = json.load(f)
+        corpus.append((os.path.basename(text_path), page_text, expected))
+    return corpus
+
+
+def check_corpus(corpus_dir=CORPUS_DIR):
+    """Compares parse_page_text with the recorded results; returns the number of mismatching pages."""
+    failures = 0
+    for name, page_text, expected in load_corpus(corpus_dir):
+        actual = parse_page_text(page_text, CORPUS_TODAY)
+        if actual != expected:
+            failures += 1
+            print(f"MISMATCH {name}: expected {len(expected)} matches, got {len(actual)}")
+            for want, got in zip(expected, actual):
+                if want != got:
+                    print(f"  first difference: expected {want}, got {got}")
+                    break
+        else:
+            print(f"ok       {name}: {len(actual)} matches")
+    return failures
+
+
+def benchmark(min_lines=1_000_000, corpus_dir=CORPUS_DIR):
+    """Parses the corpus pages repeated up to min_lines lines; returns lines/sec."""
+    pages = [page_text for _, page_text, _ in load_corpus(corpus_dir)]
+    page_text = "\n".join(pages)
+    repeat = max(1, -(-min_lines // (page_text.count('\n') + 1)))
+    big_page = "\n".join([page_text] * repeat)
+    lines = big_page.split('\n')
+
+    for cache in (classify, convert_to_decimal, clean_team_name):
+        cache.cache_clear()
+    started = time.perf_counter()
+    matches = parse_lines(lines)
+    elapsed = time.perf_counter() - started
+    rate = len(lines) / elapsed
+    print(f"Parsed {len(lines):,} lines ({len(matches):,} matches) in {elapsed:.3f}s: {rate:,.0f} lines/sec")
+    return rate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check or benchmark the page-text parser on the recorded corpus.")
+    parser.add_argument("--check", action="store_true", help="Compare against the recorded corpus results.")
+    parser.add_argument("--bench", action="store_true", help="Report parse throughput in lines/sec.")
+    parser.add_argument("--lines", type=int, default=1_000_000, help="Lines to parse for --bench.")
+    parser.add_argument("--corpus", default=CORPUS_DIR)
+    args = parser.parse_args(argv)
+
+    status = 0
+    if args.check or not args.bench:
+        status = 1 if check_corpus(args.corpus) else 0
+    if args.bench:
+        benchmark(args.lines, args.corpus)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+Upload pipeline for scraped odds.
+
+Matches are split into chunks, gzip-compressed and POSTed to /api/update-odds
+over one pooled requests.Session, with several chunks in flight at once.
+Failed attempts (connection errors, timeouts, 429 and 5xx) are retried with
+exponential backoff. Every chunk is written to an on-disk spool before it is
+sent and removed once the server accepts it, so chunks that never made it
+(including after a crash) are replayed at the start of the next run. Only a
+chunk the server rejects as a bad payload (400/413/422) is dropped.
+"""
+import glob
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_SPOOL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spool')
+DEFAULT_CHUNK_SIZE = 100
+DEFAULT_IN_FLIGHT = 4
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+DEFAULT_TIMEOUT = 30
+
+RETRY_STATUSES = frozenset((408, 425, 429, 500, 502, 503, 504))
+# Statuses that mean the payload itself is unacceptable; only these drop a spooled chunk.
+# Anything else (401/403/404 from a wrong --api-url or an undeployed route, ...) keeps it spooled.
+REJECT_STATUSES = frozenset((400, 413, 422))
+
+ACCEPTED, SPOOLED, DROPPED = "accepted", "spooled", "dropped"
+
+
+class UploadStats:
+    """Counters for one upload run. Latencies are seconds per chunk, including retries."""
+
+    def __init__(self):
+        self.chunks_sent = 0
+        self.chunks_failed = 0
+        self.chunks_rejected = 0
+        self.chunks_replayed = 0
+        self.matches_sent = 0
+        self.bytes_raw = 0
+        self.bytes_sent = 0
+        self.retries = 0
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def record(self, **deltas):
+        with self._lock:
+            for name, value in deltas.items():
+                if name == "latency":
+                    self.latencies.append(value)
+                else:
+                    setattr(self, name, getattr(self, name) + value)
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+
+        def pick(q):
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 3) if latencies else 0.0
+
+        return {
+            "chunks_sent": self.chunks_sent,
+            "chunks_failed": self.chunks_failed,
+            "chunks_rejected": self.chunks_rejected,
+            "chunks_replayed": self.chunks_replayed,
+            "matches_sent": self.matches_sent,
+            "bytes_raw": self.bytes_raw,
+            "bytes_sent": self.bytes_sent,
+            "retries": self.retries,
+            "latency_s": {"p50": pick(0.50), "p95": pick(0.95), "max": round(latencies[-1], 3) if latencies else 0.0},
+        }
+
+
+class OddsUploader:
+    def __init__(self, api_url, chunk_size=DEFAULT_CHUNK_SIZE, max_in_flight=DEFAULT_IN_FLIGHT,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF, timeout=DEFAULT_TIMEOUT,
+                 spool_dir=DEFAULT_SPOOL_DIR, compress=True, session=None):
+        if chunk_size <= 0 or max_in_flight <= 0:
+            raise ValueError("chunk_size and max_in_flight must be positive")
+        self.api_url = api_url
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.spool_dir = spool_dir
+        self.compress = compress
+        self.session = session or self._make_session()
+        self.stats = UploadStats()
+        self._sequence = 0
+        self._sequence_lock = threading.Lock()
+
+    def _make_session(self):
+        session = requests.Session()
+        # Retries are handled here, with backoff and spooling, not by urllib3.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # --- Spool ---
+
+    def _spool_path(self):
+        with self._sequence_lock:
+            self._sequence += 1
+            sequence = self._sequence
+        return os.path.join(self.spool_dir, f"{time.time_ns()}-{os.getpid()}-{sequence:06d}.json.gz")
+
+    def _spool(self, body):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = self._spool_path()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        return path
+
+    def pending(self):
+        """Spooled chunk files left over from earlier runs, oldest first."""
+        return sorted(glob.glob(os.path.join(self.spool_dir, "*.json.gz")))
+
+    # --- Sending ---
+
+    def _encode(self, matches):
+        raw = json.dumps({"matches": matches}, separators=(",", ":")).encode("utf-8")
+        # The spool always stores gzip; compresslevel 6 is a good size/CPU balance for JSON.
+        return len(raw), gzip.compress(raw, compresslevel=6)
+
+    def _post(self, body):
+        headers = {"Content-Type": "application/json"}
+        if self.compress:
+            headers["Content-Encoding"] = "gzip"
+        else:
+            body = gzip.decompress(body)
+        return self.session.post(self.api_url, data=body, headers=headers, timeout=self.timeout), len(body)
+
+    def _delay(self, attempt, response):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(MAX_BACKOFF, float(retry_after))
+        # Exponential backoff with full jitter.
+        return random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** attempt))
+
+    def _send(self, path, label, match_count=None):
+        """
+        Sends one spooled chunk with retries. Returns ACCEPTED (removed from the
+        spool), DROPPED (payload rejected, removed) or SPOOLED (kept for the next run).
+        """
+        with open(path, 'rb') as f:
+            body = f.read()
+        started = time.perf_counter()
+        response = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats.record(retries=1)
+                time.sleep(self._delay(attempt - 1, response))
+            response = None
+            try:
+                response, sent = self._post(body)
+                self.stats.record(bytes_sent=sent)
+            except requests.exceptions.RequestException as e:
+                error = str(e)
+                continue
+            if response.ok:
+                elapsed = time.perf_counter() - started
+                os.remove(path)
+                if match_count is None:
+                    match_count = len(json.loads(gzip.decompress(body))["matches"])
+                self.stats.record(chunks_sent=1, matches_sent=match_count, latency=elapsed)
+                print(f"[UPLOAD] {label}: {response.status_code} in {elapsed:.2f}s ({attempt} retries)")
+                return ACCEPTED
+            error = f"{response.status_code} {response.text[:200]}"
+            if response.status_code in REJECT_STATUSES:
+                # The server will not accept this payload however often it is sent.
+                os.remove(path)
+                self.stats.record(chunks_rejected=1, latency=time.perf_counter() - started)
+                print(f"[UPLOAD] {label}: rejected ({error})")
+                return DROPPED
+            if response.status_code not in RETRY_STATUSES:
+                # Retrying now will not help (wrong URL, auth, route not deployed), but the payload is fine.
+                self.stats.record(chunks_failed=1, latency=time.perf_counter() - started)
+                print(f"[UPLOAD] {label}: {error}; kept in spool for the next run")
+                return SPOOLED
+
+        self.stats.record(chunks_failed=1, latency=time.perf_counter() - started)
+        print(f"[UPLOAD] {label}: gave up after {self.max_retries} retries ({error}); kept in spool for the next run")
+        return SPOOLED
+
+    def replay_spool(self):
+        """Re-sends chunks left in the spool by earlier runs. Returns how many were accepted."""
+        paths = self.pending()
+        if not paths:
+            return 0
+        print(f"[UPLOAD] Replaying {len(paths)} spooled chunks from an earlier run...")
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            results = list(executor.map(lambda item: self._send(item[1], f"spooled chunk {item[0]}/{len(paths)}"),
+                                        enumerate(paths, 1)))
+        accepted = results.count(ACCEPTED)
+        self.stats.record(chunks_replayed=accepted)
+        return accepted
+
+    def upload(self, matches):
+        """
+        Replays the spool, then uploads `matches` in chunks with up to
+        max_in_flight concurrent requests. Returns the stats summary, whose
+        "chunks" lists (matches in the chunk, outcome) for this call's chunks
+        in order, outcome being ACCEPTED, SPOOLED or DROPPED.
+        """
+        self.replay_spool()
+        chunks = [matches[i:i + self.chunk_size] for i in range(0, len(matches), self.chunk_size)]
+        jobs = []
+        for chunk in chunks:
+            raw_size, body = self._encode(chunk)
+            self.stats.record(bytes_raw=raw_size)
+            jobs.append((self._spool(body), len(chunk)))
+
+        outcomes = []
+        if jobs:
+            print(f"[UPLOAD] Sending {len(matches)} matches in {len(jobs)} chunks to {self.api_url}...")
+            with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+                outcomes = list(executor.map(
+                    lambda item: self._send(item[1][0], f"chunk {item[0]}/{len(jobs)}", item[1][1]),
+                    enumerate(jobs, 1),
+                ))
+
+        summary = self.stats.summary()
+        print(
+            f"[UPLOAD] {summary['chunks_sent']} chunks sent, {summary['chunks_failed']} spooled, "
+            f"{summary['chunks_rejected']} rejected; {summary['bytes_sent']:,} bytes sent "
+            f"({summary['bytes_raw']:,} raw), {summary['retries']} retries, "
+            f"chunk latency p50 {summary['latency_s']['p50']}s / p95 {summary['latency_s']['p95']}s"
+        )
+        summary["chunks"] = list(zip(chunks, outcomes))
+        return summary
+
+
+def add_upload_arguments(parser, api_url):
+    """Upload options shared by both scrapers' command lines."""
+    parser.add_argument("--api-url", default=api_url, help="Odds upload endpoint (e.g. a local stand-in server for testing).")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Matches per upload request.")
+    parser.add_argument("--in-flight", type=int, default=DEFAULT_IN_FLIGHT, help="Upload requests in flight at once.")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES, help="Retries per chunk before it is left in the spool.")
+    parser.add_argument("--spool-dir", default=DEFAULT_SPOOL_DIR, help="Directory for chunks that have not been accepted yet.")
+    parser.add_argument("--no-gzip", action="store_true", help="Send uncompressed request bodies.")
+
+
+def uploader_from_args(args):
+    return OddsUploader(
+        args.api_url,
+        chunk_size=args.chunk_size,
+        max_in_flight=args.in_flight,
+        max_retries=args.max_retries,
+        spool_dir=args.spool_dir,
+        compress=not args.no_gzip,
+    )
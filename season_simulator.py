@@ -0,0 +1,351 @@
+"""
+Monte Carlo projection of a league's final table.
+
+The remaining fixtures of a league in bahis.db are sampled many times with
+the Poisson model from analysis.py (the detailed_analysis attack/defense
+formula, or fitted Dixon-Coles ratings with --ratings). All fixtures x all
+simulations of a chunk are drawn as NumPy arrays. Chunks have their own seeds
+spawned from one root seed, so results are reproducible and do not depend on
+the number of worker processes.
+
+Usage: python season_simulator.py --league 2021 [--simulations 100000] [--seed 42] [--workers 4]
+"""
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from batch_scoring import goal_probabilities, grid_size
+from parallel import parallel_map
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bahis.db')
+DEFAULT_SIMULATIONS = 100_000
+DEFAULT_CHUNK_SIZE = 10_000
+DEFAULT_SEED = 42
+TOP_PLACES = 4
+RELEGATION_PLACES = 3
+
+# Same fallbacks the ai-predict route uses when league averages cannot be computed.
+DEFAULT_LEAGUE_AVG_HOME_GOALS = 1.45
+DEFAULT_LEAGUE_AVG_AWAY_GOALS = 1.15
+# Goal tables stop where less than this tail mass is left (float32 uniforms cannot resolve finer).
+SAMPLING_EPSILON = 1e-7
+
+
+def default_season_start(conn, league_id):
+    """1 July before the league's first remaining fixture (European season convention)."""
+    first = conn.execute(
+        """
+        SELECT MIN(m.match_date) FROM matches m JOIN teams t ON t.id = m.home_team_id
+        WHERE t.league_id = ? AND m.status = 'NS'
+        """,
+        (league_id,),
+    ).fetchone()[0]
+    if first is None:
+        return 0
+    first = datetime.datetime.fromtimestamp(first, datetime.timezone.utc)
+    year = first.year if first.month >= 7 else first.year - 1
+    return int(datetime.datetime(year, 7, 1, tzinfo=datetime.timezone.utc).timestamp())
+
+
+def load_league(conn, league_id, season_start=None):
+    """
+    Teams, finished results and remaining fixtures of a league (by the home
+    team's league), counting only matches from `season_start` (unix seconds).
+    """
+    teams = conn.execute("SELECT id, name FROM teams WHERE league_id = ? ORDER BY id", (league_id,)).fetchall()
+    if not teams:
+        raise ValueError(f"No teams found for league {league_id}")
+    if season_start is None:
+        season_start = default_season_start(conn, league_id)
+    rows = conn.execute(
+        """
+        SELECT m.home_team_id, m.away_team_id, m.home_score, m.away_score, m.status
+        FROM matches m JOIN teams t ON t.id = m.home_team_id
+        WHERE t.league_id = ? AND m.status IN ('FT', 'NS') AND m.match_date >= ?
+        ORDER BY m.match_date, m.id
+        """,
+        (league_id, season_start),
+    ).fetchall()
+    finished = [r[:4] for r in rows if r[4] == 'FT' and r[2] is not None and r[3] is not None]
+    remaining = [r[:2] for r in rows if r[4] == 'NS']
+    return teams, finished, remaining
+
+
+def current_table(team_ids, finished):
+    """Points, goal difference, goals for and games played per team (arrays aligned with team_ids)."""
+    index = {team_id: i for i, team_id in enumerate(team_ids)}
+    n = len(team_ids)
+    points, goal_diff, goals_for, goals_against, played = (np.zeros(n, dtype=np.int64) for _ in range(5))
+    for home_id, away_id, home_goals, away_goals in finished:
+        if home_id not in index or away_id not in index:
+            continue
+        h, a = index[home_id], index[away_id]
+        played[h] += 1
+        played[a] += 1
+        goals_for[h] += home_goals
+        goals_for[a] += away_goals
+        goals_against[h] += away_goals
+        goals_against[a] += home_goals
+        if home_goals > away_goals:
+            points[h] += 3
+        elif home_goals < away_goals:
+            points[a] += 3
+        else:
+            points[h] += 1
+            points[a] += 1
+    goal_diff = goals_for - goals_against
+    return {"points": points, "goal_diff": goal_diff, "goals_for": goals_for, "goals_against": goals_against, "played": played}
+
+
+def poisson_expected_goals(table, fixtures, finished):
+    """xG for each remaining fixture with the detailed_analysis attack/defense formula."""
+    if finished:
+        avg_home = sum(r[2] for r in finished) / len(finished) or DEFAULT_LEAGUE_AVG_HOME_GOALS
+        avg_away = sum(r[3] for r in finished) / len(finished) or DEFAULT_LEAGUE_AVG_AWAY_GOALS
+    else:
+        avg_home, avg_away = DEFAULT_LEAGUE_AVG_HOME_GOALS, DEFAULT_LEAGUE_AVG_AWAY_GOALS
+
+    played = np.maximum(table["played"], 1)
+    has_played = table["played"] > 0
+    scored = table["goals_for"] / played
+    conceded = table["goals_against"] / played
+
+    def strength(goals, team, avg):
+        # Teams without results are treated as league average (strength 1).
+        return np.where(has_played[team], goals[team] / avg, 1.0)
+
+    home, away = fixtures[:, 0], fixtures[:, 1]
+    home_attack = strength(scored, home, avg_home)
+    away_attack = strength(scored, away, avg_away)
+    home_defense = strength(conceded, home, avg_away)
+    away_defense = strength(conceded, away, avg_home)
+    return home_attack * away_defense * avg_home, away_attack * home_defense * avg_away
+
+
+def ratings_expected_goals(model, team_ids, fixtures):
+    """xG for each remaining fixture from fitted Dixon-Coles ratings."""
+    rows = np.array([model.index.get(team_id, -1) for team_id in team_ids])
+    if (rows[np.unique(fixtures)] < 0).any():
+        raise ValueError("Some teams have no Dixon-Coles rating; refit with dixon_coles.py")
+    home, away = rows[fixtures[:, 0]], rows[fixtures[:, 1]]
+    return (
+        np.exp(model.home_advantage + model.attack[home] + model.defense[away]),
+        np.exp(model.attack[away] + model.defense[home]),
+    )
+
+
+def goal_cdf_table(xg):
+    """(fixtures, goals) float32 CDF table for inverse-CDF sampling."""
+    pmf = goal_probabilities(xg, grid_size(xg, SAMPLING_EPSILON))
+    return np.cumsum(pmf, axis=1)[:, :-1].astype(np.float32)
+
+
+def sample_goals(rng, cdf, n):
+    """
+    Draws (n, fixtures) Poisson goal counts by comparing one uniform per cell
+    against the CDF table, which is cheaper than rng.poisson for small means.
+    """
+    uniforms = rng.random((n, cdf.shape[0]), dtype=np.float32)
+    goals = np.zeros(uniforms.shape, dtype=np.int16)
+    for k in range(cdf.shape[1]):
+        goals += uniforms >= cdf[:, k]
+    return goals
+
+
+_context = None
+
+
+def _init_worker(context):
+    global _context
+    _context = context
+
+
+def _simulate_chunk(payload):
+    """
+    Samples `n` seasons with the chunk's own seed and returns aggregates:
+    position counts (teams x places), a points histogram and points sums.
+    """
+    seed, n = payload
+    ctx = _context
+    rng = np.random.default_rng(seed)
+    n_teams = len(ctx["base_points"])
+
+    home_goals = sample_goals(rng, ctx["home_cdf"], n)
+    away_goals = sample_goals(rng, ctx["away_cdf"], n)
+    draws = home_goals == away_goals
+    home_points = (3 * (home_goals > away_goals) + draws).astype(np.float32)
+    away_points = (3 * (home_goals < away_goals) + draws).astype(np.float32)
+    margin = (home_goals - away_goals).astype(np.float32)
+
+    # Per-team totals via fixture -> team incidence matrices (one matmul each).
+    home_inc, away_inc = ctx["home_incidence"], ctx["away_incidence"]
+    points = ctx["base_points"] + home_points @ home_inc + away_points @ away_inc
+    goal_diff = ctx["base_goal_diff"] + margin @ (home_inc - away_inc)
+    goals_for = ctx["base_goals_for"] + home_goals.astype(np.float32) @ home_inc + away_goals.astype(np.float32) @ away_inc
+
+    # Rank by points, goal difference, goals for, then a random draw for exact ties.
+    tiebreak = rng.random((n, n_teams))
+    order = np.lexsort((tiebreak, -goals_for, -goal_diff, -points), axis=-1)
+    positions = np.empty_like(order)
+    np.put_along_axis(positions, order, np.arange(n_teams)[None, :], axis=1)
+
+    team_axis = np.broadcast_to(np.arange(n_teams), positions.shape)
+    position_counts = np.bincount((team_axis * n_teams + positions).ravel(), minlength=n_teams * n_teams)
+    max_points = ctx["max_points"]
+    points_int = points.astype(np.int64)
+    points_hist = np.bincount((team_axis * (max_points + 1) + points_int).ravel(), minlength=n_teams * (max_points + 1))
+    return (
+        position_counts.reshape(n_teams, n_teams),
+        points_hist.reshape(n_teams, max_points + 1),
+        points.sum(axis=0, dtype=np.float64),
+        goal_diff.sum(axis=0, dtype=np.float64),
+    )
+
+
+def _percentile(hist, q):
+    """Smallest points value whose cumulative share reaches q, per team."""
+    cumulative = np.cumsum(hist, axis=1) / hist.sum(axis=1, keepdims=True)
+    return (cumulative < q).sum(axis=1)
+
+
+def simulate_season(team_ids, table, fixtures, home_xg, away_xg, simulations=DEFAULT_SIMULATIONS,
+                    seed=DEFAULT_SEED, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Runs the Monte Carlo and returns per-team aggregates: position
+    distribution, mean points/goal difference and points percentiles.
+    """
+    n_teams = len(team_ids)
+    n_fixtures = len(fixtures)
+    home_incidence = np.zeros((n_fixtures, n_teams), dtype=np.float32)
+    away_incidence = np.zeros((n_fixtures, n_teams), dtype=np.float32)
+    home_incidence[np.arange(n_fixtures), fixtures[:, 0]] = 1
+    away_incidence[np.arange(n_fixtures), fixtures[:, 1]] = 1
+    remaining_per_team = home_incidence.sum(axis=0) + away_incidence.sum(axis=0)
+
+    context = {
+        "home_cdf": goal_cdf_table(np.asarray(home_xg, dtype=float)),
+        "away_cdf": goal_cdf_table(np.asarray(away_xg, dtype=float)),
+        "home_incidence": home_incidence,
+        "away_incidence": away_incidence,
+        "base_points": table["points"].astype(np.float32),
+        "base_goal_diff": table["goal_diff"].astype(np.float32),
+        "base_goals_for": table["goals_for"].astype(np.float32),
+        "max_points": int((table["points"] + 3 * remaining_per_team).max()),
+    }
+
+    chunk_sizes = [min(chunk_size, simulations - start) for start in range(0, simulations, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    position_counts = np.zeros((n_teams, n_teams), dtype=np.int64)
+    points_hist = np.zeros((n_teams, context["max_points"] + 1), dtype=np.int64)
+    points_sum = np.zeros(n_teams)
+    goal_diff_sum = np.zeros(n_teams)
+    for counts, hist, p_sum, gd_sum in parallel_map(
+        _simulate_chunk, zip(seeds, chunk_sizes), workers=workers, initializer=_init_worker, initargs=(context,)
+    ):
+        position_counts += counts
+        points_hist += hist
+        points_sum += p_sum
+        goal_diff_sum += gd_sum
+
+    return {
+        "position_probabilities": position_counts / simulations,
+        "expected_points": points_sum / simulations,
+        "expected_goal_diff": goal_diff_sum / simulations,
+        "points_p5": _percentile(points_hist, 0.05),
+        "points_p50": _percentile(points_hist, 0.50),
+        "points_p95": _percentile(points_hist, 0.95),
+    }
+
+
+def project_league(conn, league_id, simulations=DEFAULT_SIMULATIONS, seed=DEFAULT_SEED, workers=1,
+                   chunk_size=DEFAULT_CHUNK_SIZE, use_ratings=False, top_places=TOP_PLACES,
+                   relegation_places=RELEGATION_PLACES, season_start=None):
+    """Loads a league, simulates its remaining fixtures and returns the projected table as a dict."""
+    teams, finished, remaining = load_league(conn, league_id, season_start)
+    team_ids = [t[0] for t in teams]
+    index = {team_id: i for i, team_id in enumerate(team_ids)}
+    remaining = [(h, a) for h, a in remaining if h in index and a in index]
+    fixtures = np.array([(index[h], index[a]) for h, a in remaining], dtype=np.int64).reshape(-1, 2)
+    table = current_table(team_ids, finished)
+
+    if use_ratings:
+        from dixon_coles import DixonColesModel
+        model = DixonColesModel.load(conn)
+        if model is None:
+            raise ValueError("No Dixon-Coles ratings stored; run dixon_coles.py first")
+        home_xg, away_xg = ratings_expected_goals(model, team_ids, fixtures)
+    else:
+        home_xg, away_xg = poisson_expected_goals(table, fixtures, finished)
+
+    result = simulate_season(team_ids, table, fixtures, home_xg, away_xg, simulations, seed, workers, chunk_size)
+    positions = result["position_probabilities"]
+    n_teams = len(team_ids)
+    projected = []
+    for i, (team_id, name) in enumerate(teams):
+        projected.append({
+            "team_id": team_id,
+            "name": name,
+            "points": int(table["points"][i]),
+            "played": int(table["played"][i]),
+            "expected_points": round(float(result["expected_points"][i]), 2),
+            "expected_goal_diff": round(float(result["expected_goal_diff"][i]), 2),
+            "expected_position": round(float((positions[i] * np.arange(1, n_teams + 1)).sum()), 2),
+            "points_range": [int(result["points_p5"][i]), int(result["points_p50"][i]), int(result["points_p95"][i])],
+            "title": round(float(positions[i, 0]), 4),
+            f"top_{top_places}": round(float(positions[i, :top_places].sum()), 4),
+            "relegation": round(float(positions[i, n_teams - relegation_places:].sum()), 4) if relegation_places else 0.0,
+            "position_probabilities": [round(float(p), 4) for p in positions[i]],
+        })
+    projected.sort(key=lambda row: (-row["expected_points"], row["expected_position"]))
+    return {
+        "league_id": league_id,
+        "simulations": simulations,
+        "seed": seed,
+        "remaining_fixtures": len(fixtures),
+        "model": "Dixon-Coles (Ratings)" if use_ratings else "Poisson",
+        "table": projected,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo projection of a league's final table.")
+    parser.add_argument("--league", type=int, required=True, help="League id in bahis.db.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--simulations", type=int, default=DEFAULT_SIMULATIONS)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (0 = one per CPU core).")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Simulations per chunk.")
+    parser.add_argument("--ratings", action="store_true", help="Use fitted Dixon-Coles ratings instead of season totals.")
+    parser.add_argument("--top", type=int, default=TOP_PLACES)
+    parser.add_argument("--relegation", type=int, default=RELEGATION_PLACES)
+    parser.add_argument("--season-start", type=datetime.date.fromisoformat,
+                        help="First day of the season (YYYY-MM-DD). Defaults to 1 July before the next fixture.")
+    args = parser.parse_args(argv)
+
+    season_start = None
+    if args.season_start:
+        season_start = int(datetime.datetime.combine(args.season_start, datetime.time(), datetime.timezone.utc).timestamp())
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    try:
+        started = time.perf_counter()
+        report = project_league(
+            conn, args.league, args.simulations, args.seed, args.workers or None, args.chunk_size,
+            args.ratings, args.top, args.relegation, season_start,
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        conn.close()
+    print(f"[SIMULATOR] {args.simulations} seasons, {report['remaining_fixtures']} fixtures in {elapsed:.2f}s", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,6 @@
 
 import { NextResponse } from "next/server";
-import { spawn } from "child_process";
+import { getIndexedForm, runAnalysis } from "@/lib/analysisWorkerPool";
 
 // Lig Kodları Haritası
 const LEAGUE_MAP: Record<string, string> = {
@@ -81,21 +81,24 @@ export async function POST(request: Request) {
     console.log(`🧮 ANALİZ (HIBRIT): ${homeTeam} vs ${awayTeam}`);
 
     const leagueCode = LEAGUE_MAP[league] || "PL";
-    let pythonInputData: any = { is_simulation: true, home_name: homeTeam, away_name: awayTeam };
+    // home_id/away_id: Python tarafı, varsa bahis.db'deki Dixon-Coles reytinglerini kullanır.
+    let pythonInputData: any = { is_simulation: true, home_name: homeTeam, away_name: awayTeam, home_id: homeId, away_id: awayId };
 
     // HİBRİT MODEL İÇİN VERİ TOPLAMA
     try {
       const standingsUrl = `https://api.football-data.org/v4/competitions/${leagueCode}/standings`;
-      const homeFormUrl = `https://api.football-data.org/v4/teams/${homeId}/matches?status=FINISHED&limit=5`;
-      const awayFormUrl = `https://api.football-data.org/v4/teams/${awayId}/matches?status=FINISHED&limit=5`;
+      // Form önce bahis.db'deki form indeksinden okunur; indekste olmayan (ya da indeks hiç yoksa) takımın formu API'den çekilir.
+      const indexedForm = await getIndexedForm(homeId, awayId).catch(() => null);
+      const homeFormUrl = indexedForm?.home?.overall?.played ? null : `https://api.football-data.org/v4/teams/${homeId}/matches?status=FINISHED&limit=5`;
+      const awayFormUrl = indexedForm?.away?.overall?.played ? null : `https://api.football-data.org/v4/teams/${awayId}/matches?status=FINISHED&limit=5`;
       const oddsUrl = `https://api.football-data.org/v4/matches?competitions=${leagueCode}&status=SCHEDULED`;
       const homeSquadUrl = `https://api.football-data.org/v4/teams/${homeId}`;
       const awaySquadUrl = `https://api.football-data.org/v4/teams/${awayId}`;
 
       const [standingsRes, homeFormRes, awayFormRes, oddsRes, homeSquadRes, awaySquadRes] = await Promise.all([
         fetch(standingsUrl, { headers: { "X-Auth-Token": FOOTBALL_API_KEY }, next: { revalidate: 3600 } }),
-        fetch(homeFormUrl, { headers: { "X-Auth-Token": FOOTBALL_API_KEY }, next: { revalidate: 3600 } }),
-        fetch(awayFormUrl, { headers: { "X-Auth-Token": FOOTBALL_API_KEY }, next: { revalidate: 3600 } }),
+        homeFormUrl ? fetch(homeFormUrl, { headers: { "X-Auth-Token": FOOTBALL_API_KEY }, next: { revalidate: 3600 } }) : null,
+        awayFormUrl ? fetch(awayFormUrl, { headers: { "X-Auth-Token": FOOTBALL_API_KEY }, next: { revalidate: 3600 } }) : null,
         fetch(oddsUrl, { headers: { "X-Auth-Token": FOOTBALL_API_KEY }, next: { revalidate: 3600 } }),
         fetch(homeSquadUrl, { headers: { "X-Auth-Token": FOOTBALL_API_KEY }, next: { revalidate: 3600 } }),
         fetch(awaySquadUrl, { headers: { "X-Auth-Token": FOOTBALL_API_KEY }, next: { revalidate: 3600 } })
@@ -134,7 +137,7 @@ export async function POST(request: Request) {
         }
       }
       
-      if (homeFormRes.ok) {
+      if (homeFormRes?.ok) {
         const homeData = await homeFormRes.json();
         home_form_raw = homeData.matches.map((m: any) => {
             if (m.score.winner === 'HOME_TEAM' && m.homeTeam.id === homeId) return { result: 'W' };
@@ -143,7 +146,7 @@ export async function POST(request: Request) {
             return { result: 'L' };
         });
       }
-       if (awayFormRes.ok) {
+       if (awayFormRes?.ok) {
         const awayData = await awayFormRes.json();
         away_form_raw = awayData.matches.map((m: any) => {
              if (m.score.winner === 'HOME_TEAM' && m.homeTeam.id === awayId) return { result: 'W' };
@@ -177,6 +180,9 @@ export async function POST(request: Request) {
       if (homeStats && awayStats && homeStats.playedGames > 0 && awayStats.playedGames > 0 && league_avg_home_goals && league_avg_away_goals) {
         pythonInputData = {
           is_simulation: false,
+          // Boş form listeleri Python tarafında bahis.db'deki form indeksinden doldurulur.
+          home_id: homeId,
+          away_id: awayId,
           home: { name: homeTeam, played: homeStats.playedGames, goals_for: homeStats.goalsFor, goals_against: homeStats.goalsAgainst },
           away: { name: awayTeam, played: awayStats.playedGames, goals_for: awayStats.goalsFor, goals_against: awayStats.goalsAgainst },
           league_avg_home_goals,
@@ -191,41 +197,9 @@ export async function POST(request: Request) {
       console.error("Hibrid Model için veri çekme hatası:", err);
     }
 
-    const pythonPromise = new Promise((resolve, reject) => {
-      const pythonProcess = spawn('python3.11', ['analysis.py', JSON.stringify(pythonInputData)]);
-      
-      let stdoutData = "";
-      let stderrData = "";
-
-      pythonProcess.stdout.on('data', (data) => { stdoutData += data.toString(); });
-      pythonProcess.stderr.on('data', (data) => { stderrData += data.toString(); });
-
-      pythonProcess.on('close', (code) => {
-        if (code !== 0) {
-          reject(new Error(stderrData || `Python exit code: ${code}`));
-        } else {
-          resolve(stdoutData);
-        }
-      });
-      
-      pythonProcess.on('error', (err) => {
-        reject(new Error(`Spawn Hatası: ${err.message}`));
-      });
-    });
-
     try {
-      const pythonOutput = await pythonPromise as string;
-      
-      let predictionResult;
-      try {
-        predictionResult = JSON.parse(pythonOutput);
-        if (predictionResult.error) {
-            throw new Error(predictionResult.trace || predictionResult.error);
-        }
-
-      } catch (parseError) {
-        throw new Error(`JSON Parse Hatası. Gelen Veri: ${pythonOutput.substring(0, 500)}`);
-      }
+      // Kalıcı (warm) Python worker havuzu: her maç için yeni süreç başlatılmaz.
+      const predictionResult = await runAnalysis(pythonInputData);
 
       const staticComment = generateStaticComment(predictionResult, homeTeam, awayTeam);
 
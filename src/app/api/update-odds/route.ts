@@ -4,6 +4,7 @@ import { db } from '@/db';
 import * as schema from '@/db/schema';
 import { eq, and, like, inArray } from 'drizzle-orm';
 import { z } from 'zod';
+import { gunzipSync } from 'zlib';
 
 // Zod şeması ile gelen veriyi doğruluyoruz
 const matchOddSchema = z.object({
@@ -12,6 +13,9 @@ const matchOddSchema = z.object({
   homeOdd: z.number(),
   drawOdd: z.number(),
   awayOdd: z.number(),
+  // Set by the scraper's team resolver (team_resolver.py) when a name maps to exactly one team.
+  homeTeamId: z.number().int().nullable().optional(),
+  awayTeamId: z.number().int().nullable().optional(),
 });
 
 const requestBodySchema = z.object({
@@ -20,7 +24,15 @@ const requestBodySchema = z.object({
 
 export async function POST(request: NextRequest) {
   try {
-    const body = await request.json();
+    // Scrapers send gzip-compressed chunks (Content-Encoding: gzip).
+    const raw = Buffer.from(await request.arrayBuffer());
+    const isGzip = request.headers.get('content-encoding')?.toLowerCase() === 'gzip';
+    let body: unknown;
+    try {
+      body = JSON.parse((isGzip ? gunzipSync(raw) : raw).toString('utf-8'));
+    } catch (parseError: any) {
+      return NextResponse.json({ success: false, error: 'Request body is not valid (gzip) JSON.', details: parseError.message }, { status: 400 });
+    }
     const validation = requestBodySchema.safeParse(body);
 
     if (!validation.success) {
@@ -33,27 +45,34 @@ export async function POST(request: NextRequest) {
 
     for (const matchData of matches) {
       try {
-        // Takım isimlerinin ilk kelimesini alıp LIKE için hazırlıyoruz
-        const homeTeamSearchTerm = `${matchData.homeTeam.split(' ')[0]}%`;
-        const awayTeamSearchTerm = `${matchData.awayTeam.split(' ')[0]}%`;
-
-        // Drizzle ile ilişkisel sorgu: homeTeam ve awayTeam isimlerini 'like' ile arıyoruz.
-        // Bu, "Manchester United" ile "Man Utd" gibi isimleri eşleştirmeye yardımcı olur.
-        const homeTeamQuery = db.select({ id: schema.teams.id }).from(schema.teams).where(like(schema.teams.name, homeTeamSearchTerm));
-        const awayTeamQuery = db.select({ id: schema.teams.id }).from(schema.teams).where(like(schema.teams.name, awayTeamSearchTerm));
-
-        const [homeTeams, awayTeams] = await Promise.all([homeTeamQuery, awayTeamQuery]);
-
-        if (homeTeams.length === 0 || awayTeams.length === 0) {
-          errors.push(`Could not find a match for teams: ${matchData.homeTeam} or ${matchData.awayTeam}`);
-          continue;
+        let homeTeamId = matchData.homeTeamId ?? null;
+        let awayTeamId = matchData.awayTeamId ?? null;
+
+        if (homeTeamId === null || awayTeamId === null) {
+          // Takım isimlerinin ilk kelimesini alıp LIKE için hazırlıyoruz
+          const homeTeamSearchTerm = `${matchData.homeTeam.split(' ')[0]}%`;
+          const awayTeamSearchTerm = `${matchData.awayTeam.split(' ')[0]}%`;
+
+          // Drizzle ile ilişkisel sorgu: homeTeam ve awayTeam isimlerini 'like' ile arıyoruz.
+          // Bu, "Manchester United" ile "Man Utd" gibi isimleri eşleştirmeye yardımcı olur.
+          const homeTeamQuery = db.select({ id: schema.teams.id }).from(schema.teams).where(like(schema.teams.name, homeTeamSearchTerm));
+          const awayTeamQuery = db.select({ id: schema.teams.id }).from(schema.teams).where(like(schema.teams.name, awayTeamSearchTerm));
+
+          const [homeTeams, awayTeams] = await Promise.all([homeTeamQuery, awayTeamQuery]);
+
+          if (homeTeams.length === 0 || awayTeams.length === 0) {
+            errors.push(`Could not find a match for teams: ${matchData.homeTeam} or ${matchData.awayTeam}`);
+            continue;
+          }
+          homeTeamId = homeTeamId ?? homeTeams[0].id;
+          awayTeamId = awayTeamId ?? awayTeams[0].id;
         }
 
         // Bulunan ID'ler ile maçı arıyoruz
         const matchToUpdate = await db.query.matches.findFirst({
             where: and(
-                eq(schema.matches.home_team_id, homeTeams[0].id),
-                eq(schema.matches.away_team_id, awayTeams[0].id),
+                eq(schema.matches.home_team_id, homeTeamId),
+                eq(schema.matches.away_team_id, awayTeamId),
                 eq(schema.matches.status, 'NS') // Sadece başlamamış maçları güncelle
             )
         });
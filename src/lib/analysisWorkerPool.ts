@@ -0,0 +1,115 @@
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
+import path from 'path';
+import readline from 'readline';
+
+type PendingRequest = {
+  resolve: (value: any) => void;
+  reject: (reason: Error) => void;
+};
+
+type Worker = {
+  process: ChildProcessWithoutNullStreams;
+  pending: Map<number, PendingRequest>;
+};
+
+const PYTHON_EXECUTABLE = process.env.PYTHON_PATH || 'python3.11';
+const POOL_SIZE = Math.max(1, parseInt(process.env.ANALYSIS_WORKERS || '2', 10) || 2);
+// Only the end of a worker's stderr is kept for the error message when it exits.
+const STDERR_TAIL_CHARS = 8192;
+
+const workers: (Worker | null)[] = new Array(POOL_SIZE).fill(null);
+let nextRequestId = 1;
+
+function failPending(worker: Worker, error: Error) {
+  for (const { reject } of worker.pending.values()) {
+    reject(error);
+  }
+  worker.pending.clear();
+}
+
+function startWorker(slot: number): Worker {
+  const scriptPath = path.join(process.cwd(), 'analysis.py');
+  const child = spawn(PYTHON_EXECUTABLE, [scriptPath, '--serve']);
+  const worker: Worker = { process: child, pending: new Map() };
+
+  let stderrData = '';
+  child.stderr.on('data', (data) => { stderrData = (stderrData + data.toString()).slice(-STDERR_TAIL_CHARS); });
+
+  readline.createInterface({ input: child.stdout }).on('line', (line) => {
+    let message: any;
+    try {
+      message = JSON.parse(line);
+    } catch {
+      console.error('[ANALYSIS WORKER] Could not parse worker output:', line.substring(0, 500));
+      return;
+    }
+    const request = worker.pending.get(message.id);
+    if (!request) return;
+    worker.pending.delete(message.id);
+    if (message.error) {
+      request.reject(new Error(message.error));
+    } else {
+      request.resolve(message.result);
+    }
+  });
+
+  const retire = (error: Error) => {
+    if (workers[slot] === worker) workers[slot] = null;
+    failPending(worker, error);
+  };
+
+  child.on('close', (code) => {
+    retire(new Error(stderrData || `Python worker exited with code: ${code}`));
+  });
+  child.on('error', (err) => {
+    retire(new Error(`Spawn Hatası: ${err.message}`));
+  });
+
+  workers[slot] = worker;
+  return worker;
+}
+
+function acquireWorker(): Worker {
+  // Pick the least busy slot, starting a worker lazily if the slot is empty.
+  let bestSlot = 0;
+  let bestLoad = Infinity;
+  for (let slot = 0; slot < POOL_SIZE; slot++) {
+    const worker = workers[slot];
+    const load = worker ? worker.pending.size : 0;
+    if (load < bestLoad) {
+      bestSlot = slot;
+      bestLoad = load;
+    }
+  }
+  return workers[bestSlot] || startWorker(bestSlot);
+}
+
+function sendRequest(request: Record<string, any>): Promise<any> {
+  return new Promise((resolve, reject) => {
+    const worker = acquireWorker();
+    const id = nextRequestId++;
+    worker.pending.set(id, { resolve, reject });
+    worker.process.stdin.write(JSON.stringify({ ...request, id }) + '\n', (err) => {
+      if (err && worker.pending.delete(id)) {
+        reject(new Error(`Python worker write failed: ${err.message}`));
+      }
+    });
+  });
+}
+
+/**
+ * Runs one analysis request on a warm `analysis.py --serve` worker.
+ * Resolves with the parsed result object produced by `run_analysis`.
+ */
+export function runAnalysis(stats: any): Promise<any> {
+  return sendRequest({ stats });
+}
+
+/**
+ * Both teams' form and head-to-head from the form index in bahis.db
+ * ({ home, away, head_to_head }; a team the index does not know is null).
+ * Rejects when the index has not been built.
+ */
+export function getIndexedForm(homeId: number, awayId: number): Promise<any> {
+  return sendRequest({ command: 'form', home_id: homeId, away_id: awayId });
+}
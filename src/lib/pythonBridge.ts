@@ -1,61 +1,119 @@
-import { spawn } from 'child_process';
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
 import path from 'path';
+import readline from 'readline';
 
 export interface PredictionResult {
   prediction: 'HOME_WIN' | 'AWAY_WIN' | 'DRAW';
   confidence: number;
   analysis: string;
+  home_win?: number;
+  draw?: number;
+  away_win?: number;
+  expected_goals?: { home: number; away: number };
+  score_prediction?: string;
   error?: string;
 }
 
-export function getPrediction(homeTeamId: number, awayTeamId: number): Promise<PredictionResult> {
-  return new Promise((resolve, reject) => {
-    // Resolve the path to the python executable and script
-    const pythonExecutable = process.env.PYTHON_PATH || 'python'; // Or 'python3'
-    const scriptPath = path.join(process.cwd(), 'ml_engine', 'predict.py');
+type PendingRequest = {
+  resolve: (value: any) => void;
+  reject: (reason: Error) => void;
+};
 
-    const pythonProcess = spawn(pythonExecutable, [
-      scriptPath,
-      homeTeamId.toString(),
-      awayTeamId.toString(),
-    ]);
+// One long-lived `predict.py --serve` process holds the team-feature index in memory,
+// so bahis.db is read once instead of on every prediction.
+let predictor: { process: ChildProcessWithoutNullStreams; pending: Map<number, PendingRequest> } | null = null;
+let nextRequestId = 1;
+// Only the end of the predictor's stderr is kept for the error message when it exits.
+const STDERR_TAIL_CHARS = 8192;
 
-    let stdout = '';
-    let stderr = '';
+function startPredictor() {
+  const pythonExecutable = process.env.PYTHON_PATH || 'python'; // Or 'python3'
+  const scriptPath = path.join(process.cwd(), 'ml_engine', 'predict.py');
+  const child = spawn(pythonExecutable, [scriptPath, '--serve']);
+  const worker = { process: child, pending: new Map<number, PendingRequest>() };
 
-    pythonProcess.stdout.on('data', (data) => {
-      stdout += data.toString();
-    });
+  let stderr = '';
+  child.stderr.on('data', (data) => {
+    stderr = (stderr + data.toString()).slice(-STDERR_TAIL_CHARS);
+  });
 
-    pythonProcess.stderr.on('data', (data) => {
-      stderr += data.toString();
-    });
+  readline.createInterface({ input: child.stdout }).on('line', (line) => {
+    let message: any;
+    try {
+      message = JSON.parse(line);
+    } catch {
+      console.error('Failed to parse Python script output:', line);
+      return;
+    }
+    const request = worker.pending.get(message.id);
+    if (!request) return;
+    worker.pending.delete(message.id);
+    if (message.error) {
+      request.reject(new Error(message.error));
+    } else {
+      request.resolve(message.result);
+    }
+  });
 
-    pythonProcess.on('close', (code) => {
-      if (code !== 0) {
-        console.error(`Python script exited with code ${code}`);
-        console.error(`Stderr: ${stderr}`);
-        return reject(new Error(`Python script error: ${stderr}`));
-      }
+  const retire = (error: Error) => {
+    if (predictor === worker) predictor = null;
+    for (const { reject } of worker.pending.values()) {
+      reject(error);
+    }
+    worker.pending.clear();
+  };
 
-      try {
-        const result: PredictionResult = JSON.parse(stdout);
-        if (result.error) {
-            return reject(new Error(result.error));
-        }
-        resolve(result);
-      } catch (e) {
-        console.error('Failed to parse Python script output:', stdout);
-        reject(new Error('Failed to parse prediction JSON from Python script.'));
-      }
-    });
+  child.on('close', (code) => {
+    console.error(`Python script exited with code ${code}`);
+    console.error(`Stderr: ${stderr}`);
+    retire(new Error(`Python script error: ${stderr}`));
+  });
 
-    pythonProcess.on('error', (err) => {
-        console.error('Failed to start Python process:', err);
-        if ((err as any).code === 'ENOENT') {
-            return reject(new Error(`Python executable not found. Please ensure Python is installed and accessible via the system's PATH or set the PYTHON_PATH environment variable.`));
-        }
-        reject(err);
+  child.on('error', (err) => {
+    console.error('Failed to start Python process:', err);
+    if ((err as any).code === 'ENOENT') {
+      return retire(new Error(`Python executable not found. Please ensure Python is installed and accessible via the system's PATH or set the PYTHON_PATH environment variable.`));
+    }
+    retire(err);
+  });
+
+  predictor = worker;
+  return worker;
+}
+
+function request(payload: object): Promise<any> {
+  return new Promise((resolve, reject) => {
+    const worker = predictor || startPredictor();
+    const id = nextRequestId++;
+    worker.pending.set(id, { resolve, reject });
+    worker.process.stdin.write(JSON.stringify({ id, ...payload }) + '\n', (err) => {
+      if (err && worker.pending.delete(id)) {
+        reject(new Error(`Python worker write failed: ${err.message}`));
+      }
     });
   });
 }
+
+function unwrap(result: PredictionResult): PredictionResult {
+  if (result.error) {
+    throw new Error(result.error);
+  }
+  return result;
+}
+
+export async function getPrediction(homeTeamId: number, awayTeamId: number): Promise<PredictionResult> {
+  return unwrap(await request({ home_team_id: homeTeamId, away_team_id: awayTeamId }));
+}
+
+/**
+ * Predicts many fixtures in one round trip. Unknown teams come back as
+ * results with an `error` field instead of failing the whole batch.
+ */
+export function getPredictions(pairs: [number, number][]): Promise<PredictionResult[]> {
+  return request({ pairs });
+}
+
+/** Index size, load time and per-prediction latency percentiles from the warm process. */
+export function getPredictorStats(): Promise<any> {
+  return request({ command: 'stats' });
+}
@@ -0,0 +1,97 @@
+"""
+Opt-in per-stage timing for analysis.py.
+
+A StageTimer measures the stages of one request (poisson, injury, outcome,
+odds, form, blend, markets, serialization, ...) as consecutive laps. A
+StageProfiler aggregates those per-request timings into call counts, totals
+and p50/p95/p99 over a recent window. When profiling is off, timer() hands out
+a shared no-op timer, so the hot path pays one method call per stage.
+"""
+import time
+from collections import deque
+
+SAMPLE_WINDOW = 10000
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class StageTimer:
+    """Laps of one request, in milliseconds, keyed by stage."""
+
+    __slots__ = ("timings", "_last")
+
+    def __init__(self):
+        self.timings = {}
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        """Charges the time since the previous lap (or creation) to `stage`."""
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + (now - self._last) * 1000
+        self._last = now
+
+    def result(self):
+        return {stage: round(ms, 4) for stage, ms in self.timings.items()}
+
+
+class _NullTimer:
+    __slots__ = ()
+    timings = None
+
+    def lap(self, stage):
+        pass
+
+    def result(self):
+        return None
+
+
+NULL_TIMER = _NullTimer()
+
+
+class StageProfiler:
+    def __init__(self, enabled=False, window=SAMPLE_WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self.counts = {}
+        self.totals = {}
+        self.samples = {}
+
+    def timer(self):
+        """A fresh StageTimer when enabled, otherwise the shared no-op timer."""
+        return StageTimer() if self.enabled else NULL_TIMER
+
+    def add(self, timings):
+        """Aggregates one request's {stage: ms} timings."""
+        for stage, ms in timings.items():
+            if stage not in self.counts:
+                self.counts[stage] = 0
+                self.totals[stage] = 0.0
+                self.samples[stage] = deque(maxlen=self.window)
+            self.counts[stage] += 1
+            self.totals[stage] += ms
+            self.samples[stage].append(ms)
+
+    def reset(self):
+        self.counts.clear()
+        self.totals.clear()
+        self.samples.clear()
+
+    def summary(self):
+        """Per stage: calls, total and mean ms, and p50/p95/p99/max ms over the recent window."""
+        summary = {}
+        for stage, count in self.counts.items():
+            samples = sorted(self.samples[stage])
+            summary[stage] = {
+                "calls": count,
+                "total_ms": round(self.totals[stage], 3),
+                "mean_ms": round(self.totals[stage] / count, 4),
+                "p50_ms": round(_percentile(samples, 0.50), 4),
+                "p95_ms": round(_percentile(samples, 0.95), 4),
+                "p99_ms": round(_percentile(samples, 0.99), 4),
+                "max_ms": round(samples[-1], 4),
+            }
+        return summary
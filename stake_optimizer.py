@@ -0,0 +1,281 @@
+"""
+Stakes for open 1X2 markets from model probabilities and the best available odds.
+
+Every (match, outcome) with a positive value edge p * odds - 1 above
+`min_edge` is a candidate bet. Two stakings are computed, both as fractions
+of the bankroll and scaled by `kelly_fraction`:
+
+- kelly: each bet sized on its own, f = (p * odds - 1) / (odds - 1);
+- portfolio: all bets placed at once, sized to maximize the expected log
+  growth of the bankroll over sampled outcome scenarios. This accounts for
+  bets settling together and for bets on the same match excluding each other.
+
+Both are held to a per-bet cap and a total exposure cap. The portfolio
+optimization is a projected Newton ascent with a diagonal Hessian over a
+(scenarios x bets) outcome matrix, so a weekend card of several hundred
+markets takes a fraction of a second.
+
+Usage:
+    python stake_optimizer.py [--db bahis.db] [--bankroll 1000] [--kelly-fraction 0.25]
+    python stake_optimizer.py --input markets.jsonl   # {"id", "probabilities" | "result", "odds"} per line
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bahis.db')
+OUTCOMES = ("home", "draw", "away")
+PROBABILITY_FIELDS = ("home_win", "draw", "away_win")
+DEFAULT_KELLY_FRACTION = 0.25
+DEFAULT_MIN_EDGE = 0.02
+DEFAULT_MAX_STAKE = 0.05
+DEFAULT_MAX_EXPOSURE = 0.5
+DEFAULT_SCENARIOS = 20_000
+DEFAULT_SEED = 42
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-10
+# Scenarios are rejected when they would leave less than this share of the bankroll.
+MIN_WEALTH = 1e-6
+
+
+def best_odds(quotes):
+    """Best price per outcome over one or more {'home', 'draw', 'away'} quotes; 0 where nobody quotes."""
+    if isinstance(quotes, dict):
+        quotes = [quotes]
+    return [max((float(q.get(name) or 0) for q in quotes), default=0.0) for name in OUTCOMES]
+
+
+def kelly_fractions(probs, odds):
+    """Full-Kelly bankroll fraction of each single bet; 0 where the edge is not positive."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kelly = (probs * odds - 1) / (odds - 1)
+    return np.where(np.isfinite(kelly) & (kelly > 0), kelly, 0.0)
+
+
+def project(stakes, max_stake, max_exposure):
+    """Euclidean projection onto {0 <= f <= max_stake, sum(f) <= max_exposure}."""
+    clipped = np.clip(stakes, 0.0, max_stake)
+    if clipped.sum() <= max_exposure:
+        return clipped
+    lo, hi = 0.0, float(stakes.max())
+    for _ in range(60):
+        shift = (lo + hi) / 2
+        if np.clip(stakes - shift, 0.0, max_stake).sum() > max_exposure:
+            lo = shift
+        else:
+            hi = shift
+    return np.clip(stakes - hi, 0.0, max_stake)
+
+
+def sample_outcomes(probs, scenarios, seed=DEFAULT_SEED):
+    """(scenarios, matches) int8 outcome indexes (0 home, 1 draw, 2 away), matches independent."""
+    rng = np.random.default_rng(seed)
+    cdf = np.cumsum(probs, axis=1)[:, :-1].astype(np.float32)
+    uniforms = rng.random((scenarios, len(probs)), dtype=np.float32)
+    return (uniforms >= cdf[:, 0]).astype(np.int8) + (uniforms >= cdf[:, 1])
+
+
+class Scenarios:
+    """Win indicators of the candidate bets in every sampled scenario."""
+
+    def __init__(self, outcomes, bet_match, bet_outcome, odds):
+        self.wins = (outcomes[:, bet_match] == bet_outcome).astype(np.float32)
+        self.odds = odds
+        self.count = len(outcomes)
+
+    def wealth(self, stakes):
+        """Bankroll multiple after settlement in each scenario."""
+        return 1.0 - stakes.sum() + self.wins @ (stakes * self.odds).astype(np.float32)
+
+    def growth(self, stakes):
+        wealth = self.wealth(stakes).astype(np.float64)
+        if wealth.min() <= MIN_WEALTH:
+            return -np.inf, wealth
+        return float(np.log(wealth).mean()), wealth
+
+
+def optimize_portfolio(scenarios, start, max_stake=DEFAULT_MAX_STAKE, max_exposure=DEFAULT_MAX_EXPOSURE,
+                       max_iterations=MAX_ITERATIONS, tolerance=TOLERANCE):
+    """
+    Stakes maximizing the mean log wealth over `scenarios`, within the caps.
+    Starts from `start` (the capped Kelly stakes) and returns (stakes, iterations).
+    """
+    odds = scenarios.odds
+    stakes = project(start, max_stake, max_exposure)
+    growth, wealth = scenarios.growth(stakes)
+    while growth == -np.inf:
+        stakes = stakes / 2
+        growth, wealth = scenarios.growth(stakes)
+
+    for iteration in range(1, max_iterations + 1):
+        inverse = 1.0 / wealth
+        inverse_sq = inverse * inverse
+        win_inverse = (inverse.astype(np.float32) @ scenarios.wins) / scenarios.count
+        win_inverse_sq = (inverse_sq.astype(np.float32) @ scenarios.wins) / scenarios.count
+        gradient = odds * win_inverse - inverse.mean()
+        # Minus the Hessian diagonal: mean(r^2 / W^2), r = odds - 1 on a win and -1 on a loss.
+        curvature = ((odds - 1) ** 2 - 1) * win_inverse_sq + inverse_sq.mean()
+
+        step = 1.0
+        while True:
+            candidate = project(stakes + step * gradient / curvature, max_stake, max_exposure)
+            candidate_growth, candidate_wealth = scenarios.growth(candidate)
+            if candidate_growth >= growth or step < 1e-6:
+                break
+            step /= 2
+        if candidate_growth < growth:
+            break
+        improvement = candidate_growth - growth
+        stakes, growth, wealth = candidate, candidate_growth, candidate_wealth
+        if improvement < tolerance:
+            break
+    return stakes, iteration
+
+
+def optimize_stakes(probs, odds, kelly_fraction=DEFAULT_KELLY_FRACTION, min_edge=DEFAULT_MIN_EDGE,
+                    max_stake=DEFAULT_MAX_STAKE, max_exposure=DEFAULT_MAX_EXPOSURE,
+                    scenarios=DEFAULT_SCENARIOS, seed=DEFAULT_SEED):
+    """
+    probs, odds: (matches, 3) arrays of home/draw/away probabilities and best
+    decimal odds (0 = not offered). Returns the candidate bets as arrays
+    (match index, outcome index, probability, odds, edge, full Kelly, kelly
+    and portfolio stakes as bankroll fractions) plus a summary of the
+    portfolio over the sampled scenarios.
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    odds = np.asarray(odds, dtype=np.float64)
+    probs = probs / probs.sum(axis=1, keepdims=True)
+    edges = np.where(odds > 1, probs * odds - 1, -1.0)
+    bet_match, bet_outcome = np.nonzero(edges > min_edge)
+    bet_probs, bet_odds = probs[bet_match, bet_outcome], odds[bet_match, bet_outcome]
+    full_kelly = kelly_fractions(bet_probs, bet_odds)
+    bets = {
+        "match": bet_match,
+        "outcome": bet_outcome,
+        "probability": bet_probs,
+        "odds": bet_odds,
+        "edge": edges[bet_match, bet_outcome],
+        "full_kelly": full_kelly,
+        "kelly_stake": project(full_kelly * kelly_fraction, max_stake, max_exposure),
+    }
+    summary = {"markets": int((odds > 1).sum()), "bets": len(bet_match), "scenarios": scenarios}
+    if not len(bet_match):
+        bets["portfolio_stake"] = np.zeros(0)
+        return bets, summary
+
+    sampled = Scenarios(sample_outcomes(probs, scenarios, seed), bet_match, bet_outcome, bet_odds)
+    # Optimize full-Kelly growth, then scale: fractional Kelly of the growth-optimal portfolio.
+    optimal, iterations = optimize_portfolio(
+        sampled, full_kelly, max_stake / kelly_fraction, max_exposure / kelly_fraction
+    )
+    stakes = optimal * kelly_fraction
+    bets["portfolio_stake"] = stakes
+    wealth = sampled.wealth(stakes).astype(np.float64)
+    summary.update(
+        iterations=iterations,
+        exposure=round(float(stakes.sum()), 6),
+        expected_log_growth=round(float(np.log(wealth).mean()), 6),
+        expected_return=round(float(wealth.mean() - 1), 6),
+        loss_probability=round(float((wealth < 1).mean()), 4),
+        return_p05=round(float(np.percentile(wealth, 5) - 1), 6),
+    )
+    return bets, summary
+
+
+def load_open_markets(conn):
+    """(ids, probs, odds) of analyzed, not yet started matches with 1X2 odds in bahis.db."""
+    rows = conn.execute("""
+        SELECT id, home_win_prob, draw_prob, away_win_prob, home_odd, draw_odd, away_odd
+        FROM matches
+        WHERE status = 'NS' AND home_win_prob IS NOT NULL AND home_odd AND draw_odd AND away_odd
+        ORDER BY id
+    """).fetchall()
+    ids = [row[0] for row in rows]
+    return ids, np.array([row[1:4] for row in rows], dtype=float).reshape(-1, 3), np.array([row[4:] for row in rows], dtype=float).reshape(-1, 3)
+
+
+def load_jsonl(path):
+    """
+    (ids, probs, odds) from JSON lines with "id", "odds" (one quote or a list of
+    bookmaker quotes) and either "probabilities" (0-1) or an analysis "result" (percent).
+    """
+    ids, probs, odds = [], [], []
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            market = json.loads(line)
+            source = market.get("probabilities") or market.get("result") or {}
+            if not all(source.get(field) for field in PROBABILITY_FIELDS) or not market.get("odds"):
+                print(f"[STAKES] Skipping line {line_number}: needs probabilities and odds", file=sys.stderr)
+                continue
+            ids.append(market.get("id"))
+            probs.append([float(source[field]) for field in PROBABILITY_FIELDS])
+            odds.append(best_odds(market["odds"]))
+    return ids, np.array(probs, dtype=float).reshape(-1, 3), np.array(odds, dtype=float).reshape(-1, 3)
+
+
+def stake_rows(ids, bets, bankroll):
+    """One JSON-ready row per candidate bet, largest portfolio stake first."""
+    rows = [
+        {
+            "id": ids[match],
+            "outcome": OUTCOMES[outcome],
+            "probability": round(float(prob), 4),
+            "odds": round(float(odd), 2),
+            "edge": round(float(edge), 4),
+            "full_kelly": round(float(full), 4),
+            "kelly_stake": round(float(kelly) * bankroll, 2),
+            "portfolio_stake": round(float(portfolio) * bankroll, 2),
+        }
+        for match, outcome, prob, odd, edge, full, kelly, portfolio in zip(
+            bets["match"], bets["outcome"], bets["probability"], bets["odds"], bets["edge"],
+            bets["full_kelly"], bets["kelly_stake"], bets["portfolio_stake"],
+        )
+    ]
+    rows.sort(key=lambda row: (-row["portfolio_stake"], -row["edge"]))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kelly and log-growth portfolio stakes for open 1X2 markets.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--input", help="JSON-lines markets instead of the open matches in --db.")
+    parser.add_argument("--bankroll", type=float, default=1000.0)
+    parser.add_argument("--kelly-fraction", type=float, default=DEFAULT_KELLY_FRACTION)
+    parser.add_argument("--min-edge", type=float, default=DEFAULT_MIN_EDGE, help="Minimum p * odds - 1 to consider a bet.")
+    parser.add_argument("--max-stake", type=float, default=DEFAULT_MAX_STAKE, help="Cap per bet, as a bankroll fraction.")
+    parser.add_argument("--max-exposure", type=float, default=DEFAULT_MAX_EXPOSURE, help="Cap on all stakes together, as a bankroll fraction.")
+    parser.add_argument("--scenarios", type=int, default=DEFAULT_SCENARIOS)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    args = parser.parse_args(argv)
+    if not 0 < args.kelly_fraction <= 1:
+        parser.error("--kelly-fraction must be in (0, 1]")
+
+    if args.input:
+        ids, probs, odds = load_jsonl(args.input)
+    else:
+        conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+        try:
+            ids, probs, odds = load_open_markets(conn)
+        finally:
+            conn.close()
+
+    started = time.perf_counter()
+    bets, summary = optimize_stakes(
+        probs, odds, args.kelly_fraction, args.min_edge, args.max_stake, args.max_exposure, args.scenarios, args.seed
+    )
+    elapsed = time.perf_counter() - started
+    print(f"[STAKES] {len(ids)} matches, {summary['bets']} value bets of {summary['markets']} markets in {elapsed:.3f}s", file=sys.stderr)
+    summary["bankroll"] = args.bankroll
+    print(json.dumps({"summary": summary, "bets": stake_rows(ids, bets, args.bankroll)}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+"""
+Maps scraped team names ("Man Utd", "Wolves", "Bayern München") to team ids in bahis.db.
+
+Names are normalized (accents, case, punctuation, digits, club suffixes such
+as "FC" and a few common abbreviations), then resolved in this order:
+
+1. team_aliases: names confirmed earlier with --confirm;
+2. an exact normalized team name;
+3. a character trigram index over all team names, scored with the Dice
+   coefficient, or by containment when one name is a shortened form of the
+   other ("Brighton" / "Brighton & Hove Albion"), discounted by CONTAINMENT_WEIGHT. Only a clear
+   winner (score >= MIN_SCORE and at least MARGIN ahead of the runner-up) is
+   accepted; anything else is reported as ambiguous or unresolved instead
+   of guessed.
+
+Accepted trigram matches from scrapes are recorded in team_aliases as
+unconfirmed (source 'ngram'). They are listed by --pending for review but
+never used for lookup until confirmed, so one bad match does not become a
+permanent alias.
+
+Lookups touch only the postings of the name's own trigrams, so they do not
+grow with the number of teams the way comparing against every name does.
+
+Usage:
+    python team_resolver.py "Man Utd" "Spurs" [--league 39]
+    python team_resolver.py --confirm "Spurs" 47
+    python team_resolver.py --pending
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import unicodedata
+from collections import Counter, namedtuple
+from itertools import chain
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bahis.db')
+NGRAM = 3
+MIN_SCORE = 0.55
+MARGIN = 0.1
+MAX_CANDIDATES = 5
+# A name fully contained in the other (longer) one scores at most this much.
+CONTAINMENT_WEIGHT = 0.85
+
+# Tokens that carry no identity ("FC Barcelona" == "Barcelona").
+STOP_TOKENS = frozenset(("fc", "afc", "cf", "sc", "ac", "as", "ss", "sk", "fk", "cd", "ud", "sv", "club", "the", "de"))
+TOKEN_ALIASES = {"utd": "united", "man": "manchester", "st": "saint", "intl": "international", "munchen": "munich"}
+
+NON_WORD = re.compile(r"[^a-z ]+")
+
+Resolution = namedtuple("Resolution", "team_id name score status candidates")
+"""status: 'alias', 'exact', 'ngram', 'ambiguous' or 'unresolved'; candidates: [(team_id, name, score)]."""
+
+
+def normalize(name):
+    """Canonical form used for every comparison: ascii, lower case, no digits/punctuation/club suffixes."""
+    text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii").lower()
+    text = NON_WORD.sub(" ", text.replace("&", " and "))
+    tokens = [TOKEN_ALIASES.get(token, token) for token in text.split()]
+    kept = [token for token in tokens if token not in STOP_TOKENS]
+    # A name made only of stop tokens (e.g. "AC") keeps them rather than becoming empty.
+    return " ".join(kept or tokens)
+
+
+def ngrams(normalized):
+    padded = f" {normalized} "
+    return {padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)}
+
+
+def create_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS team_aliases (
+            alias TEXT PRIMARY KEY,
+            team_id INTEGER NOT NULL,
+            source TEXT NOT NULL,
+            created_at INTEGER NOT NULL
+        )
+    """)
+
+
+class TeamResolver:
+    def __init__(self, teams, aliases=None, min_score=MIN_SCORE, margin=MARGIN):
+        """teams: iterable of (team_id, name, league_id); aliases: {normalized alias: team_id}."""
+        self.min_score = min_score
+        self.margin = margin
+        self.names = {}
+        self.leagues = {}
+        self.by_name = {}
+        self.gram_counts = {}
+        self.postings = {}
+        for team_id, name, league_id in teams:
+            self.names[team_id] = name
+            self.leagues[team_id] = league_id
+            normalized = normalize(name)
+            self.by_name.setdefault(normalized, []).append(team_id)
+            grams = ngrams(normalized)
+            self.gram_counts[team_id] = len(grams)
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(team_id)
+        self.aliases = dict(aliases or {})
+        self.new_aliases = {}
+
+    @classmethod
+    def from_db(cls, db_path=DEFAULT_DB_PATH, **kwargs):
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            teams = conn.execute("SELECT id, name, league_id FROM teams").fetchall()
+            try:
+                aliases = dict(conn.execute("SELECT alias, team_id FROM team_aliases WHERE source != 'ngram'").fetchall())
+            except sqlite3.OperationalError:
+                aliases = {}
+        finally:
+            conn.close()
+        return cls(teams, aliases, **kwargs)
+
+    def _in_league(self, team_id, league_id):
+        return league_id is None or self.leagues.get(team_id) == league_id
+
+    def candidates(self, normalized, league_id=None, limit=MAX_CANDIDATES):
+        """Best trigram matches as [(team_id, name, score)], highest first."""
+        grams = ngrams(normalized)
+        shared = Counter(chain.from_iterable(self.postings.get(gram, ()) for gram in grams))
+        scored = [
+            (team_id, self.names[team_id], round(max(
+                2 * count / (len(grams) + self.gram_counts[team_id]),
+                CONTAINMENT_WEIGHT * count / min(len(grams), self.gram_counts[team_id]),
+            ), 3))
+            for team_id, count in shared.items()
+            if self._in_league(team_id, league_id)
+        ]
+        scored.sort(key=lambda item: (-item[2], item[0]))
+        return scored[:limit]
+
+    def resolve(self, name, league_id=None):
+        normalized = normalize(name)
+        team_id = self.aliases.get(normalized)
+        if team_id is not None and team_id in self.names and self._in_league(team_id, league_id):
+            return Resolution(team_id, self.names[team_id], 1.0, "alias", [])
+
+        exact = [team_id for team_id in self.by_name.get(normalized, ()) if self._in_league(team_id, league_id)]
+        if len(exact) == 1:
+            return Resolution(exact[0], self.names[exact[0]], 1.0, "exact", [])
+
+        candidates = self.candidates(normalized, league_id)
+        if not candidates or candidates[0][2] < self.min_score:
+            return Resolution(None, None, candidates[0][2] if candidates else 0.0, "unresolved", candidates)
+        runner_up = candidates[1][2] if len(candidates) > 1 else 0.0
+        if len(exact) > 1 or candidates[0][2] - runner_up < self.margin:
+            return Resolution(None, None, candidates[0][2], "ambiguous", candidates)
+
+        team_id, team_name, score = candidates[0]
+        self.new_aliases[normalized] = team_id
+        return Resolution(team_id, team_name, score, "ngram", candidates)
+
+    def resolve_matches(self, matches, league_id=None):
+        """
+        Adds homeTeamId/awayTeamId (None when not resolved) to every scraped
+        match in place. Returns {"resolved", "ambiguous", "unresolved"} where the
+        last two map each problem name to its candidates.
+        """
+        seen = {}
+        report = {"resolved": 0, "ambiguous": {}, "unresolved": {}}
+        for match in matches:
+            for field, id_field in (("homeTeam", "homeTeamId"), ("awayTeam", "awayTeamId")):
+                name = match[field]
+                if name not in seen:
+                    seen[name] = self.resolve(name, league_id)
+                resolution = seen[name]
+                match[id_field] = resolution.team_id
+                if resolution.team_id is not None:
+                    report["resolved"] += 1
+                else:
+                    report[resolution.status][name] = resolution.candidates
+        return report
+
+    def save_aliases(self, db_path=DEFAULT_DB_PATH):
+        """
+        Records names resolved by trigram match as unconfirmed aliases (source
+        'ngram'), which lookups ignore until confirmed. Returns how many were new.
+        """
+        if not self.new_aliases:
+            return 0
+        conn = sqlite3.connect(db_path)
+        try:
+            create_tables(conn)
+            with conn:
+                before = conn.total_changes
+                conn.executemany(
+                    "INSERT OR IGNORE INTO team_aliases (alias, team_id, source, created_at) VALUES (?, ?, 'ngram', ?)",
+                    [(alias, team_id, int(time.time())) for alias, team_id in self.new_aliases.items()],
+                )
+                stored = conn.total_changes - before
+        finally:
+            conn.close()
+        self.new_aliases = {}
+        return stored
+
+
+def confirm_alias(db_path, name, team_id):
+    """Stores a hand-confirmed alias; it wins over any earlier automatic one."""
+    conn = sqlite3.connect(db_path)
+    try:
+        if conn.execute("SELECT 1 FROM teams WHERE id = ?", (team_id,)).fetchone() is None:
+            raise ValueError(f"No team with id {team_id}")
+        create_tables(conn)
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO team_aliases (alias, team_id, source, created_at) VALUES (?, ?, 'confirmed', ?)",
+                (normalize(name), team_id, int(time.time())),
+            )
+    finally:
+        conn.close()
+
+
+def pending_aliases(db_path):
+    """Unconfirmed aliases as [(alias, team_id, team name)], oldest first."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return conn.execute("""
+            SELECT a.alias, a.team_id, t.name FROM team_aliases a LEFT JOIN teams t ON t.id = a.team_id
+            WHERE a.source = 'ngram' ORDER BY a.created_at, a.alias
+        """).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+
+
+def report_problems(report, prefix="[TEAMS]"):
+    """Prints ambiguous and unresolved names from resolve_matches to stderr."""
+    for status in ("ambiguous", "unresolved"):
+        for name, candidates in report[status].items():
+            options = ", ".join(f"{team_name} #{team_id} ({score})" for team_id, team_name, score in candidates[:3])
+            print(f"{prefix} {status}: {name!r}" + (f" -> {options}" if options else ""), file=sys.stderr)
+
+
+_resolvers = {}
+
+
+def _stored_version(conn):
+    """Changes whenever a team is added or an alias is confirmed."""
+    teams = conn.execute("SELECT COUNT(*), MAX(id) FROM teams").fetchone()
+    try:
+        aliases = conn.execute("SELECT COUNT(*), MAX(created_at) FROM team_aliases WHERE source != 'ngram'").fetchone()
+    except sqlite3.OperationalError:
+        aliases = None
+    return teams, aliases
+
+
+def get_resolver(db_path=DEFAULT_DB_PATH):
+    """
+    Resolver for a database (None if the database is missing). Kept per
+    process and rebuilt when teams or confirmed aliases change.
+    """
+    if not os.path.exists(db_path):
+        _resolvers.pop(db_path, None)
+        return None
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        version = _stored_version(conn)
+    finally:
+        conn.close()
+    cached = _resolvers.get(db_path)
+    if cached is None or cached[0] != version:
+        cached = _resolvers[db_path] = (version, TeamResolver.from_db(db_path))
+    return cached[1]
+
+
+def resolve_scraped_teams(matches, db_path=DEFAULT_DB_PATH):
+    """Adds team ids to scraped matches, reports problem names and records unconfirmed aliases."""
+    resolver = get_resolver(db_path)
+    if resolver is None:
+        print(f"[TEAMS] {db_path} not found; uploading names only", file=sys.stderr)
+        return None
+    report = resolver.resolve_matches(matches)
+    report_problems(report)
+    stored = resolver.save_aliases(db_path)
+    print(
+        f"[TEAMS] {report['resolved']} of {2 * len(matches)} names resolved, {len(report['ambiguous'])} ambiguous, "
+        f"{len(report['unresolved'])} unresolved, {stored} new unconfirmed aliases",
+        file=sys.stderr,
+    )
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resolve scraped team names to bahis.db team ids.")
+    parser.add_argument("names", nargs="*")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--league", type=int, help="Only consider teams of this league id.")
+    parser.add_argument("--confirm", nargs=2, metavar=("NAME", "TEAM_ID"), help="Store NAME as an alias of TEAM_ID.")
+    parser.add_argument("--pending", action="store_true", help="List unconfirmed aliases learned from trigram matches.")
+    args = parser.parse_args(argv)
+
+    if args.pending:
+        for alias, team_id, team_name in pending_aliases(args.db):
+            print(f"{alias!r} -> {team_name} #{team_id}")
+        return 0
+
+    if args.confirm:
+        confirm_alias(args.db, args.confirm[0], int(args.confirm[1]))
+        print(f"Stored alias {normalize(args.confirm[0])!r} -> {args.confirm[1]}")
+        return 0
+
+    resolver = TeamResolver.from_db(args.db)
+    for name in args.names:
+        print(json.dumps({"query": name, **resolver.resolve(name, args.league)._asdict()}, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())